@@ -22,9 +22,29 @@ export interface ChartCreateResponse {
   n_panels?: number | null;
   n_series?: number | null;
   result_json?: unknown | null;
+  result_version?: number;
   error_message?: string | null;
 }
 
+export interface ChartStatusItem {
+  id: number;
+  status: ChartStatus;
+  processed_at?: string | null;
+  n_series?: number | null;
+  error_message?: string | null;
+}
+
+export interface ChartBatchError {
+  index: number;
+  filename: string;
+  detail: string;
+}
+
+export interface ChartBatchUploadResponse {
+  ids: number[];
+  errors: ChartBatchError[];
+}
+
 export interface Token {
   access_token: string;
   token_type: string;
@@ -151,6 +171,20 @@ export async function uploadChart(file: File): Promise<ChartCreateResponse> {
   return res.json();
 }
 
+export async function uploadChartsBatch(files: File[]): Promise<ChartBatchUploadResponse> {
+  const fd = new FormData();
+  for (const file of files) fd.append("files", file);
+
+  const res = await fetch(apiUrl("/charts/upload/batch"), {
+    method: "POST",
+    credentials: "include",
+    body: fd,
+  });
+
+  if (!res.ok) throw new Error(`Upload failed: ${await readError(res)}`);
+  return res.json();
+}
+
 export async function getChart(id: number): Promise<ChartCreateResponse> {
   const res = await fetch(apiUrl(`/charts/${id}`), {
     method: "GET",
@@ -161,6 +195,27 @@ export async function getChart(id: number): Promise<ChartCreateResponse> {
   return res.json();
 }
 
+export async function getChartStatuses(ids: number[]): Promise<ChartStatusItem[]> {
+  const params = new URLSearchParams({ ids: ids.join(",") });
+  const res = await fetch(apiUrl(`/charts/status?${params.toString()}`), {
+    method: "GET",
+    credentials: "include",
+  });
+
+  if (!res.ok) throw new Error(`Fetch failed: ${await readError(res)}`);
+  return res.json();
+}
+
+export async function getActiveChartStatuses(): Promise<ChartStatusItem[]> {
+  const res = await fetch(apiUrl("/charts/status/active"), {
+    method: "GET",
+    credentials: "include",
+  });
+
+  if (!res.ok) throw new Error(`Fetch failed: ${await readError(res)}`);
+  return res.json();
+}
+
 export function artifactUrl(chartId: number, key: string): string {
   return apiUrl(`/charts/${chartId}/artifact/${encodeURIComponent(key)}`);
 }
@@ -179,6 +234,13 @@ export function originalUrl(chartId: number): string {
   return apiUrl(`/charts/${chartId}/original`);
 }
 
+// WebP-превью: size округляется сервером до 160 / 320 / 640 px по длинной стороне.
+// source — "original" или ключ из result_json.artifacts.
+export function thumbUrl(chartId: number, size: number, source = "original"): string {
+  const params = new URLSearchParams({ size: String(size), source });
+  return apiUrl(`/charts/${chartId}/thumb?${params.toString()}`);
+}
+
 export function exportCsvUrl(chartId: number): string {
   return apiUrl(`/charts/${chartId}/export.csv`);
 }
@@ -215,6 +277,41 @@ export async function updateChartResultJson(
   return res.json();
 }
 
+// Частичное сохранение result_json: RFC 6902 или операции над сериями.
+export type ChartPatchOp =
+  | { op: "add" | "replace" | "test"; path: string; value: unknown }
+  | { op: "remove"; path: string }
+  | { op: "move" | "copy"; from: string; path: string }
+  | { op: "replace_series"; panel_id: string; series_id: string; series: unknown }
+  | { op: "insert_points"; panel_id: string; series_id: string; index?: number | null; points: [number, number][] }
+  | { op: "delete_points"; panel_id: string; series_id: string; start: number; count: number };
+
+export interface ChartPatchResponse {
+  id: number;
+  result_version: number;
+  n_panels?: number | null;
+  n_series?: number | null;
+}
+
+export class VersionConflictError extends Error {}
+
+export async function patchChartResultJson(
+  chartId: number,
+  version: number,
+  ops: ChartPatchOp[]
+): Promise<ChartPatchResponse> {
+  const res = await fetch(apiUrl(`/charts/${chartId}/result_json`), {
+    method: "PATCH",
+    credentials: "include",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify({ version, ops }),
+  });
+
+  if (res.status === 409) throw new VersionConflictError(`Save failed: ${await readError(res)}`);
+  if (!res.ok) throw new Error(`Save failed: ${await readError(res)}`);
+  return res.json();
+}
+
 export function exportTableCsvUrl(chartId: number): string {
   return apiUrl(`/charts/${chartId}/export.table.csv`);
 }
\ No newline at end of file
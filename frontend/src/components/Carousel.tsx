@@ -4,6 +4,8 @@ import Button from "./ui/Button";
 export type CarouselItem = {
   label: string;
   src: string;
+  // полноразмерное изображение, если src — превью
+  fullSrc?: string;
 };
 
 type Props = {
@@ -66,12 +68,23 @@ export default function Carousel({
 
       <div className="bg-slate-50 p-4 dark:bg-slate-950/30">
         <div className="aspect-video overflow-hidden rounded-xl border border-slate-200 bg-white dark:border-slate-800 dark:bg-slate-950">
-          <img
-            src={current.src}
-            alt={current.label}
-            className="h-full w-full object-contain"
-            loading="lazy"
-          />
+          {current.fullSrc ? (
+            <a href={current.fullSrc} target="_blank" rel="noreferrer">
+              <img
+                src={current.src}
+                alt={current.label}
+                className="h-full w-full object-contain"
+                loading="lazy"
+              />
+            </a>
+          ) : (
+            <img
+              src={current.src}
+              alt={current.label}
+              className="h-full w-full object-contain"
+              loading="lazy"
+            />
+          )}
         </div>
       </div>
     </div>
@@ -9,8 +9,10 @@ import {
   exportTableCsvUrl,
   getChart,
   originalUrl,
+  patchChartResultJson,
   updateChartResultJson,
   type ChartCreateResponse,
+  type ChartPatchOp,
   type ChartStatus,
 } from "../api/client";
 import Button from "../components/ui/Button";
@@ -73,6 +75,37 @@ function buildArtifactsCarousel(chart: ChartCreateResponse): CarouselItem[] {
   return items;
 }
 
+function sameWithout(a: any, b: any, key: string): boolean {
+  const strip = (o: any) => Object.fromEntries(Object.entries(o ?? {}).filter(([k]) => k !== key));
+  return JSON.stringify(strip(a)) === JSON.stringify(strip(b));
+}
+
+// replace_series для изменённых серий; null — если изменилась структура
+// (панели, набор серий, поля вне серий) и нужно сохранять документ целиком.
+function buildSeriesPatch(saved: any, edited: any): ChartPatchOp[] | null {
+  const a = saved?.panels;
+  const b = edited?.panels;
+  if (!Array.isArray(a) || !Array.isArray(b) || a.length !== b.length) return null;
+
+  if (!sameWithout(saved, edited, "panels")) return null;
+
+  const ops: ChartPatchOp[] = [];
+  for (let i = 0; i < a.length; i++) {
+    if (!sameWithout(a[i], b[i], "series")) return null;
+    const sa = a[i]?.series;
+    const sb = b[i]?.series;
+    if (!Array.isArray(sa) || !Array.isArray(sb) || sa.length !== sb.length) return null;
+
+    for (let j = 0; j < sa.length; j++) {
+      if (sa[j]?.id !== sb[j]?.id) return null;
+      if (JSON.stringify(sa[j]) !== JSON.stringify(sb[j])) {
+        ops.push({ op: "replace_series", panel_id: String(b[i].id), series_id: String(sb[j].id), series: sb[j] });
+      }
+    }
+  }
+  return ops;
+}
+
 export default function ChartPage() {
   const navigate = useNavigate();
   const { id } = useParams();
@@ -113,9 +146,24 @@ export default function ChartPage() {
     setSaving(true);
     setSaveError(null);
     try {
-      const fresh = await updateChartResultJson(chart.id, editedResultJson);
-      setChart(fresh);
-      setEditedResultJson(fresh.result_json);
+      const ops =
+        chart.result_version !== undefined ? buildSeriesPatch(chart.result_json, editedResultJson) : null;
+
+      if (ops && ops.length) {
+        // отправляем только изменённые серии
+        const patched = await patchChartResultJson(chart.id, chart.result_version ?? 0, ops);
+        setChart({
+          ...chart,
+          result_json: editedResultJson,
+          result_version: patched.result_version,
+          n_panels: patched.n_panels,
+          n_series: patched.n_series,
+        });
+      } else if (ops === null) {
+        const fresh = await updateChartResultJson(chart.id, editedResultJson);
+        setChart(fresh);
+        setEditedResultJson(fresh.result_json);
+      }
       setDirty(false);
     } catch (e: any) {
       setSaveError(e?.message ?? "Ошибка сохранения");
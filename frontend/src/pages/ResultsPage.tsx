@@ -15,6 +15,7 @@ import {
   exportTableCsvUrl,
   listCharts,
   originalUrl,
+  thumbUrl,
   type ChartCreateResponse,
   type ChartStatus,
 } from "../api/client";
@@ -47,16 +48,23 @@ function statusVariant(s: ChartStatus) {
   }
 }
 
+// в списке карточки небольшие — полноразмерные изображения не нужны
+const GALLERY_THUMB_SIZE = 640;
+
 function buildCarouselItems(chart: ChartCreateResponse): CarouselItem[] {
   const rj: any = chart.result_json ?? {};
   const artifacts: Record<string, string> =
     (rj && typeof rj === "object" ? rj.artifacts : {}) || {};
 
   const items: CarouselItem[] = [
-    { label: "Оригинал", src: originalUrl(chart.id) },
+    { label: "Оригинал", src: thumbUrl(chart.id, GALLERY_THUMB_SIZE), fullSrc: originalUrl(chart.id) },
 
     artifacts["lineformer_prediction"]
-      ? { label: "LineFormer", src: artifactUrl(chart.id, "lineformer_prediction") }
+      ? {
+          label: "LineFormer",
+          src: thumbUrl(chart.id, GALLERY_THUMB_SIZE, "lineformer_prediction"),
+          fullSrc: artifactUrl(chart.id, "lineformer_prediction"),
+        }
       : null,
 
     artifacts["chartdete_predictions"]
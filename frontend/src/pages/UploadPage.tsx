@@ -1,6 +1,6 @@
 import { useEffect, useMemo, useRef, useState } from "react";
 import { useNavigate } from "react-router-dom";
-import { getChart, uploadChart, logout, type ChartCreateResponse, type ChartStatus } from "../api/client";
+import { getChartStatuses, uploadChart, logout, type ChartCreateResponse, type ChartStatus } from "../api/client";
 import Button from "../components/ui/Button";
 import Card from "../components/ui/Card";
 import Badge from "../components/ui/Badge";
@@ -81,8 +81,9 @@ export default function UploadPage() {
     stopPolling();
     pollTimerRef.current = window.setInterval(async () => {
       try {
-        const fresh = await getChart(chartId);
-        setChart(fresh);
+        const [fresh] = await getChartStatuses([chartId]);
+        if (!fresh) throw new Error("Chart not found");
+        setChart((prev) => (prev ? { ...prev, ...fresh } : prev));
 
         if (fresh.status === "done" || fresh.status === "error") {
           stopPolling();
@@ -0,0 +1,153 @@
+"""
+Время холодного старта воркера.
+
+Запуск из ml-worker/:
+    python bench_startup.py --runs 5
+    python bench_startup.py --runs 3 --image input/chart.png   # + время до первой задачи
+
+Каждое измерение — в свежем интерпретаторе (subprocess), поэтому кэши модулей
+не переносятся между прогонами; кэш файлов ОС после первого прогона тёплый,
+его отдельно показывает строка run 1. Метрики:
+- import worker_modal — импорт модуля основным процессом;
+- import plextract — то, что раньше платил каждый новый процесс;
+- db connect — _connect() (если задан DATABASE_URL);
+- ready — старт процесса задач и _prewarm до сообщения ready;
+- first job — ready + первая задача на --image (вызывает Modal).
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+from pathlib import Path
+import statistics
+import subprocess
+import sys
+import tempfile
+
+HERE = Path(__file__).resolve().parent
+
+# Пробник выполняется файлом, а не через -c: spawn в JobRunner перезапускает
+# __main__ дочерним процессом, поэтому тело должно быть под __main__-guard.
+_PROBE = r"""
+import json, os, sys, time
+
+
+def probe():
+    t0 = time.perf_counter()
+    sys.path.insert(0, {here!r})
+    out = {{}}
+    mode = {mode!r}
+
+    if mode in ("import_worker", "import_plextract"):
+        import importlib
+        importlib.import_module("worker_modal" if mode == "import_worker" else "plextract")
+        out["seconds"] = time.perf_counter() - t0
+
+    elif mode == "db":
+        from dotenv import load_dotenv
+        import worker_modal
+        load_dotenv(os.path.join({here!r}, ".env"))
+        t1 = time.perf_counter()
+        worker_modal._connect().close()
+        out["seconds"] = time.perf_counter() - t1
+
+    else:
+        from pathlib import Path
+        import worker_modal
+        runner = worker_modal.JobRunner(Path({work_dir!r}))
+        try:
+            runner.start()
+            runner.wait_ready()
+            out["ready"] = time.perf_counter() - t0
+            if mode == "first_job":
+                try:
+                    runner.run(0, Path({image!r}), lambda: False)
+                except Exception as e:
+                    out["error"] = f"{{type(e).__name__}}: {{e}}"
+                out["first_job"] = time.perf_counter() - t0
+        finally:
+            runner.close()
+
+    print(json.dumps(out))
+
+
+if __name__ == "__main__":
+    probe()
+"""
+
+
+def _probe(mode: str, *, work_dir: str, image: str, env: dict[str, str]) -> dict:
+    code = _PROBE.format(here=str(HERE), mode=mode, work_dir=work_dir, image=image)
+    with tempfile.NamedTemporaryFile("w", suffix=".py", delete=False, encoding="utf-8") as f:
+        f.write(code)
+        script = f.name
+    try:
+        proc = subprocess.run(
+            [sys.executable, script],
+            capture_output=True,
+            text=True,
+            env=env,
+            cwd=str(HERE),
+        )
+    finally:
+        os.unlink(script)
+    if proc.returncode != 0:
+        raise RuntimeError(f"{mode} probe failed:\n{proc.stderr.strip()}")
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def _report(label: str, values: list[float]) -> None:
+    if not values:
+        return
+    print(
+        f"{label:<22} median {statistics.median(values):7.3f} s   "
+        f"min {min(values):7.3f} s   max {max(values):7.3f} s   run 1 {values[0]:7.3f} s"
+    )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--image", type=Path, help="изображение для замера первой задачи (вызывает Modal)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="bench_startup_") as tmp:
+        env = dict(os.environ)
+        # артефакты первой задачи — во временный storage, не в настоящий
+        env["STORAGE_DIR"] = str(Path(tmp) / "storage")
+        work_dir = str(Path(tmp) / "work")
+        image = str(args.image.resolve()) if args.image else ""
+
+        modes = ["import_worker", "import_plextract", "ready"]
+        if env.get("DATABASE_URL") or (HERE / ".env").exists():
+            modes.append("db")
+        if args.image:
+            modes.append("first_job")
+
+        results: dict[str, list[float]] = {}
+        for run in range(args.runs):
+            for mode in modes:
+                out = _probe(mode, work_dir=work_dir, image=image, env=env)
+                if "error" in out:
+                    print(f"run {run + 1} {mode}: {out['error']}", file=sys.stderr)
+                for key in ("seconds", "ready", "first_job"):
+                    if key in out:
+                        label = mode if key == "seconds" else key
+                        results.setdefault(label, []).append(out[key])
+
+    labels = {
+        "import_worker": "import worker_modal",
+        "import_plextract": "import plextract",
+        "db": "db connect",
+        "ready": "ready (spawn+prewarm)",
+        "first_job": "first job",
+    }
+    print(f"{args.runs} runs, python {sys.version.split()[0]}\n")
+    for key, label in labels.items():
+        _report(label, results.get(key, []))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,10 +1,20 @@
 from __future__ import annotations
 
+from array import array
+import importlib
+import importlib.util
 import json
+import math
+import multiprocessing
 import os
 import shutil
+import signal
+import socket
+import sys
+import threading
 import time
 import uuid
+from collections import deque
 from dataclasses import dataclass
 from datetime import datetime
 from pathlib import Path
@@ -12,9 +22,12 @@ from typing import Any, Dict, List, Optional, Tuple
 
 import psycopg2
 from dotenv import load_dotenv
-from psycopg2.extras import Json, RealDictCursor
+from psycopg2.extras import Json, RealDictCursor, execute_values
 
-from plextract import extract
+try:  # psutil необязателен: без него RSS читается из /proc (только Linux)
+    import psutil
+except ImportError:  # pragma: no cover - зависит от окружения
+    psutil = None
 
 # Чтобы меньше ловить Windows-ошибок кодировок при вызовах CLI
 os.environ.setdefault("PYTHONUTF8", "1")
@@ -48,66 +61,218 @@ def _connect():
     return conn
 
 
-def _fetch_one_and_mark_processing(conn) -> Optional[Job]:
+def _fetch_one_and_mark_processing(conn, worker_id: str) -> Optional[Job]:
     """
-    Берём одну задачу (status='uploaded') и атомарно переводим в processing.
-    SKIP LOCKED позволяет запускать несколько воркеров без конфликтов.
+    Берём одну задачу из chart_jobs и атомарно переводим её и chart в processing.
+    Выборка идёт по частичному индексу ix_chart_jobs_pending (только pending),
+    поэтому не зависит от числа charts. SKIP LOCKED позволяет запускать несколько
+    воркеров без конфликтов. Строка charts в этот момент узкая: result_json ещё нет.
     """
     with conn:
         with conn.cursor(cursor_factory=RealDictCursor) as cur:
             cur.execute(
                 """
-                SELECT id, original_path
-                FROM charts
-                WHERE status = %s
-                ORDER BY created_at ASC
-                FOR UPDATE SKIP LOCKED
-                LIMIT 1
+                WITH next_job AS (
+                    SELECT chart_id
+                    FROM chart_jobs
+                    WHERE state = 'pending'
+                    ORDER BY priority DESC, created_at, chart_id
+                    FOR UPDATE SKIP LOCKED
+                    LIMIT 1
+                )
+                UPDATE chart_jobs j
+                SET state = 'running',
+                    claimed_at = NOW(),
+                    claimed_by = %s,
+                    attempts = j.attempts + 1
+                FROM next_job
+                WHERE j.chart_id = next_job.chart_id
+                RETURNING j.chart_id
                 """,
-                ("uploaded",),
+                (worker_id,),
             )
             row = cur.fetchone()
             if not row:
                 return None
 
-            chart_id = int(row["id"])
+            chart_id = int(row["chart_id"])
             cur.execute(
                 """
                 UPDATE charts
                 SET status = %s,
                     error_message = NULL
                 WHERE id = %s
+                RETURNING original_path
                 """,
                 ("processing", chart_id),
             )
+            chart = cur.fetchone()
 
             return Job(
                 chart_id=chart_id,
-                original_path=str(row["original_path"]),
+                original_path=str(chart["original_path"]),
             )
 
 
+def _finish_job(cur, chart_id: int) -> bool:
+    """
+    Задача завершается вместе с записью результата — в той же транзакции.
+    False — строки уже нет: chart удалён во время обработки, писать некуда.
+    """
+    cur.execute("DELETE FROM chart_jobs WHERE chart_id = %s RETURNING chart_id", (chart_id,))
+    return cur.fetchone() is not None
+
+
+def _cancel_requested(conn, chart_id: int) -> bool:
+    """
+    Отмена кооперативная: POST /charts/{id}/cancel ставит cancel_requested,
+    удаление chart убирает строку задачи (ON DELETE CASCADE).
+    """
+    with conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT cancel_requested FROM chart_jobs WHERE chart_id = %s", (chart_id,))
+            row = cur.fetchone()
+    return row is None or bool(row[0])
+
+
+# Серии результата хранятся строками chart_series (см. app.services.chart_series в backend):
+# точки — float64 little-endian x0, y0, x1, y1, ..., в result_json на месте серии — {"id", "name"}.
+_SERIES_KEYS = {"id", "name", "style", "points"}
+
+
+def _series_row(panel_id: str, series: Any) -> Optional[Tuple[Any, ...]]:
+    if not isinstance(series, dict) or "points" not in series or not _SERIES_KEYS.issuperset(series):
+        return None
+    series_id, name, points = series.get("id"), series.get("name"), series["points"]
+    if not isinstance(series_id, str) or not (name is None or isinstance(name, str)):
+        return None
+    try:
+        xs = [float(p[0]) for p in points]
+        ys = [float(p[1]) for p in points]
+    except (TypeError, ValueError, IndexError, KeyError):
+        return None
+    if any(len(p) != 2 for p in points) or not all(map(math.isfinite, xs + ys)):
+        return None
+
+    flat = array("d")
+    for x, y in zip(xs, ys):
+        flat.append(x)
+        flat.append(y)
+    if sys.byteorder == "big":
+        flat.byteswap()
+    style = series.get("style")
+    return (
+        panel_id,
+        series_id,
+        name,
+        Json(style) if style is not None else None,
+        psycopg2.Binary(flat.tobytes()),
+        len(xs),
+        min(xs, default=None),
+        max(xs, default=None),
+        min(ys, default=None),
+        max(ys, default=None),
+    )
+
+
+def _split_series(result_json: Dict[str, Any]) -> Tuple[Dict[str, Any], List[Tuple[Any, ...]]]:
+    """
+    result_json -> (документ со ссылками на серии, строки chart_series без chart_id).
+    Серии с лишними полями, плохими точками или повторным id остаются в документе.
+    """
+    panels = result_json.get("panels")
+    if not isinstance(panels, list):
+        return result_json, []
+
+    rows: List[Tuple[Any, ...]] = []
+    seen: set = set()
+    out_panels = []
+    for panel in panels:
+        panel_id = panel.get("id") if isinstance(panel, dict) else None
+        if not isinstance(panel_id, str) or not isinstance(panel.get("series"), list):
+            out_panels.append(panel)
+            continue
+        series_list = []
+        for series in panel["series"]:
+            row = _series_row(panel_id, series)
+            if row is None or (panel_id, row[1]) in seen:
+                series_list.append(series)
+                continue
+            seen.add((panel_id, row[1]))
+            rows.append(row)
+            series_list.append({"id": row[1], "name": row[2]})
+        out_panels.append({**panel, "series": series_list})
+    return {**result_json, "panels": out_panels}, rows
+
+
+def _write_series(cur, chart_id: int, rows: List[Tuple[Any, ...]]) -> None:
+    """
+    Серии chart становятся ровно rows. Совпадающие с записанными строки не переписываются.
+    """
+    cur.execute(
+        """
+        DELETE FROM chart_series
+        WHERE chart_id = %s
+          AND (panel_id, series_id) NOT IN (SELECT * FROM unnest(%s::text[], %s::text[]))
+        """,
+        (chart_id, [r[0] for r in rows], [r[1] for r in rows]),
+    )
+    if not rows:
+        return
+    execute_values(
+        cur,
+        """
+        INSERT INTO chart_series
+            (chart_id, panel_id, series_id, name, style, points, point_count, x_min, x_max, y_min, y_max)
+        VALUES %s
+        ON CONFLICT (chart_id, panel_id, series_id) DO UPDATE
+        SET name = EXCLUDED.name,
+            style = EXCLUDED.style,
+            points = EXCLUDED.points,
+            point_count = EXCLUDED.point_count,
+            x_min = EXCLUDED.x_min,
+            x_max = EXCLUDED.x_max,
+            y_min = EXCLUDED.y_min,
+            y_max = EXCLUDED.y_max,
+            version = chart_series.version + 1
+        WHERE (chart_series.name, chart_series.style, chart_series.points)
+              IS DISTINCT FROM (EXCLUDED.name, EXCLUDED.style, EXCLUDED.points)
+        """,
+        [(chart_id, *r) for r in rows],
+    )
+
+
 def _mark_done(conn, chart_id: int, result_json: Dict[str, Any], n_panels: int, n_series: int) -> None:
+    result_json, series_rows = _split_series(result_json)
     with conn:
         with conn.cursor() as cur:
+            if not _finish_job(cur, chart_id):
+                return
             cur.execute(
                 """
                 UPDATE charts
                 SET status = %s,
                     result_json = %s,
+                    result_version = result_version + 1,
                     n_panels = %s,
                     n_series = %s,
                     processed_at = NOW(),
-                    error_message = NULL
+                    error_message = NULL,
+                    archived_at = NULL,
+                    archive_sha256 = NULL
                 WHERE id = %s
                 """,
                 ("done", Json(result_json), n_panels, n_series, chart_id),
             )
+            # после charts: тот же порядок блокировок, что у backend
+            _write_series(cur, chart_id, series_rows)
 
 
 def _mark_error(conn, chart_id: int, message: str, result_json: Optional[Dict[str, Any]] = None) -> None:
     with conn:
         with conn.cursor() as cur:
+            if not _finish_job(cur, chart_id):
+                return
             if result_json is None:
                 cur.execute(
                     """
@@ -126,24 +291,199 @@ def _mark_error(conn, chart_id: int, message: str, result_json: Optional[Dict[st
                     SET status = %s,
                         error_message = %s,
                         processed_at = NOW(),
-                        result_json = %s
+                        result_json = %s,
+                        archived_at = NULL,
+                        archive_sha256 = NULL
                     WHERE id = %s
                     """,
                     ("error", message[:2000], Json(result_json), chart_id),
                 )
+                # документ заменён целиком, серий в нём нет
+                cur.execute("DELETE FROM chart_series WHERE chart_id = %s", (chart_id,))
+
+
+class Heartbeat(threading.Thread):
+    """
+    Строка воркера в таблице workers (телеметрия очереди в backend): last_seen_at,
+    текущая задача, счётчики и задач в минуту. Своё соединение и поток — основной цикл
+    может минутами ждать plextract. Раз в минуту заодно возвращает в очередь задачи
+    воркеров, переставших отмечаться (last_seen_at старше WORKER_STALE_SECONDS);
+    задача, уронившая воркер WORKER_MAX_ATTEMPTS раз, завершается ошибкой.
+    """
+
+    RATE_WINDOW_SECONDS = 300
+    PRUNE_EVERY_SECONDS = 60
+    ORPHAN_GRACE_SECONDS = 300
+
+    def __init__(self, interval: float) -> None:
+        super().__init__(name="heartbeat", daemon=True)
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.interval = interval
+        # живой воркер отмечается раз в interval: порог не меньше трёх пропущенных отметок
+        self.stale_seconds = max(_env_float("WORKER_STALE_SECONDS", 60.0), 3 * interval)
+        self.max_attempts = max(int(_env_float("WORKER_MAX_ATTEMPTS", 3.0)), 1)
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._t0 = time.monotonic()
+        self._finished: deque[float] = deque()
+        self._current: Optional[int] = None
+        self._done = 0
+        self._failed = 0
+        self._warned = False
+
+    def job_started(self, chart_id: int) -> None:
+        with self._lock:
+            self._current = chart_id
+
+    def job_finished(self, ok: bool) -> None:
+        with self._lock:
+            self._current = None
+            self._finished.append(time.monotonic())
+            if ok:
+                self._done += 1
+            else:
+                self._failed += 1
+
+    def _state(self) -> tuple[Optional[int], int, int, float]:
+        now = time.monotonic()
+        with self._lock:
+            while self._finished and now - self._finished[0] > self.RATE_WINDOW_SECONDS:
+                self._finished.popleft()
+            # сразу после старта окно не короче минуты, иначе одна задача даёт сотни в минуту
+            window = min(max(now - self._t0, 60.0), self.RATE_WINDOW_SECONDS)
+            per_minute = len(self._finished) * 60.0 / window
+            return self._current, self._done, self._failed, per_minute
+
+    def _beat(self, conn) -> None:
+        current, done, failed, per_minute = self._state()
+        with conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    """
+                    INSERT INTO workers (
+                        id, hostname, pid, started_at, last_seen_at,
+                        current_chart_id, jobs_done, jobs_failed, jobs_per_minute
+                    )
+                    VALUES (%s, %s, %s, NOW(), NOW(), %s, %s, %s, %s)
+                    ON CONFLICT (id) DO UPDATE
+                    SET last_seen_at = NOW(),
+                        current_chart_id = EXCLUDED.current_chart_id,
+                        jobs_done = EXCLUDED.jobs_done,
+                        jobs_failed = EXCLUDED.jobs_failed,
+                        jobs_per_minute = EXCLUDED.jobs_per_minute
+                    """,
+                    (self.worker_id, socket.gethostname(), os.getpid(), current, done, failed, per_minute),
+                )
+
+    def _prune(self, conn) -> None:
+        prune_hours = float(os.getenv("WORKER_PRUNE_HOURS", "24"))
+        # задачи воркеров без свежей отметки: процесс убит или завис.
+        # ORPHAN_GRACE_SECONDS: у только что запущенного воркера строки ещё может не быть
+        orphaned = """
+            j.state = 'running'
+            AND j.claimed_at < NOW() - %(grace)s * INTERVAL '1 second'
+            AND NOT EXISTS (
+                SELECT 1 FROM workers w
+                WHERE w.id = j.claimed_by
+                  AND w.last_seen_at >= NOW() - %(stale)s * INTERVAL '1 second'
+            )
+        """
+        params = {
+            "grace": self.ORPHAN_GRACE_SECONDS,
+            "stale": self.stale_seconds,
+            "max_attempts": self.max_attempts,
+            "message": f"Processing failed: worker died on this chart {self.max_attempts} times",
+        }
+        with conn:
+            with conn.cursor() as cur:
+                # строки процессов, убитых без штатного завершения
+                cur.execute(
+                    "DELETE FROM workers WHERE last_seen_at < NOW() - %s * INTERVAL '1 hour'",
+                    (prune_hours,),
+                )
+                # попытки исчерпаны — скорее всего, задача сама роняет воркер: в очередь не возвращаем
+                cur.execute(
+                    f"""
+                    WITH failed AS (
+                        DELETE FROM chart_jobs j
+                        WHERE {orphaned} AND j.attempts >= %(max_attempts)s
+                        RETURNING j.chart_id
+                    )
+                    UPDATE charts c
+                    SET status = 'error',
+                        error_message = %(message)s,
+                        processed_at = NOW()
+                    FROM failed
+                    WHERE c.id = failed.chart_id
+                    """,
+                    params,
+                )
+                cur.execute(
+                    f"""
+                    WITH requeued AS (
+                        UPDATE chart_jobs j
+                        SET state = 'pending', claimed_at = NULL, claimed_by = NULL
+                        WHERE {orphaned}
+                        RETURNING j.chart_id
+                    )
+                    UPDATE charts c
+                    SET status = 'uploaded'
+                    FROM requeued
+                    WHERE c.id = requeued.chart_id AND c.status = 'processing'
+                    """,
+                    params,
+                )
+
+    def run(self) -> None:
+        conn = None
+        last_prune = float("-inf")
+        while not self._stopping.is_set():
+            try:
+                if conn is None or conn.closed:
+                    conn = _connect()
+                self._beat(conn)
+                if time.monotonic() - last_prune >= self.PRUNE_EVERY_SECONDS:
+                    self._prune(conn)
+                    last_prune = time.monotonic()
+            except psycopg2.Error as e:
+                # таблицы может не быть (миграции backend не применены) — обработка идёт и без неё
+                if not self._warned:
+                    print(f"[WORKER] heartbeat failed: {e}")
+                    self._warned = True
+                if conn is not None:
+                    conn.close()
+                conn = None
+            self._stopping.wait(self.interval)
+
+        if conn is not None and not conn.closed:
+            try:
+                with conn:
+                    with conn.cursor() as cur:
+                        cur.execute("DELETE FROM workers WHERE id = %s", (self.worker_id,))
+            except psycopg2.Error:
+                pass
+            conn.close()
+
+    def stop(self) -> None:
+        self._stopping.set()
+        self.join(timeout=self.interval + 5)
 
 
 def _get_storage_dir_from_original(original_path: Path) -> Path:
     """
     Где хранить артефакты.
     1) Если задан STORAGE_DIR в env — используем его
-    2) Иначе берём родителя папки user_<id> (т.е. storage/)
-       original_path обычно: storage/user_<id>/<sha>.<ext>
+    2) Иначе восстанавливаем storage/ из пути оригинала:
+       storage/blobs/<ab>/<sha>.<ext> или (старые загрузки) storage/user_<id>/<sha>.<ext>
     """
     env = os.getenv("STORAGE_DIR")
     if env:
         return Path(env).resolve()
-    return original_path.resolve().parent.parent
+    resolved = original_path.resolve()
+    for parent in resolved.parents:
+        if parent.name == "blobs" or parent.name.startswith("user_"):
+            return parent.parent
+    return resolved.parent.parent
 
 
 def _first_match(root: Path, pattern: str, must_contain_part: str) -> Optional[Path]:
@@ -157,6 +497,36 @@ def _pick_latest(paths: list[Path]) -> Optional[Path]:
     return max(paths, key=lambda p: p.stat().st_mtime)
 
 
+# Размеры и имена превью совпадают с app/services/renditions.py в backend
+THUMB_SIZES = (160, 320, 640)
+
+
+def _make_thumbnails(src: Path) -> None:
+    """
+    WebP-превью артефакта рядом с ним: prediction.png -> prediction.thumb_320.webp.
+    Необязательно: без Pillow или при WORKER_THUMBNAILS=0 backend создаст их сам при первом запросе.
+    """
+    if os.getenv("WORKER_THUMBNAILS", "1").strip().lower() in {"0", "false", "no", "off"}:
+        return
+    try:
+        from PIL import Image, ImageOps
+    except ImportError:
+        return
+
+    try:
+        with Image.open(src) as opened:
+            img = ImageOps.exif_transpose(opened)
+            img = img.convert("RGBA" if img.mode in ("RGBA", "LA", "P") else "RGB")
+            for size in sorted(THUMB_SIZES, reverse=True):
+                img.thumbnail((size, size), Image.Resampling.LANCZOS)
+                dst = src.with_name(f"{src.stem}.thumb_{size}.webp")
+                tmp = dst.with_name(dst.name + ".part")
+                img.save(tmp, format="WEBP", quality=80, method=4)
+                os.replace(tmp, dst)
+    except Exception as e:
+        print(f"[WORKER] thumbnails skipped for {src}: {e}")
+
+
 def _collect_and_copy_artifacts(run_root: Path, chart_id: int, storage_dir: Path) -> dict[str, str]:
     """
     Копируем артефакты в storage/charts/<chart_id>/...
@@ -180,6 +550,7 @@ def _collect_and_copy_artifacts(run_root: Path, chart_id: int, storage_dir: Path
         dst_dir.mkdir(parents=True, exist_ok=True)
         dst = dst_dir / src.name
         shutil.copy2(src, dst)
+        _make_thumbnails(dst)
         artifacts["lineformer_prediction"] = dst.relative_to(storage_dir).as_posix()
 
     # chartdete/predictions.*
@@ -287,7 +658,10 @@ def _run_plextract(chart_id: int, original_path: Path, work_dir: Path) -> Tuple[
     # Копируем 1 файл в input_dir (изолируем запуск)
     shutil.copy2(original_path, input_dir / original_path.name)
 
-    # Запуск через Modal
+    # Запуск через Modal. plextract тянет ML-зависимости: импортируется только
+    # в процессе задачи (и заранее — в _prewarm), основному процессу он не нужен
+    from plextract import extract
+
     extract(input_dir=str(input_dir), output_dir=str(output_dir), backend="modal")
 
     # Всегда собираем/копируем артефакты в storage/charts/<chart_id>/...
@@ -312,6 +686,238 @@ def _run_plextract(chart_id: int, original_path: Path, work_dir: Path) -> Tuple[
     return result_json, n_panels, n_series
 
 
+# ---------- изоляция задач: дочерний процесс с таймаутом, лимитом памяти и отменой ----------
+
+class JobAborted(Exception):
+    """
+    Задачу остановил сам воркер (таймаут, память, отмена); дочерний процесс убит.
+    """
+
+    def __init__(self, message: str, cancelled: bool = False):
+        super().__init__(message)
+        self.cancelled = cancelled
+
+
+def _env_float(name: str, default: float) -> float:
+    raw = os.getenv(name)
+    return float(raw) if raw not in (None, "") else default
+
+
+# импортируются заранее, до первой задачи; modal — клиент backend="modal", если установлен
+PREWARM_MODULES = ("plextract", "modal")
+
+
+def _prewarm() -> float:
+    """
+    Всё, что первая задача иначе оплатила бы сама: импорт plextract и клиента Modal.
+    Возвращает затраченные секунды.
+    """
+    started = time.perf_counter()
+    for name in PREWARM_MODULES:
+        if name == "plextract" or importlib.util.find_spec(name) is not None:
+            importlib.import_module(name)
+    return time.perf_counter() - started
+
+
+def _child_main(pipe, work_dir: str) -> None:
+    """
+    Цикл дочернего процесса: прогрев, ("ready", секунды), затем получает
+    (chart_id, original_path) и отвечает результатом.
+    Своя группа процессов (POSIX): при убийстве задачи уходят и запущенные ею CLI.
+    """
+    if hasattr(os, "setsid"):
+        os.setsid()
+    try:
+        pipe.send(("ready", _prewarm()))
+    except BaseException as e:
+        pipe.send(("error", f"prewarm failed: {type(e).__name__}: {e}"))
+        return
+    while True:
+        try:
+            msg = pipe.recv()
+        except EOFError:
+            return
+        if msg is None:
+            return
+        chart_id, original_path = msg
+        try:
+            result = _run_plextract(chart_id, Path(original_path), Path(work_dir))
+            pipe.send(("ok", result))
+        except PipelineError as e:
+            pipe.send(("pipeline_error", str(e), e.artifacts))
+        except BaseException as e:
+            pipe.send(("error", f"{type(e).__name__}: {e}"))
+
+
+def _rss_bytes(pid: int) -> Optional[int]:
+    """
+    RSS процесса вместе с потомками (psutil), без psutil — только самого процесса из /proc.
+    None — измерить нечем (не Linux и нет psutil).
+    """
+    if psutil is not None:
+        try:
+            proc = psutil.Process(pid)
+            total = proc.memory_info().rss
+            for child in proc.children(recursive=True):
+                try:
+                    total += child.memory_info().rss
+                except psutil.Error:
+                    pass
+            return total
+        except psutil.Error:
+            return None
+    try:
+        with open(f"/proc/{pid}/statm", "rb") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+class JobRunner:
+    """
+    Выполняет _run_plextract в дочернем процессе (spawn: без унаследованных соединений
+    и потоков). Родитель ждёт ответ и следит за таймаутом JOB_TIMEOUT_SECONDS,
+    RSS JOB_MAX_RSS_MB и флагом отмены; при срабатывании процесс убивается.
+    Процесс переиспользуется и пересоздаётся после JOB_MAX_PER_CHILD задач — утечки
+    памяти в plextract не копятся. Новый процесс прогревается сразу (_prewarm),
+    пока основной процесс пишет результат предыдущей задачи.
+    """
+
+    POLL_SECONDS = 0.5
+
+    def __init__(self, work_dir: Path) -> None:
+        self.work_dir = work_dir
+        self.timeout = _env_float("JOB_TIMEOUT_SECONDS", 1800.0)
+        self.max_rss = int(_env_float("JOB_MAX_RSS_MB", 4096.0) * 1024 * 1024)
+        self.max_jobs = max(int(_env_float("JOB_MAX_PER_CHILD", 50.0)), 1)
+        self.cancel_check = _env_float("CANCEL_CHECK_SECONDS", 5.0)
+        self.prewarm_timeout = _env_float("WORKER_PREWARM_TIMEOUT_SECONDS", 300.0)
+        self._ctx = multiprocessing.get_context("spawn")
+        self._proc = None
+        self._pipe = None
+        self._jobs = 0
+        self._ready = False
+        self._rss_warned = False
+
+    def start(self) -> None:
+        parent, child = self._ctx.Pipe()
+        self._proc = self._ctx.Process(
+            target=_child_main,
+            args=(child, str(self.work_dir)),
+            name="plextract-job",
+            daemon=True,
+        )
+        self._proc.start()
+        child.close()
+        self._pipe = parent
+        self._jobs = 0
+        self._ready = False
+
+    def wait_ready(self) -> float:
+        """
+        Ждёт конца прогрева дочернего процесса. Возвращает его длительность в секундах.
+        """
+        if self._proc is None:
+            self.start()
+        if not self._pipe.poll(self.prewarm_timeout if self.prewarm_timeout > 0 else None):
+            self._kill()
+            raise RuntimeError(f"Job process did not warm up in {int(self.prewarm_timeout)} s")
+        try:
+            msg = self._pipe.recv()
+        except EOFError:
+            code = self._proc.exitcode
+            self._kill()
+            raise RuntimeError(f"Job process exited during warm-up (exit code {code})")
+        if msg[0] != "ready":
+            self._kill()
+            raise RuntimeError(msg[1])
+        self._ready = True
+        return float(msg[1])
+
+    def _kill(self) -> None:
+        proc = self._proc
+        if proc is not None and proc.is_alive():
+            try:
+                if hasattr(os, "killpg"):
+                    os.killpg(proc.pid, signal.SIGKILL)
+                else:
+                    proc.kill()
+            except (ProcessLookupError, PermissionError):
+                proc.kill()
+            proc.join(5)
+        if self._pipe is not None:
+            self._pipe.close()
+        self._proc = None
+        self._pipe = None
+
+    def close(self) -> None:
+        if self._proc is not None and self._proc.is_alive():
+            try:
+                self._pipe.send(None)
+            except OSError:
+                pass
+            self._proc.join(5)
+        self._kill()
+
+    def _over_memory(self) -> bool:
+        if self.max_rss <= 0:
+            return False
+        rss = _rss_bytes(self._proc.pid)
+        if rss is None:
+            if not self._rss_warned:
+                print("[WORKER] JOB_MAX_RSS_MB is not enforced: install psutil or run on Linux")
+                self._rss_warned = True
+            return False
+        return rss > self.max_rss
+
+    def run(self, chart_id: int, original_path: Path, should_cancel) -> Tuple[Dict[str, Any], int, int]:
+        if self._proc is None or not self._proc.is_alive():
+            self._kill()
+            self.start()
+        if not self._ready:
+            self.wait_ready()
+
+        self._pipe.send((chart_id, str(original_path)))
+        started = time.monotonic()
+        next_cancel_check = started + self.cancel_check
+
+        while not self._pipe.poll(self.POLL_SECONDS):
+            now = time.monotonic()
+            if not self._proc.is_alive():
+                code = self._proc.exitcode
+                self._kill()
+                raise RuntimeError(f"Job process exited unexpectedly (exit code {code})")
+            if self.timeout > 0 and now - started > self.timeout:
+                self._kill()
+                raise JobAborted(f"Job timed out after {int(self.timeout)} s")
+            if self._over_memory():
+                self._kill()
+                raise JobAborted(f"Job exceeded memory limit ({self.max_rss // (1024 * 1024)} MiB)")
+            if now >= next_cancel_check:
+                next_cancel_check = now + self.cancel_check
+                if should_cancel():
+                    self._kill()
+                    raise JobAborted("Cancelled", cancelled=True)
+
+        try:
+            msg = self._pipe.recv()
+        except EOFError:
+            code = self._proc.exitcode if self._proc is not None else None
+            self._kill()
+            raise RuntimeError(f"Job process exited unexpectedly (exit code {code})")
+
+        self._jobs += 1
+        if self._jobs >= self.max_jobs:
+            self.close()
+            self.start()
+
+        if msg[0] == "ok":
+            return msg[1]
+        if msg[0] == "pipeline_error":
+            raise PipelineError(msg[1], msg[2])
+        raise RuntimeError(msg[1])
+
+
 def main() -> int:
     load_dotenv(Path(__file__).with_name(".env"))
 
@@ -319,33 +925,66 @@ def main() -> int:
     work_dir = Path(os.getenv("WORK_DIR", str(Path.cwd() / "runs" / "worker"))).resolve()
     work_dir.mkdir(parents=True, exist_ok=True)
 
+    # прогрев процесса задач идёт параллельно с подключением к БД;
+    # воркер появляется в workers (heartbeat) только когда готов брать задачи
+    started = time.perf_counter()
+    runner = JobRunner(work_dir)
+    runner.start()
     conn = _connect()
-    print("[WORKER] started; work_dir =", work_dir)
-
-    while True:
-        job = _fetch_one_and_mark_processing(conn)
-        if not job:
-            time.sleep(poll_interval)
-            continue
+    db_seconds = time.perf_counter() - started
+    prewarm_seconds = runner.wait_ready()
 
-        chart_id = job.chart_id
+    heartbeat = Heartbeat(float(os.getenv("WORKER_HEARTBEAT_SECONDS", "10")))
+    heartbeat.start()
+    print(
+        f"[WORKER] ready in {time.perf_counter() - started:.2f} s "
+        f"(db {db_seconds:.2f} s, prewarm {prewarm_seconds:.2f} s); "
+        f"id = {heartbeat.worker_id}, work_dir = {work_dir}"
+    )
 
-        try:
-            original_path = Path(job.original_path)
-            if not original_path.exists():
-                raise RuntimeError(f"Original file not found: {original_path}")
+    try:
+        while True:
+            job = _fetch_one_and_mark_processing(conn, heartbeat.worker_id)
+            if not job:
+                time.sleep(poll_interval)
+                continue
 
-            result_json, n_panels, n_series = _run_plextract(chart_id, original_path, work_dir)
-            _mark_done(conn, chart_id, result_json, n_panels, n_series)
-            print(f"[WORKER] chart {chart_id}: DONE (series={n_series})")
+            chart_id = job.chart_id
+            heartbeat.job_started(chart_id)
+            ok = False
 
-        except PipelineError as e:
-            _mark_error(conn, chart_id, str(e), result_json={"artifacts": e.artifacts})
-            print(f"[WORKER] chart {chart_id}: ERROR (with artifacts) -> {e}")
-
-        except Exception as e:
-            _mark_error(conn, chart_id, str(e))
-            print(f"[WORKER] chart {chart_id}: ERROR -> {e}")
+            try:
+                original_path = Path(job.original_path)
+                if not original_path.exists():
+                    raise RuntimeError(f"Original file not found: {original_path}")
+
+                result_json, n_panels, n_series = runner.run(
+                    chart_id,
+                    original_path,
+                    lambda: _cancel_requested(conn, chart_id),
+                )
+                _mark_done(conn, chart_id, result_json, n_panels, n_series)
+                ok = True
+                print(f"[WORKER] chart {chart_id}: DONE (series={n_series})")
+
+            except JobAborted as e:
+                # удалённый chart _mark_error пропустит: строки задачи уже нет
+                _mark_error(conn, chart_id, str(e))
+                print(f"[WORKER] chart {chart_id}: {'CANCELLED' if e.cancelled else 'ABORTED'} -> {e}")
+
+            except PipelineError as e:
+                _mark_error(conn, chart_id, str(e), result_json={"artifacts": e.artifacts})
+                print(f"[WORKER] chart {chart_id}: ERROR (with artifacts) -> {e}")
+
+            except Exception as e:
+                _mark_error(conn, chart_id, str(e))
+                print(f"[WORKER] chart {chart_id}: ERROR -> {e}")
+
+            finally:
+                heartbeat.job_finished(ok)
+    finally:
+        runner.close()
+        heartbeat.stop()
 
 
 if __name__ == "__main__":
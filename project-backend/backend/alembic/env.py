@@ -10,7 +10,7 @@ sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
 
 from app.core.config import settings
 from app.db.base import Base
-from app.db.models import user, chart  # noqa: F401  # важно импортировать модели
+from app.db.models import user, chart, blob  # noqa: F401  # важно импортировать модели
 
 
 # this is the Alembic Config object, which provides
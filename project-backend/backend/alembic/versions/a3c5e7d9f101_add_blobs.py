@@ -0,0 +1,56 @@
+"""add blobs (content-addressed originals)
+
+Revision ID: a3c5e7d9f101
+Revises: 38b1f13b029e
+Create Date: 2026-10-19 10:12:04.118203
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3c5e7d9f101'
+down_revision: Union[str, Sequence[str], None] = '38b1f13b029e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('blobs',
+    sa.Column('sha256', sa.String(length=64), nullable=False),
+    sa.Column('path', sa.String(length=1024), nullable=False),
+    sa.Column('size_bytes', sa.BigInteger(), nullable=True),
+    sa.Column('ref_count', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.Column('unreferenced_at', sa.DateTime(timezone=True), nullable=True),
+    sa.PrimaryKeyConstraint('sha256')
+    )
+    # сборщик ищет только блобы без ссылок — частичный индекс маленький
+    op.create_index(
+        'ix_blobs_unreferenced_at',
+        'blobs',
+        ['unreferenced_at'],
+        unique=False,
+        postgresql_where=sa.text('ref_count <= 0'),
+    )
+
+    # Существующие оригиналы (storage/user_<id>/<sha>.<ext>) становятся блобами как есть;
+    # новые загрузки с тем же sha256 будут ссылаться на этот же файл.
+    op.execute(
+        """
+        INSERT INTO blobs (sha256, path, size_bytes, ref_count, created_at)
+        SELECT sha256, MIN(original_path), NULL, COUNT(*), MIN(created_at)
+        FROM charts
+        GROUP BY sha256
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_blobs_unreferenced_at', table_name='blobs')
+    op.drop_table('blobs')
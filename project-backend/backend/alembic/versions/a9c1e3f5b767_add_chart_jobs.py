@@ -0,0 +1,60 @@
+"""add chart_jobs: narrow processing queue with a partial index on pending jobs
+
+Revision ID: a9c1e3f5b767
+Revises: f8b0d2e4a656
+Create Date: 2026-10-19 19:02:14.660893
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a9c1e3f5b767'
+down_revision: Union[str, Sequence[str], None] = 'f8b0d2e4a656'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('chart_jobs',
+    sa.Column('chart_id', sa.Integer(), nullable=False),
+    sa.Column('state', sa.String(length=16), server_default=sa.text("'pending'"), nullable=False),
+    sa.Column('priority', sa.SmallInteger(), server_default=sa.text('0'), nullable=False),
+    sa.Column('attempts', sa.Integer(), server_default=sa.text('0'), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.Column('claimed_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('claimed_by', sa.String(length=128), nullable=True),
+    sa.ForeignKeyConstraint(['chart_id'], ['charts.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('chart_id')
+    )
+    op.create_index(
+        'ix_chart_jobs_pending',
+        'chart_jobs',
+        [sa.text('priority DESC'), 'created_at', 'chart_id'],
+        unique=False,
+        postgresql_where=sa.text("state = 'pending'"),
+    )
+
+    # Перенос очереди. Воркеры на время миграции остановлены: processing без живого
+    # воркера становится running без claimed_by, и воркер вернёт такие задачи в pending.
+    op.execute(
+        """
+        INSERT INTO chart_jobs (chart_id, state, created_at, claimed_at)
+        SELECT id,
+               CASE WHEN status = 'processing' THEN 'running' ELSE 'pending' END,
+               created_at,
+               CASE WHEN status = 'processing' THEN now() END
+        FROM charts
+        WHERE status IN ('uploaded', 'processing')
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_chart_jobs_pending', table_name='chart_jobs')
+    op.drop_table('chart_jobs')
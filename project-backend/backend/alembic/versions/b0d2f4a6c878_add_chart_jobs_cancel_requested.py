@@ -0,0 +1,31 @@
+"""add chart_jobs.cancel_requested for cooperative cancellation of running jobs
+
+Revision ID: b0d2f4a6c878
+Revises: a9c1e3f5b767
+Create Date: 2026-10-19 19:48:53.127406
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b0d2f4a6c878'
+down_revision: Union[str, Sequence[str], None] = 'a9c1e3f5b767'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column(
+        'chart_jobs',
+        sa.Column('cancel_requested', sa.Boolean(), server_default=sa.text('false'), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('chart_jobs', 'cancel_requested')
@@ -0,0 +1,34 @@
+"""add partial index for active charts per user
+
+Revision ID: b4d6f8a0c212
+Revises: a3c5e7d9f101
+Create Date: 2026-10-19 11:02:37.550914
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b4d6f8a0c212'
+down_revision: Union[str, Sequence[str], None] = 'a3c5e7d9f101'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(
+        'ix_charts_user_active',
+        'charts',
+        ['user_id', 'created_at'],
+        unique=False,
+        postgresql_where=sa.text("status IN ('uploaded', 'processing')"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_charts_user_active', table_name='charts')
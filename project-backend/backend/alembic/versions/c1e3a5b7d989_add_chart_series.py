@@ -0,0 +1,213 @@
+"""add chart_series: one row per result series, points as float64 bytea; backfill from result_json
+
+Revision ID: c1e3a5b7d989
+Revises: b0d2f4a6c878
+Create Date: 2026-10-19 21:06:41.538172
+
+"""
+from array import array
+import json
+import math
+import sys
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c1e3a5b7d989'
+down_revision: Union[str, Sequence[str], None] = 'b0d2f4a6c878'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 500
+
+# Правила те же, что у app.services.chart_series, но своя копия: миграция
+# не должна меняться вместе с кодом приложения.
+_SERIES_KEYS = {"id", "name", "style", "points"}
+
+_INSERT_SERIES = sa.text(
+    """
+    INSERT INTO chart_series
+        (chart_id, panel_id, series_id, name, style, points, point_count, x_min, x_max, y_min, y_max)
+    VALUES
+        (:chart_id, :panel_id, :series_id, :name, CAST(:style AS jsonb), :points, :point_count,
+         :x_min, :x_max, :y_min, :y_max)
+    """
+)
+_UPDATE_RESULT = sa.text("UPDATE charts SET result_json = CAST(:doc AS jsonb) WHERE id = :id")
+
+
+def _series_row(chart_id, panel_id, series):
+    if not isinstance(series, dict) or "points" not in series or not _SERIES_KEYS.issuperset(series):
+        return None
+    series_id, name, points = series.get("id"), series.get("name"), series["points"]
+    if not isinstance(series_id, str) or not (name is None or isinstance(name, str)):
+        return None
+    if not isinstance(points, list) or any(not isinstance(p, list) or len(p) != 2 for p in points):
+        return None
+    try:
+        xs = [float(p[0]) for p in points]
+        ys = [float(p[1]) for p in points]
+    except (TypeError, ValueError):
+        return None
+    if not all(map(math.isfinite, xs + ys)):
+        return None
+
+    flat = array("d", [v for xy in zip(xs, ys) for v in xy])
+    if sys.byteorder == "big":
+        flat.byteswap()
+    style = series.get("style")
+    return {
+        "chart_id": chart_id,
+        "panel_id": panel_id,
+        "series_id": series_id,
+        "name": name,
+        "style": json.dumps(style) if style is not None else None,
+        "points": flat.tobytes(),
+        "point_count": len(xs),
+        "x_min": min(xs, default=None),
+        "x_max": max(xs, default=None),
+        "y_min": min(ys, default=None),
+        "y_max": max(ys, default=None),
+    }
+
+
+def _split(chart_id, doc):
+    panels = doc.get("panels") if isinstance(doc, dict) else None
+    if not isinstance(panels, list):
+        return doc, []
+
+    rows, seen, out_panels = [], set(), []
+    for panel in panels:
+        panel_id = panel.get("id") if isinstance(panel, dict) else None
+        if not isinstance(panel_id, str) or not isinstance(panel.get("series"), list):
+            out_panels.append(panel)
+            continue
+        series_list = []
+        for series in panel["series"]:
+            row = _series_row(chart_id, panel_id, series)
+            if row is None or (panel_id, row["series_id"]) in seen:
+                series_list.append(series)
+                continue
+            seen.add((panel_id, row["series_id"]))
+            rows.append(row)
+            series_list.append({"id": row["series_id"], "name": row["name"]})
+        out_panels.append({**panel, "series": series_list})
+    return {**doc, "panels": out_panels}, rows
+
+
+def _points(data):
+    flat = array("d")
+    flat.frombytes(bytes(data))
+    if sys.byteorder == "big":
+        flat.byteswap()
+    return [[flat[i], flat[i + 1]] for i in range(0, len(flat), 2)]
+
+
+def _assemble(doc, rows):
+    by_key = {(r.panel_id, r.series_id): r for r in rows}
+    panels = []
+    for panel in doc.get("panels") or []:
+        if isinstance(panel, dict) and isinstance(panel.get("series"), list):
+            series_list = []
+            for series in panel["series"]:
+                row = None
+                if isinstance(series, dict) and "points" not in series:
+                    row = by_key.get((panel.get("id"), series.get("id")))
+                if row is not None:
+                    series = {"id": row.series_id, "name": row.name, "style": row.style, "points": _points(row.points)}
+                series_list.append(series)
+            panel = {**panel, "series": series_list}
+        panels.append(panel)
+    return {**doc, "panels": panels}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('chart_series',
+    sa.Column('chart_id', sa.Integer(), nullable=False),
+    sa.Column('panel_id', sa.Text(), nullable=False),
+    sa.Column('series_id', sa.Text(), nullable=False),
+    sa.Column('name', sa.Text(), nullable=True),
+    sa.Column('style', postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+    sa.Column('points', sa.LargeBinary(), nullable=False),
+    sa.Column('point_count', sa.Integer(), nullable=False),
+    sa.Column('x_min', sa.Float(), nullable=True),
+    sa.Column('x_max', sa.Float(), nullable=True),
+    sa.Column('y_min', sa.Float(), nullable=True),
+    sa.Column('y_max', sa.Float(), nullable=True),
+    sa.Column('version', sa.Integer(), server_default=sa.text('0'), nullable=False),
+    sa.ForeignKeyConstraint(['chart_id'], ['charts.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('chart_id', 'panel_id', 'series_id')
+    )
+
+    # Перенос серий пачками по id. Архивированные charts не трогаем: в строке заглушка,
+    # серии появятся при возврате из архива.
+    conn = op.get_bind()
+    last_id = 0
+    while True:
+        charts = conn.execute(
+            sa.text(
+                """
+                SELECT id, result_json FROM charts
+                WHERE id > :last_id AND archived_at IS NULL AND result_json IS NOT NULL
+                ORDER BY id
+                LIMIT :limit
+                """
+            ),
+            {"last_id": last_id, "limit": BATCH_SIZE},
+        ).all()
+        if not charts:
+            break
+        last_id = charts[-1].id
+
+        series_rows, docs = [], []
+        for chart in charts:
+            doc, rows = _split(chart.id, chart.result_json)
+            if rows:
+                series_rows.extend(rows)
+                docs.append({"id": chart.id, "doc": json.dumps(doc)})
+        if series_rows:
+            conn.execute(_INSERT_SERIES, series_rows)
+            conn.execute(_UPDATE_RESULT, docs)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # точки возвращаются в result_json
+    conn = op.get_bind()
+    last_id = 0
+    while True:
+        charts = conn.execute(
+            sa.text(
+                """
+                SELECT id, result_json FROM charts
+                WHERE id > :last_id AND id IN (SELECT chart_id FROM chart_series)
+                ORDER BY id
+                LIMIT :limit
+                """
+            ),
+            {"last_id": last_id, "limit": BATCH_SIZE},
+        ).all()
+        if not charts:
+            break
+        last_id = charts[-1].id
+
+        by_chart = {}
+        for row in conn.execute(
+            sa.text("SELECT * FROM chart_series WHERE chart_id = ANY(:ids)"),
+            {"ids": [c.id for c in charts]},
+        ):
+            by_chart.setdefault(row.chart_id, []).append(row)
+        docs = [
+            {"id": c.id, "doc": json.dumps(_assemble(c.result_json, by_chart.get(c.id, [])))}
+            for c in charts
+            if isinstance(c.result_json, dict)
+        ]
+        if docs:
+            conn.execute(_UPDATE_RESULT, docs)
+
+    op.drop_table('chart_series')
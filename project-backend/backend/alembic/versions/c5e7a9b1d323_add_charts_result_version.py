@@ -0,0 +1,32 @@
+"""add charts.result_version for optimistic locking of result_json edits
+
+Revision ID: c5e7a9b1d323
+Revises: b4d6f8a0c212
+Create Date: 2026-10-19 13:18:02.114507
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5e7a9b1d323'
+down_revision: Union[str, Sequence[str], None] = 'b4d6f8a0c212'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # server_default константный — в PostgreSQL 11+ без перезаписи таблицы
+    op.add_column(
+        'charts',
+        sa.Column('result_version', sa.Integer(), server_default=sa.text('0'), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('charts', 'result_version')
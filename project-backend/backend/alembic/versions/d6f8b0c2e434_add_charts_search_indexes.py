@@ -0,0 +1,51 @@
+"""add indexes for chart search: keyset order, filename trigram, series names
+
+Revision ID: d6f8b0c2e434
+Revises: c5e7a9b1d323
+Create Date: 2026-10-19 15:42:10.381205
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd6f8b0c2e434'
+down_revision: Union[str, Sequence[str], None] = 'c5e7a9b1d323'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # pg_trgm — trusted extension (PostgreSQL 13+): хватает прав владельца БД
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+
+    op.create_index(
+        'ix_charts_user_created',
+        'charts',
+        ['user_id', sa.text('created_at DESC'), sa.text('id DESC')],
+        unique=False,
+    )
+    op.create_index(
+        'ix_charts_filename_trgm',
+        'charts',
+        ['original_filename'],
+        unique=False,
+        postgresql_using='gin',
+        postgresql_ops={'original_filename': 'gin_trgm_ops'},
+    )
+    # выражение должно совпадать с app.db.models.chart.series_names_expr
+    op.execute(
+        "CREATE INDEX ix_charts_series_names ON charts USING gin "
+        "(jsonb_path_query_array(result_json, '$.panels[*].series[*].name'::jsonpath) jsonb_path_ops)"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_charts_series_names', table_name='charts')
+    op.drop_index('ix_charts_filename_trgm', table_name='charts')
+    op.drop_index('ix_charts_user_created', table_name='charts')
@@ -0,0 +1,120 @@
+"""add queue telemetry: status counters, queue indexes, workers heartbeat table
+
+Revision ID: e7a9c1d3f545
+Revises: d6f8b0c2e434
+Create Date: 2026-10-19 17:05:48.902316
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7a9c1d3f545'
+down_revision: Union[str, Sequence[str], None] = 'd6f8b0c2e434'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('chart_status_counts',
+    sa.Column('status', sa.String(length=32), nullable=False),
+    sa.Column('n', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('status')
+    )
+    op.create_table('workers',
+    sa.Column('id', sa.String(length=128), nullable=False),
+    sa.Column('hostname', sa.String(length=255), nullable=False),
+    sa.Column('pid', sa.Integer(), nullable=False),
+    sa.Column('started_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.Column('last_seen_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.Column('current_chart_id', sa.Integer(), nullable=True),
+    sa.Column('jobs_done', sa.BigInteger(), server_default=sa.text('0'), nullable=False),
+    sa.Column('jobs_failed', sa.BigInteger(), server_default=sa.text('0'), nullable=False),
+    sa.Column('jobs_per_minute', sa.Float(), server_default=sa.text('0'), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+    op.create_index(
+        'ix_charts_queue',
+        'charts',
+        ['status', 'created_at'],
+        unique=False,
+        postgresql_where=sa.text("status IN ('uploaded', 'processing')"),
+    )
+    op.create_index(
+        'ix_charts_processed_at',
+        'charts',
+        ['processed_at'],
+        unique=False,
+        postgresql_where=sa.text('processed_at IS NOT NULL'),
+    )
+
+    # Счётчики по статусам. Обе строки обновляются в порядке имени статуса,
+    # чтобы встречные переходы (uploaded->processing и processing->uploaded) не ловили deadlock.
+    op.execute(
+        """
+        CREATE FUNCTION charts_status_count_trg() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        DECLARE
+            s text;
+        BEGIN
+            FOR s IN
+                SELECT x FROM unnest(ARRAY[
+                    CASE WHEN TG_OP <> 'INSERT' THEN OLD.status END,
+                    CASE WHEN TG_OP <> 'DELETE' THEN NEW.status END
+                ]) AS x
+                WHERE x IS NOT NULL
+                ORDER BY x
+            LOOP
+                IF TG_OP <> 'INSERT' AND s = OLD.status THEN
+                    UPDATE chart_status_counts SET n = n - 1 WHERE status = s;
+                END IF;
+                IF TG_OP <> 'DELETE' AND s = NEW.status THEN
+                    INSERT INTO chart_status_counts (status, n) VALUES (s, 1)
+                    ON CONFLICT (status) DO UPDATE SET n = chart_status_counts.n + 1;
+                END IF;
+            END LOOP;
+            RETURN NULL;
+        END
+        $$
+        """
+    )
+
+    # счётчики должны совпасть с таблицей: пишущие транзакции ждут до конца миграции
+    op.execute('LOCK TABLE charts IN SHARE ROW EXCLUSIVE MODE')
+    op.execute(
+        """
+        CREATE TRIGGER charts_status_count_ins_del
+        AFTER INSERT OR DELETE ON charts
+        FOR EACH ROW EXECUTE FUNCTION charts_status_count_trg()
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER charts_status_count_upd
+        AFTER UPDATE OF status ON charts
+        FOR EACH ROW WHEN (OLD.status IS DISTINCT FROM NEW.status)
+        EXECUTE FUNCTION charts_status_count_trg()
+        """
+    )
+    op.execute(
+        """
+        INSERT INTO chart_status_counts (status, n)
+        SELECT status, COUNT(*) FROM charts GROUP BY status
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute('DROP TRIGGER IF EXISTS charts_status_count_upd ON charts')
+    op.execute('DROP TRIGGER IF EXISTS charts_status_count_ins_del ON charts')
+    op.execute('DROP FUNCTION IF EXISTS charts_status_count_trg()')
+    op.drop_index('ix_charts_processed_at', table_name='charts')
+    op.drop_index('ix_charts_queue', table_name='charts')
+    op.drop_table('workers')
+    op.drop_table('chart_status_counts')
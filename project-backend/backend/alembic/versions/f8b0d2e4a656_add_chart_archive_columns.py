@@ -0,0 +1,53 @@
+"""add cold storage of chart results: access time, archive reference, candidate index
+
+Revision ID: f8b0d2e4a656
+Revises: e7a9c1d3f545
+Create Date: 2026-10-19 18:21:37.514022
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f8b0d2e4a656'
+down_revision: Union[str, Sequence[str], None] = 'e7a9c1d3f545'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # nullable без default — ALTER не переписывает таблицу
+    op.add_column('charts', sa.Column('last_accessed_at', sa.DateTime(timezone=True), nullable=True))
+    op.add_column('charts', sa.Column('archived_at', sa.DateTime(timezone=True), nullable=True))
+    op.add_column('charts', sa.Column('archive_sha256', sa.String(length=64), nullable=True))
+
+    # выражение должно совпадать с chart_crud.claim_archive_candidates
+    op.create_index(
+        'ix_charts_archive_candidates',
+        'charts',
+        [sa.text('coalesce(last_accessed_at, created_at)')],
+        unique=False,
+        postgresql_where=sa.text("archived_at IS NULL AND status IN ('done', 'error')"),
+    )
+    op.create_index(
+        'ix_charts_archive_sha256',
+        'charts',
+        ['archive_sha256'],
+        unique=False,
+        postgresql_where=sa.text('archive_sha256 IS NOT NULL'),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # архивированные строки после отката содержат только заглушку:
+    # перед downgrade их нужно вернуть (GET /charts/{id} для каждой)
+    op.drop_index('ix_charts_archive_sha256', table_name='charts')
+    op.drop_index('ix_charts_archive_candidates', table_name='charts')
+    op.drop_column('charts', 'archive_sha256')
+    op.drop_column('charts', 'archived_at')
+    op.drop_column('charts', 'last_accessed_at')
@@ -1,50 +1,30 @@
-from typing import Generator
-import os
+import time
+from typing import AsyncGenerator, Generator
 
 from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from jose import JWTError
 from pydantic import ValidationError
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
+from app.core.auth_cache import AuthUser, token_cache, token_key, user_cache
 from app.core.config import settings
 from app.core.security import decode_access_token
 from app.db import models
-from app.db.session import SessionLocal
+from app.db.session import AsyncSessionLocal, SessionLocal
 from app.schemas.auth import TokenPayload
 
 bearer_scheme = HTTPBearer(auto_error=False)
 
+# Настройки читаются один раз при импорте, а не на каждый запрос
+_AUTH_ENABLED = bool(settings.auth_enabled)
+_COOKIE_NAME = settings.auth_cookie_name.strip()
+_DEV_USER_EMAIL = settings.dev_user_email.strip()
+_DEV_USER_PASSWORD = settings.dev_user_password
 
-def _env_bool(name: str, default: str = "1") -> bool:
-    return os.getenv(name, default).strip().lower() in {"1", "true", "yes", "on"}
-
-
-def _get_setting(name: str, env_name: str, default):
-    value = getattr(settings, name, None)
-    if value is not None:
-        return value
-    return os.getenv(env_name, default)
-
-
-def _auth_enabled() -> bool:
-    value = getattr(settings, "auth_enabled", None)
-    if value is not None:
-        return bool(value)
-    return _env_bool("AUTH_ENABLED", "1")
-
-
-def _cookie_name() -> str:
-    return str(_get_setting("auth_cookie_name", "AUTH_COOKIE_NAME", "access_token")).strip()
-
-
-def _dev_user_email() -> str:
-    return str(_get_setting("dev_user_email", "DEV_USER_EMAIL", "dev@local")).strip()
-
-
-def _dev_user_password() -> str:
-    return str(_get_setting("dev_user_password", "DEV_USER_PASSWORD", "devpass"))
+_dev_user_id: int | None = None
 
 
 def get_db() -> Generator[Session, None, None]:
@@ -55,9 +35,17 @@ def get_db() -> Generator[Session, None, None]:
         db.close()
 
 
-def _get_or_create_dev_user(db: Session) -> models.user.User:
-    email = _dev_user_email()
-    password = _dev_user_password()
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    """
+    Сессия для async def эндпоинтов: все запросы идут через asyncpg и не блокируют event loop.
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+def _load_or_create_dev_user(db: Session) -> models.user.User:
+    email = _DEV_USER_EMAIL
+    password = _DEV_USER_PASSWORD
 
     user = db.query(models.user.User).filter(models.user.User.email == email).first()
     if user:
@@ -67,11 +55,11 @@ def _get_or_create_dev_user(db: Session) -> models.user.User:
             db.refresh(user)
         return user
 
-    from app.core.security import get_password_hash
+    from app.core.password_pool import password_hasher
 
     user = models.user.User(
         email=email,
-        hashed_password=get_password_hash(password),
+        hashed_password=password_hasher.hash(password),
         is_active=True,
     )
     db.add(user)
@@ -93,12 +81,62 @@ def _get_or_create_dev_user(db: Session) -> models.user.User:
     return user
 
 
+def _get_or_create_dev_user(db: Session) -> AuthUser:
+    global _dev_user_id
+
+    if _dev_user_id is not None:
+        cached = user_cache.get(_dev_user_id)
+        if cached is not None:
+            return cached
+
+    user = AuthUser.from_model(_load_or_create_dev_user(db))
+    _dev_user_id = user.id
+    user_cache.set(user.id, user)
+    return user
+
+
+def _load_active_user(db: Session, user_id: int) -> AuthUser | None:
+    cached = user_cache.get(user_id)
+    if cached is not None:
+        return cached
+
+    user = db.query(models.user.User).filter(models.user.User.id == user_id).first()
+    if not user or not user.is_active:
+        return None
+
+    snapshot = AuthUser.from_model(user)
+    user_cache.set(user_id, snapshot)
+    return snapshot
+
+
+def _verify_token(token: str) -> int:
+    """
+    Проверка подписи и exp JWT. Проверенные токены кэшируются по sha256,
+    запись живёт не дольше exp самого токена.
+    Бросает JWTError/ValidationError/ValueError/TypeError, если токен некорректен.
+    """
+    key = token_key(token)
+    cached = token_cache.get(key)
+    if cached is not None:
+        return cached
+
+    payload = decode_access_token(token)
+    token_data = TokenPayload.model_validate(payload)
+    user_id = int(token_data.sub)
+
+    exp = payload.get("exp")
+    if isinstance(exp, (int, float)):
+        token_cache.set(key, user_id, ttl=float(exp) - time.time())
+
+    return user_id
+
+
 def get_current_user(
     request: Request,
     credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme),
     db: Session = Depends(get_db),
-) -> models.user.User:
-    if not _auth_enabled():
+) -> AuthUser:
+    if not _AUTH_ENABLED:
         return _get_or_create_dev_user(db)
 
     token: str | None = None
@@ -107,7 +145,7 @@ def get_current_user(
         token = credentials.credentials
 
     if not token:
-        token = request.cookies.get(_cookie_name())
+        token = request.cookies.get(_COOKIE_NAME)
 
     if not token:
         raise HTTPException(
@@ -123,14 +161,24 @@ def get_current_user(
     )
 
     try:
-        payload = decode_access_token(token)
-        token_data = TokenPayload.model_validate(payload)
-        user_id = int(token_data.sub)
+        user_id = _verify_token(token)
     except (JWTError, ValidationError, ValueError, TypeError):
         raise credentials_exception
 
-    user = db.query(models.user.User).filter(models.user.User.id == user_id).first()
-    if not user or not user.is_active:
+    user = _load_active_user(db, user_id)
+    if user is None:
         raise credentials_exception
 
-    return user
\ No newline at end of file
+    return user
+
+
+def get_current_admin(current_user: AuthUser = Depends(get_current_user)) -> AuthUser:
+    """
+    Пользователь из ADMIN_EMAILS (через запятую). Пустой список — админов нет.
+    """
+    if current_user.email.lower() not in settings.admin_emails:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin access required",
+        )
+    return current_user
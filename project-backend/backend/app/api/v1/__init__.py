@@ -1,6 +1,6 @@
 from fastapi import APIRouter
 
-from . import auth, charts
+from . import admin, auth, charts
 
 router = APIRouter()
 
@@ -9,3 +9,6 @@ router.include_router(auth.router, prefix="/auth", tags=["auth"])
 
 # /api/v1/charts/...
 router.include_router(charts.router, prefix="/charts", tags=["charts"])
+
+# /api/v1/admin/...
+router.include_router(admin.router, prefix="/admin", tags=["admin"])
@@ -0,0 +1,17 @@
+from fastapi import APIRouter, Depends
+
+from app.api.deps import get_current_admin
+from app.schemas.admin import QueueTelemetry
+from app.services.queue_stats import queue_stats
+
+router = APIRouter()
+
+
+@router.get("/queue", response_model=QueueTelemetry)
+def get_queue_telemetry(_admin=Depends(get_current_admin)) -> QueueTelemetry:
+    """
+    Состояние очереди: счётчики по статусам, возраст самых старых задач,
+    завершения и перцентили времени обработки по окнам, живые воркеры.
+    Снимок кэшируется на QUEUE_STATS_CACHE_SECONDS.
+    """
+    return queue_stats.snapshot()
@@ -1,8 +1,8 @@
-from fastapi import APIRouter, Depends, status, Response
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, Request, status, Response
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.api.deps import get_db, get_current_user
-from app.db.models.user import User
+from app.api.deps import get_async_db, get_current_user
+from app.core.auth_cache import AuthUser
 from app.schemas.auth import LoginRequest, RegisterRequest, Token
 from app.schemas.user import UserRead
 from app.services.auth import auth_service
@@ -12,32 +12,38 @@ router = APIRouter()
 COOKIE_NAME = "access_token"
 
 
+def _client_ip(request: Request) -> str | None:
+    return request.client.host if request.client else None
+
+
 @router.post(
     "/register",
     response_model=UserRead,
     status_code=status.HTTP_201_CREATED,
 )
-def register_user(
+async def register_user(
     data: RegisterRequest,
-    db: Session = Depends(get_db),
+    request: Request,
+    db: AsyncSession = Depends(get_async_db),
 ) -> UserRead:
-    return auth_service.register(db, data)
+    return await auth_service.register(db, data, client_ip=_client_ip(request))
 
 
 @router.post(
     "/login",
     response_model=Token,
 )
-def login(
+async def login(
     data: LoginRequest,
+    request: Request,
     response: Response,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ) -> Token:
     """
     Логин: проверка email/пароля, выдача JWT-токена.
     Дополнительно: кладём access_token в HttpOnly cookie, чтобы <img> мог грузить артефакты.
     """
-    token = auth_service.login(db, data)
+    token = await auth_service.login(db, data, client_ip=_client_ip(request))
 
     # Для localhost/HTTP: secure=False. В проде будет secure=True (HTTPS).
     response.set_cookie(
@@ -66,6 +72,6 @@ def logout(response: Response) -> dict:
     response_model=UserRead,
 )
 def read_current_user(
-    current_user: User = Depends(get_current_user),
+    current_user: AuthUser = Depends(get_current_user),
 ) -> UserRead:
     return UserRead.model_validate(current_user)
\ No newline at end of file
@@ -1,25 +1,58 @@
+import base64
+from datetime import datetime
 from pathlib import Path
-import codecs
+from typing import Literal
 
-from fastapi import APIRouter, Depends, File, UploadFile, HTTPException, status, Response, Body
-from fastapi.responses import FileResponse
+import orjson
+from fastapi import APIRouter, Depends, File, UploadFile, HTTPException, Query, Request, status, Response, Body
+from fastapi.responses import StreamingResponse
+from PIL import Image, UnidentifiedImageError
 from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from app.api.deps import get_db, get_current_user
+from app.api.deps import get_async_db, get_db, get_current_user
 from app.core.config import settings
 from app.db.models.chart import Chart
-from app.schemas.chart import ChartCreateResponse, ChartStatus
+from app.db.crud.chart import chart_crud
+from app.db.session import begin_snapshot
+from app.schemas.chart import (
+    ChartBatchUploadResponse,
+    ChartCreateResponse,
+    ChartPatchRequest,
+    ChartPatchResponse,
+    ChartSearchItem,
+    ChartSearchPage,
+    ChartSeriesResponse,
+    ChartSeriesUpdate,
+    ChartSeriesUpdateResponse,
+    ChartStatus,
+    ChartStatusItem,
+)
 from app.schemas.ml import Panel
+from app.services.archive import access_tracker, archive_store
+from app.services.chart_series import decode_points, series_store, split_result
 from app.services.charts import ChartService
-from app.utils.export import export_to_csv, export_to_txt, export_to_json, export_to_table_csv
+from app.services.renditions import THUMB_MEDIA_TYPE, pick_size, rendition_service
+from app.services.bulk_export import iter_charts_zip
+from app.utils.export import (
+    arrow_available,
+    csv_excel_bytes,
+    export_to_csv,
+    export_to_json,
+    export_to_table_csv,
+    export_to_txt,
+    iter_arrow,
+    iter_npz,
+    iter_parquet,
+)
+from app.utils.file_response import file_response
 
 router = APIRouter()
 chart_service = ChartService()
 
-
-def _csv_excel_bytes(s: str) -> bytes:
-    return codecs.BOM_UTF16_LE + s.encode("utf-16-le")
+MAX_STATUS_IDS = 500
+MAX_SEARCH_LIMIT = 200
 
 
 def _get_user_chart_or_404(db: Session, chart_id: int, user_id: int) -> Chart:
@@ -36,6 +69,24 @@ def _get_user_chart_or_404(db: Session, chart_id: int, user_id: int) -> Chart:
     return chart
 
 
+def _get_hydrated_chart_or_404(db: Session, chart_id: int, user_id: int) -> Chart:
+    """
+    Chart с полным result_json: архивированный документ возвращается в строку.
+    Сессия остаётся в снимке (begin_snapshot): серии читать до commit.
+    Чтение отмечается для AccessTracker.
+    """
+    # строка и серии (_chart_result) — из одного снимка
+    begin_snapshot(db)
+    chart = _get_user_chart_or_404(db, chart_id, user_id)
+    if chart.archive_sha256:
+        db.commit()
+        chart_service.rehydrate(db, chart.id, chart.archive_sha256)
+        begin_snapshot(db)
+        db.refresh(chart)
+    access_tracker.touch(chart.id)
+    return chart
+
+
 def _parse_chart_status(raw_status: str) -> ChartStatus:
     try:
         return ChartStatus(raw_status)
@@ -46,7 +97,7 @@ def _parse_chart_status(raw_status: str) -> ChartStatus:
         )
 
 
-def _to_chart_response(chart: Chart) -> ChartCreateResponse:
+def _to_chart_response(chart: Chart, result_json) -> ChartCreateResponse:
     return ChartCreateResponse(
         id=chart.id,
         status=_parse_chart_status(chart.status),
@@ -56,11 +107,74 @@ def _to_chart_response(chart: Chart) -> ChartCreateResponse:
         processed_at=chart.processed_at,
         n_panels=chart.n_panels,
         n_series=chart.n_series,
-        result_json=chart.result_json,
+        result_json=result_json,
+        result_version=chart.result_version or 0,
         error_message=chart.error_message,
     )
 
 
+def _chart_row_json(row, result_json) -> bytes:
+    """
+    Строка из chart_crud.get_response_row/list_response_rows и собранный документ
+    (result_json + chart_series) -> JSON ChartCreateResponse.
+    Данные из своей БД, поэтому pydantic-модель не строим.
+    """
+    head = orjson.dumps(
+        {
+            "id": row.id,
+            "status": _parse_chart_status(row.status).value,
+            "original_filename": row.original_filename,
+            "mime_type": row.mime_type,
+            "created_at": row.created_at,
+            "processed_at": row.processed_at,
+            "n_panels": row.n_panels,
+            "n_series": row.n_series,
+            "result_version": row.result_version or 0,
+            "error_message": row.error_message,
+        },
+        option=orjson.OPT_UTC_Z,
+    )
+    return head[:-1] + b',"result_json":' + orjson.dumps(result_json) + b"}"
+
+
+def _json_bytes_response(body: bytes) -> Response:
+    return Response(content=body, media_type="application/json")
+
+
+def _to_status_item(row) -> ChartStatusItem:
+    return ChartStatusItem(
+        id=row.id,
+        status=_parse_chart_status(row.status),
+        processed_at=row.processed_at,
+        n_series=row.n_series,
+        error_message=row.error_message,
+    )
+
+
+def _parse_ids(raw: str) -> list[int]:
+    try:
+        ids = {int(x) for x in raw.split(",") if x.strip()}
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids must be a comma-separated list of integers")
+    if len(ids) > MAX_STATUS_IDS:
+        raise HTTPException(status_code=400, detail=f"Too many ids (max {MAX_STATUS_IDS})")
+    return sorted(ids)
+
+
+def _encode_cursor(created_at: datetime, chart_id: int) -> str:
+    raw = orjson.dumps([created_at.isoformat(), chart_id])
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, chart_id = orjson.loads(raw)
+        return datetime.fromisoformat(created_at), int(chart_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
 def _storage_root() -> Path:
     return Path(settings.storage_dir).resolve()
 
@@ -85,6 +199,20 @@ def _resolve_in_storage(raw_path: str, *, allow_absolute: bool) -> Path:
     return file_path
 
 
+def _artifact_path(chart_id: int, rel: str) -> Path:
+    """
+    Путь артефакта в storage/; если каталог chart ушёл в архив (ARCHIVE_ARTIFACTS),
+    файлы возвращаются на место. result_json при этом не восстанавливается.
+    """
+    file_path = _resolve_in_storage(rel, allow_absolute=False)
+    if not file_path.is_file():
+        try:
+            archive_store.restore_artifacts(chart_id)
+        except OSError:
+            raise HTTPException(status_code=503, detail="Artifact storage is temporarily unavailable")
+    return file_path
+
+
 def _parse_panels(
     payload: dict,
     *,
@@ -106,9 +234,16 @@ def _parse_panels(
     return panels
 
 
-def _parse_panels_or_409(chart: Chart) -> list[Panel]:
+def _chart_result(db: Session, chart: Chart, panel_id: str | None = None, series_id: str | None = None):
+    """
+    Документ chart для экспорта; с panel_id/series_id читаются только нужные серии.
+    """
+    return series_store.load(db, chart.id, chart.result_json, panel_id=panel_id, series_id=series_id)
+
+
+def _parse_panels_or_409(result_json) -> list[Panel]:
     return _parse_panels(
-        chart.result_json or {},
+        result_json or {},
         missing_status=409,
         invalid_status=500,
         missing_detail="Export is not available yet",
@@ -119,7 +254,7 @@ def _parse_panels_or_409(chart: Chart) -> list[Panel]:
 @router.post("/upload", response_model=ChartCreateResponse)
 async def upload_chart(
     file: UploadFile = File(...),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(get_current_user),
 ) -> ChartCreateResponse:
     return await chart_service.upload_and_enqueue(
@@ -129,20 +264,170 @@ async def upload_chart(
     )
 
 
+@router.post("/upload/batch", response_model=ChartBatchUploadResponse)
+async def upload_charts_batch(
+    files: list[UploadFile] = File(...),
+    db: AsyncSession = Depends(get_async_db),
+    current_user=Depends(get_current_user),
+) -> ChartBatchUploadResponse:
+    return await chart_service.upload_batch(
+        db,
+        user_id=current_user.id,
+        uploads=files,
+    )
+
+
+@router.get("/status", response_model=list[ChartStatusItem])
+def get_charts_status(
+    ids: str,
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user),
+) -> list[ChartStatusItem]:
+    """
+    Статусы нескольких charts одним запросом: ?ids=1,2,3.
+    Чужие и несуществующие id просто отсутствуют в ответе.
+    """
+    rows = chart_crud.get_statuses(db, user_id=current_user.id, chart_ids=_parse_ids(ids))
+    return [_to_status_item(r) for r in rows]
+
+
+@router.get("/status/active", response_model=list[ChartStatusItem])
+def get_active_charts_status(
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user),
+) -> list[ChartStatusItem]:
+    """
+    Статусы всех charts пользователя, которые ещё в очереди или обрабатываются.
+    """
+    rows = chart_crud.get_active_statuses(db, user_id=current_user.id)
+    return [_to_status_item(r) for r in rows]
+
+
+@router.get("/search", response_model=ChartSearchPage)
+def search_charts(
+    q: str | None = Query(default=None, max_length=255),
+    status_filter: list[ChartStatus] | None = Query(default=None, alias="status"),
+    created_from: datetime | None = None,
+    created_to: datetime | None = None,
+    processed_from: datetime | None = None,
+    processed_to: datetime | None = None,
+    n_series_min: int | None = Query(default=None, ge=0),
+    n_series_max: int | None = Query(default=None, ge=0),
+    n_panels_min: int | None = Query(default=None, ge=0),
+    n_panels_max: int | None = Query(default=None, ge=0),
+    series_name: list[str] | None = Query(default=None),
+    cursor: str | None = None,
+    limit: int = Query(default=50, ge=1, le=MAX_SEARCH_LIMIT),
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user),
+) -> ChartSearchPage:
+    """
+    Поиск по своим charts, новые сверху.
+    q — подстрока имени файла; status и series_name можно повторять
+    (series_name: chart должен содержать серии со всеми указанными именами).
+    *_to — не включительно. Следующая страница: ?cursor=<next_cursor> с теми же фильтрами.
+    """
+    rows = chart_crud.search(
+        db,
+        user_id=current_user.id,
+        q=q.strip() if q else None,
+        statuses=[s.value for s in status_filter] if status_filter else None,
+        created_from=created_from,
+        created_to=created_to,
+        processed_from=processed_from,
+        processed_to=processed_to,
+        n_series_min=n_series_min,
+        n_series_max=n_series_max,
+        n_panels_min=n_panels_min,
+        n_panels_max=n_panels_max,
+        series_names=series_name or None,
+        after=_decode_cursor(cursor) if cursor else None,
+        limit=limit + 1,
+    )
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = _encode_cursor(rows[-1].created_at, rows[-1].id)
+
+    items = [
+        ChartSearchItem(
+            id=r.id,
+            status=_parse_chart_status(r.status),
+            original_filename=r.original_filename,
+            mime_type=r.mime_type,
+            created_at=r.created_at,
+            processed_at=r.processed_at,
+            n_panels=r.n_panels,
+            n_series=r.n_series,
+            error_message=r.error_message,
+        )
+        for r in rows
+    ]
+    return ChartSearchPage(items=items, next_cursor=next_cursor)
+
+
+@router.get("/export.zip")
+def export_charts_zip(
+    ids: str | None = None,
+    since: datetime | None = None,
+    status_filter: ChartStatus | None = Query(default=None, alias="status"),
+    fmt: Literal["csv", "json", "table"] = Query(default="csv", alias="format"),
+    originals: bool = False,
+    artifacts: bool = False,
+    current_user=Depends(get_current_user),
+):
+    """
+    ZIP с несколькими charts: chart_<id>/data.<ext> (+ оригинал и артефакты) и manifest.json.
+    Отбор: ?ids=1,2,3 и/или since (created_at >=) и status; без фильтров — все charts пользователя.
+    Архив собирается и отдаётся потоково, строки читаются серверным курсором.
+    """
+    chart_ids = _parse_ids(ids) if ids else None
+    return StreamingResponse(
+        iter_charts_zip(
+            user_id=current_user.id,
+            chart_ids=chart_ids,
+            since=since,
+            status=status_filter.value if status_filter else None,
+            fmt=fmt,
+            include_originals=originals,
+            include_artifacts=artifacts,
+        ),
+        media_type="application/zip",
+        headers={"Content-Disposition": 'attachment; filename="charts_export.zip"'},
+    )
+
+
 @router.get("/{chart_id}", response_model=ChartCreateResponse)
 def get_chart(
     chart_id: int,
     db: Session = Depends(get_db),
     current_user=Depends(get_current_user),
-) -> ChartCreateResponse:
-    chart = _get_user_chart_or_404(db, chart_id, current_user.id)
-    return _to_chart_response(chart)
+):
+    # Response напрямую: FastAPI не валидирует его через response_model (он только для OpenAPI)
+    # строка и серии — из одного снимка: архиватор не вклинится между ними
+    begin_snapshot(db)
+    row = chart_crud.get_response_row(db, chart_id=chart_id, user_id=current_user.id)
+    if row is not None and row.archive_sha256:
+        db.commit()
+        chart_service.rehydrate(db, chart_id, row.archive_sha256)
+        begin_snapshot(db)
+        row = chart_crud.get_response_row(db, chart_id=chart_id, user_id=current_user.id)
+    if row is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Chart not found",
+        )
+    access_tracker.touch(chart_id)
+    result_json = series_store.load(db, chart_id, row.result_json)
+    return _json_bytes_response(_chart_row_json(row, result_json))
 
 
 @router.get("/{chart_id}/artifact/{key}")
 def get_chart_artifact(
     chart_id: int,
     key: str,
+    request: Request,
     db: Session = Depends(get_db),
     current_user=Depends(get_current_user),
 ):
@@ -153,13 +438,12 @@ def get_chart_artifact(
     if not isinstance(artifacts, dict) or key not in artifacts:
         raise HTTPException(status_code=404, detail="Artifact not found")
 
-    rel = artifacts[key]
-    file_path = _resolve_in_storage(rel, allow_absolute=False)
+    file_path = _artifact_path(chart.id, artifacts[key])
 
     if not file_path.is_file():
         raise HTTPException(status_code=404, detail="Artifact file missing on disk")
 
-    return FileResponse(str(file_path))
+    return file_response(request, file_path)
 
 
 @router.get("/{chart_id}/export.csv")
@@ -170,11 +454,11 @@ def export_chart_csv(
     db: Session = Depends(get_db),
     current_user=Depends(get_current_user),
 ):
-    chart = _get_user_chart_or_404(db, chart_id, current_user.id)
-    panels = _parse_panels_or_409(chart)
+    chart = _get_hydrated_chart_or_404(db, chart_id, current_user.id)
+    panels = _parse_panels_or_409(_chart_result(db, chart, panel_id, series_id))
 
     content = export_to_csv(panels, panel_id=panel_id, series_id=series_id)
-    body = _csv_excel_bytes(content)
+    body = csv_excel_bytes(content)
 
     return Response(
         content=body,
@@ -190,14 +474,14 @@ def export_chart_table_csv(
     db: Session = Depends(get_db),
     current_user=Depends(get_current_user),
 ):
-    chart = _get_user_chart_or_404(db, chart_id, current_user.id)
-    panels = _parse_panels_or_409(chart)
+    chart = _get_hydrated_chart_or_404(db, chart_id, current_user.id)
+    panels = _parse_panels_or_409(_chart_result(db, chart, panel_id))
 
     content = export_to_table_csv(panels, panel_id=panel_id)
     if not content:
         raise HTTPException(status_code=409, detail="Export is not available yet")
 
-    body = _csv_excel_bytes(content)
+    body = csv_excel_bytes(content)
 
     return Response(
         content=body,
@@ -214,8 +498,8 @@ def export_chart_txt(
     db: Session = Depends(get_db),
     current_user=Depends(get_current_user),
 ):
-    chart = _get_user_chart_or_404(db, chart_id, current_user.id)
-    panels = _parse_panels_or_409(chart)
+    chart = _get_hydrated_chart_or_404(db, chart_id, current_user.id)
+    panels = _parse_panels_or_409(_chart_result(db, chart, panel_id, series_id))
 
     content = export_to_txt(panels, panel_id=panel_id, series_id=series_id)
     return Response(
@@ -234,8 +518,8 @@ def export_chart_json(
     db: Session = Depends(get_db),
     current_user=Depends(get_current_user),
 ):
-    chart = _get_user_chart_or_404(db, chart_id, current_user.id)
-    panels = _parse_panels_or_409(chart)
+    chart = _get_hydrated_chart_or_404(db, chart_id, current_user.id)
+    panels = _parse_panels_or_409(_chart_result(db, chart, panel_id, series_id))
 
     content = export_to_json(panels, panel_id=panel_id, series_id=series_id, pretty=pretty)
     return Response(
@@ -245,23 +529,97 @@ def export_chart_json(
     )
 
 
+def _require_arrow() -> None:
+    if not arrow_available():
+        raise HTTPException(
+            status_code=status.HTTP_501_NOT_IMPLEMENTED,
+            detail="Arrow/Parquet export requires pyarrow",
+        )
+
+
+def _binary_export(chunks, media_type: str, filename: str) -> StreamingResponse:
+    return StreamingResponse(
+        chunks,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@router.get("/{chart_id}/export.npz")
+def export_chart_npz(
+    chart_id: int,
+    panel_id: str | None = None,
+    series_id: str | None = None,
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user),
+):
+    chart = _get_hydrated_chart_or_404(db, chart_id, current_user.id)
+    panels = _parse_panels_or_409(_chart_result(db, chart, panel_id, series_id))
+
+    return _binary_export(
+        iter_npz(panels, panel_id=panel_id, series_id=series_id),
+        "application/octet-stream",
+        f"chart_{chart_id}.npz",
+    )
+
+
+@router.get("/{chart_id}/export.arrow")
+def export_chart_arrow(
+    chart_id: int,
+    panel_id: str | None = None,
+    series_id: str | None = None,
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user),
+):
+    _require_arrow()
+    chart = _get_hydrated_chart_or_404(db, chart_id, current_user.id)
+    panels = _parse_panels_or_409(_chart_result(db, chart, panel_id, series_id))
+
+    return _binary_export(
+        iter_arrow(panels, panel_id=panel_id, series_id=series_id),
+        "application/vnd.apache.arrow.stream",
+        f"chart_{chart_id}.arrow",
+    )
+
+
+@router.get("/{chart_id}/export.parquet")
+def export_chart_parquet(
+    chart_id: int,
+    panel_id: str | None = None,
+    series_id: str | None = None,
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user),
+):
+    _require_arrow()
+    chart = _get_hydrated_chart_or_404(db, chart_id, current_user.id)
+    panels = _parse_panels_or_409(_chart_result(db, chart, panel_id, series_id))
+
+    return _binary_export(
+        iter_parquet(panels, panel_id=panel_id, series_id=series_id),
+        "application/vnd.apache.parquet",
+        f"chart_{chart_id}.parquet",
+    )
+
+
 @router.get("", response_model=list[ChartCreateResponse])
 def list_my_charts(
     db: Session = Depends(get_db),
     current_user=Depends(get_current_user),
 ):
-    rows = (
-        db.query(Chart)
-        .filter(Chart.user_id == current_user.id)
-        .order_by(Chart.created_at.desc())
-        .all()
+    begin_snapshot(db)
+    rows = chart_crud.list_response_rows(db, user_id=current_user.id)
+    results = series_store.load_for_user(
+        db,
+        user_id=current_user.id,
+        results={r.id: r.result_json for r in rows},
     )
-    return [_to_chart_response(c) for c in rows]
+    return _json_bytes_response(b"[" + b",".join(_chart_row_json(r, results[r.id]) for r in rows) + b"]")
 
 
 @router.get("/{chart_id}/original")
 def get_original_image(
     chart_id: int,
+    request: Request,
     db: Session = Depends(get_db),
     current_user=Depends(get_current_user),
 ):
@@ -272,7 +630,58 @@ def get_original_image(
     if not file_path.is_file():
         raise HTTPException(status_code=404, detail="Original file missing on disk")
 
-    return FileResponse(str(file_path), media_type=chart.mime_type or None)
+    # оригинал адресуется по sha256 — содержимое по этому URL не меняется
+    return file_response(
+        request,
+        file_path,
+        media_type=chart.mime_type or None,
+        etag=chart.sha256,
+        immutable=True,
+    )
+
+
+@router.get("/{chart_id}/thumb")
+def get_chart_thumb(
+    chart_id: int,
+    request: Request,
+    size: int | None = Query(default=None, ge=1),
+    source: str = "original",
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user),
+):
+    """
+    WebP-превью оригинала (source=original) или артефакта (source=<ключ artifacts>).
+    size округляется вверх до одного из THUMB_SIZES; при промахе превью создаётся сразу.
+    """
+    chart = _get_user_chart_or_404(db, chart_id, current_user.id)
+    thumb_size = pick_size(size)
+
+    if source == "original":
+        file_path = _resolve_in_storage(chart.original_path, allow_absolute=True)
+        # превью оригинала определяется sha256 и размером — неизменяемо
+        etag: str | None = f"{chart.sha256}-{thumb_size}"
+    else:
+        artifacts = (chart.result_json or {}).get("artifacts")
+        if not isinstance(artifacts, dict) or source not in artifacts:
+            raise HTTPException(status_code=404, detail="Artifact not found")
+        file_path = _artifact_path(chart.id, artifacts[source])
+        etag = None
+
+    if not file_path.is_file():
+        raise HTTPException(status_code=404, detail="Source file missing on disk")
+
+    try:
+        thumb = rendition_service.ensure(file_path, thumb_size)
+    except (OSError, UnidentifiedImageError, Image.DecompressionBombError):
+        raise HTTPException(status_code=415, detail="Thumbnail is not available for this file")
+
+    return file_response(
+        request,
+        thumb,
+        media_type=THUMB_MEDIA_TYPE,
+        etag=etag,
+        immutable=etag is not None,
+    )
 
 
 @router.delete("/{chart_id}", status_code=204)
@@ -283,12 +692,87 @@ def delete_chart(
 ):
     chart = _get_user_chart_or_404(db, chart_id, current_user.id)
 
-    db.delete(chart)
-    db.commit()
+    chart_service.delete_chart(db, chart)
 
     return Response(status_code=204)
 
 
+@router.post("/{chart_id}/cancel", response_model=ChartStatusItem, status_code=202)
+def cancel_chart(
+    chart_id: int,
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user),
+) -> ChartStatusItem:
+    """
+    Отмена обработки. uploaded -> сразу error "Cancelled"; processing остаётся
+    processing, пока воркер не остановит задачу (статус приходит в /charts/status).
+    """
+    chart = _get_user_chart_or_404(db, chart_id, current_user.id)
+    return _to_status_item(chart_service.cancel_chart(db, chart))
+
+
+@router.get("/{chart_id}/series/{panel_id}/{series_id}", response_model=ChartSeriesResponse)
+def get_chart_series(
+    chart_id: int,
+    panel_id: str,
+    series_id: str,
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user),
+):
+    """
+    Одна серия без чтения остальных: строка chart_series по первичному ключу.
+    version — для PUT этой серии.
+    """
+    row = chart_service.get_series(
+        db,
+        chart_id=chart_id,
+        user_id=current_user.id,
+        panel_id=panel_id,
+        series_id=series_id,
+    )
+    body = orjson.dumps(
+        {
+            "chart_id": chart_id,
+            "panel_id": panel_id,
+            "id": series_id,
+            "name": row.name,
+            "style": row.style,
+            "points": decode_points(row.points),
+            "point_count": row.point_count,
+            "x_min": row.x_min,
+            "x_max": row.x_max,
+            "y_min": row.y_min,
+            "y_max": row.y_max,
+            "version": row.version,
+        },
+        option=orjson.OPT_SERIALIZE_NUMPY,
+    )
+    return _json_bytes_response(body)
+
+
+@router.put("/{chart_id}/series/{panel_id}/{series_id}", response_model=ChartSeriesUpdateResponse)
+def update_chart_series(
+    chart_id: int,
+    panel_id: str,
+    series_id: str,
+    data: ChartSeriesUpdate,
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user),
+) -> ChartSeriesUpdateResponse:
+    """
+    Замена одной серии (name, style, points): {"version": N, ...}, N — version серии.
+    Правки разных серий одного chart не конфликтуют; result_version chart растёт.
+    """
+    return chart_service.update_series(
+        db,
+        chart_id=chart_id,
+        user_id=current_user.id,
+        panel_id=panel_id,
+        series_id=series_id,
+        data=data,
+    )
+
+
 @router.put("/{chart_id}/result_json", response_model=ChartCreateResponse)
 def update_chart_result_json(
     chart_id: int,
@@ -309,11 +793,40 @@ def update_chart_result_json(
         invalid_detail="Invalid panels",
     )
 
-    chart.result_json = payload
+    result_json, series_rows = split_result(payload)
+    chart.result_json = result_json
+    chart.result_version = Chart.result_version + 1
     chart.n_panels = len(panels)
     chart.n_series = sum(len(p.series) for p in panels)
+    # документ заменяется целиком: архивная копия больше не нужна
+    chart.archived_at = None
+    chart.archive_sha256 = None
 
+    # строка charts блокируется раньше серий — тот же порядок, что у PATCH
+    db.flush()
+    series_store.replace(db, chart.id, series_rows)
     db.commit()
     db.refresh(chart)
+    access_tracker.touch(chart.id)
+
+    return _to_chart_response(chart, series_store.load(db, chart.id, chart.result_json))
+
 
-    return _to_chart_response(chart)
\ No newline at end of file
+@router.patch("/{chart_id}/result_json", response_model=ChartPatchResponse)
+def patch_chart_result_json(
+    chart_id: int,
+    data: ChartPatchRequest,
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user),
+) -> ChartPatchResponse:
+    """
+    Частичное обновление result_json: {"version": N, "ops": [...]}.
+    ops — операции RFC 6902 (add/remove/replace/move/copy/test) или
+    replace_series / insert_points / delete_points по id панели и серии.
+    """
+    return chart_service.patch_result_json(
+        db,
+        chart_id=chart_id,
+        user_id=current_user.id,
+        data=data,
+    )
@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import datetime
+from hashlib import sha256
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+
+
+@dataclass(frozen=True)
+class AuthUser:
+    """
+    Снимок пользователя для get_current_user.
+    Не привязан к сессии БД, поэтому его можно держать в кэше между запросами.
+    """
+
+    id: int
+    email: str
+    is_active: bool
+    created_at: datetime
+
+    @classmethod
+    def from_model(cls, user) -> "AuthUser":
+        return cls(
+            id=user.id,
+            email=user.email,
+            is_active=user.is_active,
+            created_at=user.created_at,
+        )
+
+
+# sha256(token) -> user_id; запись живёт не дольше exp токена
+token_cache: TTLCache[str, int] = TTLCache(
+    maxsize=settings.auth_cache_max_entries,
+    ttl=settings.auth_cache_ttl_seconds,
+)
+
+# user_id -> AuthUser (только активные пользователи)
+user_cache: TTLCache[int, AuthUser] = TTLCache(
+    maxsize=settings.auth_cache_max_entries,
+    ttl=settings.auth_cache_ttl_seconds,
+)
+
+
+def token_key(token: str) -> str:
+    # сам токен в памяти не храним
+    return sha256(token.encode("utf-8")).hexdigest()
+
+
+def invalidate_user(user_id: int) -> None:
+    """
+    Вызывать при деактивации/изменении пользователя.
+    Кэш локален для процесса: в других воркерах uvicorn запись истечёт по TTL.
+    """
+    user_cache.pop(user_id)
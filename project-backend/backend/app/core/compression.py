@@ -0,0 +1,415 @@
+"""
+Сжатие ответов по Accept-Encoding: zstd, br, gzip.
+
+brotli и zstandard необязательны: без пакета кодировка просто не предлагается,
+gzip есть всегда. Сжимаются только текстовые типы (JSON результата, CSV-экспорты
+в UTF-16, метрики); картинки, zip, npz, arrow/parquet уже сжаты или почти не жмутся.
+
+- тело меньше COMPRESSION_MIN_BYTES уходит как есть;
+- тело или кусок стрима от COMPRESSION_OFFLOAD_BYTES сжимается в потоке,
+  чтобы не держать event loop;
+- сжатые тела кэшируются (LRU, COMPRESSION_CACHE_MB): с ETag — по
+  (path, query, ETag, кодировка), большие тела без ETag — по хешу содержимого.
+  Попадание по ETag проверяется по заголовкам, до тела: приложение останавливается,
+  и файл не читается с диска. Без ETag тело всё равно строится, экономится только сжатие.
+"""
+from __future__ import annotations
+
+import asyncio
+from collections import OrderedDict
+from dataclasses import dataclass
+import gzip
+import hashlib
+import threading
+from typing import Any, Callable, Hashable, Optional
+import zlib
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import settings
+from app.core.metrics import HTTP_COMPRESSION_BYTES, HTTP_COMPRESSION_CACHE
+
+try:  # brotli необязателен
+    import brotli
+except ImportError:  # pragma: no cover - зависит от окружения
+    brotli = None
+
+try:  # zstandard необязателен
+    import zstandard
+except ImportError:  # pragma: no cover - зависит от окружения
+    zstandard = None
+
+_COMPRESSIBLE_TYPES = frozenset(
+    {
+        "application/json",
+        "application/javascript",
+        "application/xml",
+        "application/x-ndjson",
+        # CSV-экспорты (UTF-16 LE, app.utils.export.csv_excel_bytes)
+        "application/vnd.ms-excel",
+        "image/svg+xml",
+    }
+)
+
+# без сжатия: частичные ответы, пустые тела, ответы без тела по стандарту
+_SKIP_STATUSES = frozenset({204, 206, 304})
+
+
+def _compressible_type(content_type: str) -> bool:
+    ctype = content_type.split(";", 1)[0].strip().lower()
+    return ctype.startswith("text/") or ctype in _COMPRESSIBLE_TYPES or ctype.endswith(("+json", "+xml"))
+
+
+# ---------- кодеки ----------
+
+class _BrotliStream:
+    def __init__(self, quality: int) -> None:
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.finish()
+
+
+@dataclass(frozen=True)
+class Codec:
+    """
+    compress — тело целиком; stream — объект с compress(chunk) / flush() для стрима.
+    """
+
+    name: str
+    compress: Callable[[bytes], bytes]
+    stream: Callable[[], Any]
+
+
+def available_codecs() -> dict[str, Codec]:
+    """
+    Кодировки в порядке предпочтения сервера (при равном q у клиента).
+    """
+    codecs: dict[str, Codec] = {}
+    if zstandard is not None:
+        level = settings.compression_zstd_level
+        codecs["zstd"] = Codec(
+            "zstd",
+            lambda data: zstandard.ZstdCompressor(level=level).compress(data),
+            lambda: zstandard.ZstdCompressor(level=level).compressobj(),
+        )
+    if brotli is not None:
+        quality = settings.compression_brotli_quality
+        codecs["br"] = Codec(
+            "br",
+            lambda data: brotli.compress(data, quality=quality),
+            lambda: _BrotliStream(quality),
+        )
+    level = settings.compression_gzip_level
+    codecs["gzip"] = Codec(
+        "gzip",
+        # mtime=0: одинаковое тело — одинаковые байты
+        lambda data: gzip.compress(data, compresslevel=level, mtime=0),
+        lambda: zlib.compressobj(level, zlib.DEFLATED, 31),
+    )
+    return codecs
+
+
+def negotiate(accept_encoding: str, codecs: dict[str, Codec]) -> Optional[Codec]:
+    """
+    Кодировка с наибольшим q из поддерживаемых; q=0 — запрет, "*" — любая другая.
+    """
+    weights: dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        token, _, params = part.partition(";")
+        token = token.strip().lower()
+        if not token:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        weights[token] = q
+
+    default = weights.get("*", 0.0)
+    best: Optional[Codec] = None
+    best_q = 0.0
+    for name, codec in codecs.items():
+        q = weights.get(name, default)
+        if q > best_q:
+            best, best_q = codec, q
+    return best
+
+
+# ---------- кэш сжатых тел ----------
+
+class CompressedBodyCache:
+    """
+    LRU по суммарному размеру сжатых тел. Потокобезопасный: пишут и event loop,
+    и потоки сжатия. Одна запись — не больше 1/8 объёма, чтобы большой экспорт
+    не вытеснял всё остальное.
+    """
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max(int(max_bytes), 0)
+        self._data: OrderedDict[Hashable, bytes] = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    @property
+    def max_entry_bytes(self) -> int:
+        return self.max_bytes // 8
+
+    def get(self, key: Hashable) -> Optional[bytes]:
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+        HTTP_COMPRESSION_CACHE.labels(result="hit" if value is not None else "miss").inc()
+        return value
+
+    def set(self, key: Hashable, value: bytes) -> None:
+        if not self.enabled or len(value) > self.max_entry_bytes:
+            return
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._size -= len(old)
+            self._data[key] = value
+            self._size += len(value)
+            while self._size > self.max_bytes:
+                _, evicted = self._data.popitem(last=False)
+                self._size -= len(evicted)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._size = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+# ---------- middleware ----------
+
+class _ServedFromCache(Exception):
+    """
+    Ответ отдан из кэша по заголовкам: send() прерывает приложение до чтения тела.
+    Ловится в CompressionMiddleware и наружу не выходит.
+    """
+
+
+class CompressionMiddleware:
+    """
+    Сжимает ответ выбранной по Accept-Encoding кодировкой. Обычный Response сжимается
+    целиком (Content-Length пересчитывается), StreamingResponse / FileResponse — по кускам
+    без Content-Length. Сильный ETag становится слабым: байты на проводе другие,
+    а If-None-Match сверяется слабо (app.utils.file_response), так что 304 работает.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+        self.codecs = available_codecs()
+        self.cache = CompressedBodyCache(settings.compression_cache_mb * 1024 * 1024)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not settings.compression_enabled:
+            await self.app(scope, receive, send)
+            return
+
+        codec = None
+        if scope["method"] != "HEAD":
+            codec = negotiate(Headers(scope=scope).get("accept-encoding", ""), self.codecs)
+        responder = _Responder(scope, send, codec, self.cache)
+        try:
+            await self.app(scope, receive, responder.send)
+        except _ServedFromCache:
+            pass
+
+
+class _Responder:
+    """
+    Состояние одного ответа: start придерживается до первого куска тела,
+    по нему решается, сжимать ли. Сжатое тело с тем же ETag отдаётся из кэша
+    сразу по start, тело приложения не запрашивается.
+    """
+
+    def __init__(self, scope: Scope, send: Send, codec: Optional[Codec], cache: CompressedBodyCache) -> None:
+        self.scope = scope
+        self._send = send
+        self.codec = codec
+        self.cache = cache
+        self.mode = "init"  # init | pass | stream
+        self.start: Optional[Message] = None
+        self.cache_key: Optional[Hashable] = None
+        self.stream: Any = None
+        self.collected: Optional[list[bytes]] = None
+        self.collected_bytes = 0
+
+    async def send(self, message: Message) -> None:
+        if self.mode == "pass":
+            await self._send(message)
+            return
+
+        if message["type"] == "http.response.start":
+            self.start = message
+            if await self._send_cached():
+                raise _ServedFromCache()
+            return
+        if message["type"] != "http.response.body":
+            # http.response.pathsend и т.п.: тело идёт мимо нас
+            self.mode = "pass"
+            await self._send(self.start)
+            await self._send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.mode == "init":
+            await self._first_body(body, more_body)
+        else:
+            await self._stream_body(body, more_body)
+
+    # ---------- решение по первому куску ----------
+
+    def _compressible(self, headers: MutableHeaders) -> bool:
+        status = self.start["status"]
+        if status < 200 or status in _SKIP_STATUSES:
+            return False
+        if "content-encoding" in headers or "content-range" in headers:
+            return False
+        if "no-transform" in headers.get("cache-control", "").lower():
+            return False
+        return _compressible_type(headers.get("content-type", ""))
+
+    def _encoded_headers(self, headers: MutableHeaders) -> None:
+        """
+        Заголовки сжатого ответа (без content-length); заодно ключ кэша по ETag.
+        """
+        etag = headers.get("etag")
+        if etag:
+            self.cache_key = (self.scope["path"], self.scope.get("query_string", b""), etag, self.codec.name)
+            if not etag.startswith("W/"):
+                headers["etag"] = "W/" + etag
+        headers["content-encoding"] = self.codec.name
+        # диапазоны байтов сжатого ответа не поддерживаем
+        for name in ("content-length", "accept-ranges"):
+            if name in headers:
+                del headers[name]
+
+    async def _send_cached(self) -> bool:
+        """
+        Попадание в кэш по ETag из заголовков: ответ отправляется целиком, True.
+        В кэше только тела, которые уже сжимались, так что порог размера не проверяем.
+        """
+        if self.codec is None or not self.cache.enabled:
+            return False
+        headers = MutableHeaders(raw=list(self.start["headers"]))
+        if "etag" not in headers or not self._compressible(headers):
+            return False
+        self._encoded_headers(headers)
+        cached = self.cache.get(self.cache_key)
+        if cached is None:
+            return False
+        headers.add_vary_header("Accept-Encoding")
+        headers["content-length"] = str(len(cached))
+        self.mode = "pass"
+        await self._send({**self.start, "headers": headers.raw})
+        await self._send({"type": "http.response.body", "body": cached})
+        return True
+
+    async def _first_body(self, body: bytes, more_body: bool) -> None:
+        headers = MutableHeaders(raw=list(self.start["headers"]))
+        if not self._compressible(headers):
+            self.mode = "pass"
+            await self._send(self.start)
+            await self._send({"type": "http.response.body", "body": body, "more_body": more_body})
+            return
+
+        headers.add_vary_header("Accept-Encoding")
+        min_bytes = settings.compression_min_bytes
+        declared = headers.get("content-length")
+        small = len(body) < min_bytes if not more_body else (declared is not None and int(declared) < min_bytes)
+        if self.codec is None or small:
+            self.mode = "pass"
+            await self._send({**self.start, "headers": headers.raw})
+            await self._send({"type": "http.response.body", "body": body, "more_body": more_body})
+            return
+
+        self._encoded_headers(headers)
+
+        if not more_body:
+            out = await self._compress_whole(body)
+            headers["content-length"] = str(len(out))
+            self.mode = "pass"
+            await self._send({**self.start, "headers": headers.raw})
+            await self._send({"type": "http.response.body", "body": out})
+            return
+
+        if self.cache_key is not None and self.cache.enabled:
+            # промах уже засчитан в _send_cached: собираем сжатое тело для кэша
+            self.collected = []
+
+        self.mode = "stream"
+        self.stream = self.codec.stream()
+        await self._send({**self.start, "headers": headers.raw})
+        await self._stream_body(body, more_body)
+
+    # ---------- сжатие ----------
+
+    async def _compress_whole(self, body: bytes) -> bytes:
+        if len(body) >= settings.compression_offload_bytes:
+            return await asyncio.to_thread(self._compress_cached, body, True)
+        return self._compress_cached(body, False)
+
+    def _compress_cached(self, body: bytes, large: bool) -> bytes:
+        # ключ по ETag уже проверен в _send_cached
+        key = self.cache_key
+        if key is None and large:
+            # без ETag кэшируем только большие тела: хеш дешевле сжатия в десятки раз
+            key = (hashlib.blake2b(body, digest_size=16).digest(), self.codec.name)
+            if self.cache.enabled:
+                cached = self.cache.get(key)
+                if cached is not None:
+                    return cached
+
+        out = self.codec.compress(body)
+        self._count(len(body), len(out))
+        if key is not None:
+            self.cache.set(key, out)
+        return out
+
+    async def _stream_body(self, body: bytes, more_body: bool) -> None:
+        if len(body) >= settings.compression_offload_bytes:
+            out = await asyncio.to_thread(self._stream_chunk, body, more_body)
+        else:
+            out = self._stream_chunk(body, more_body)
+
+        if self.collected is not None:
+            self.collected.append(out)
+            self.collected_bytes += len(out)
+            if self.collected_bytes > self.cache.max_entry_bytes:
+                self.collected = None
+            elif not more_body:
+                self.cache.set(self.cache_key, b"".join(self.collected))
+
+        if out or not more_body:
+            await self._send({"type": "http.response.body", "body": out, "more_body": more_body})
+
+    def _stream_chunk(self, body: bytes, more_body: bool) -> bytes:
+        out = self.stream.compress(body) if body else b""
+        if not more_body:
+            out += self.stream.flush()
+        self._count(len(body), len(out))
+        return out
+
+    def _count(self, n_in: int, n_out: int) -> None:
+        HTTP_COMPRESSION_BYTES.labels(encoding=self.codec.name, stage="in").inc(n_in)
+        HTTP_COMPRESSION_BYTES.labels(encoding=self.codec.name, stage="out").inc(n_out)
@@ -13,12 +13,71 @@ load_dotenv(PROJECT_DIR / ".env")
 
 class Settings(BaseModel):
     database_url: str
+    async_database_url: str = ""
+
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_async_pool_size: int = 10
+    db_async_max_overflow: int = 10
+    db_pool_timeout_seconds: int = 30
+    db_slow_query_ms: int = 200
+    db_n_plus_one_threshold: int = 10
+
+    debug: bool = False
 
     jwt_secret_key: str
     jwt_algorithm: str = "HS256"
     jwt_access_token_expire_minutes: int = 60
 
     storage_dir: Path = (BACKEND_DIR / "storage").resolve()
+    max_upload_bytes: int = 10 * 1024 * 1024
+    upload_chunk_bytes: int = 1024 * 1024
+    max_batch_files: int = 500
+    max_batch_bytes: int = 512 * 1024 * 1024
+
+    export_zip_batch_size: int = 100
+    export_zip_compress_level: int = 6
+
+    compression_enabled: bool = True
+    compression_min_bytes: int = 1024
+    compression_offload_bytes: int = 256 * 1024
+    compression_gzip_level: int = 6
+    compression_brotli_quality: int = 5
+    compression_zstd_level: int = 3
+    compression_cache_mb: int = 64
+
+    file_send_mode: Literal["direct", "x-accel-redirect", "x-sendfile"] = "direct"
+    file_accel_prefix: str = "/protected-storage/"
+
+    thumb_workers: int = 2
+    thumb_quality: int = 80
+
+    admin_emails: tuple[str, ...] = ()
+    queue_stats_cache_seconds: int = 10
+    queue_metrics_enabled: bool = True
+    worker_stale_seconds: int = 60
+
+    upload_rate_per_minute: int = 60
+    upload_burst: int = 30
+    user_max_pending: int = 500
+    queue_high_water: int = 10000
+    queue_depth_cache_seconds: int = 5
+
+    archive_enabled: bool = False
+    archive_dir: Path = (BACKEND_DIR / "storage" / "archive").resolve()
+    archive_after_days: int = 365
+    archive_artifacts: bool = False
+    archive_batch_size: int = 50
+    archive_batch_pause_ms: int = 500
+    archive_max_batches: int = 20
+    archive_interval_seconds: int = 3600
+    access_flush_seconds: int = 30
+    access_touch_min_seconds: int = 3600
+
+    storage_gc_enabled: bool = True
+    storage_gc_interval_seconds: int = 300
+    storage_gc_batch_size: int = 200
+    storage_gc_grace_seconds: int = 3600
 
     auth_enabled: bool = True
     auth_cookie_name: str = "access_token"
@@ -29,6 +88,15 @@ class Settings(BaseModel):
     dev_user_email: str = "dev@local"
     dev_user_password: str = "devpass"
 
+    auth_cache_ttl_seconds: int = 60
+    auth_cache_max_entries: int = 10000
+
+    password_hash_workers: int = 2
+    password_hash_max_queue: int = 32
+    password_hash_timeout_seconds: float = 10.0
+    auth_attempts_per_minute: int = 10
+    auth_attempts_burst: int = 5
+
 
 def _env_bool(name: str, default: bool) -> bool:
     raw = os.getenv(name)
@@ -44,6 +112,13 @@ def _env_int(name: str, default: int) -> int:
     return int(raw)
 
 
+def _env_float(name: str, default: float) -> float:
+    raw = os.getenv(name)
+    if raw is None or raw.strip() == "":
+        return default
+    return float(raw)
+
+
 def _env_str(name: str, default: str | None = None) -> str:
     raw = os.getenv(name)
     if raw is None:
@@ -51,18 +126,73 @@ def _env_str(name: str, default: str | None = None) -> str:
     return raw.strip()
 
 
+def _env_list(name: str) -> tuple[str, ...]:
+    raw = os.getenv(name) or ""
+    return tuple(x.strip().lower() for x in raw.split(",") if x.strip())
+
+
 def get_settings() -> Settings:
     try:
         jwt_ttl_minutes = _env_int("JWT_ACCESS_TOKEN_EXPIRE_MINUTES", 60)
         cookie_max_age = _env_int("COOKIE_MAX_AGE", jwt_ttl_minutes * 60)
         cookie_samesite = _env_str("COOKIE_SAMESITE", "lax").lower()
+        storage_dir = Path(_env_str("STORAGE_DIR", str(BACKEND_DIR / "storage"))).resolve()
 
         settings_obj = Settings(
             database_url=_env_str("DATABASE_URL"),
+            async_database_url=_env_str("ASYNC_DATABASE_URL"),
+            db_pool_size=_env_int("DB_POOL_SIZE", 5),
+            db_max_overflow=_env_int("DB_MAX_OVERFLOW", 10),
+            db_async_pool_size=_env_int("DB_ASYNC_POOL_SIZE", 10),
+            db_async_max_overflow=_env_int("DB_ASYNC_MAX_OVERFLOW", 10),
+            db_pool_timeout_seconds=_env_int("DB_POOL_TIMEOUT_SECONDS", 30),
+            db_slow_query_ms=_env_int("DB_SLOW_QUERY_MS", 200),
+            db_n_plus_one_threshold=_env_int("DB_N_PLUS_ONE_THRESHOLD", 10),
+            debug=_env_bool("DEBUG", False),
             jwt_secret_key=_env_str("JWT_SECRET_KEY"),
             jwt_algorithm=_env_str("JWT_ALGORITHM", "HS256") or "HS256",
             jwt_access_token_expire_minutes=jwt_ttl_minutes,
-            storage_dir=Path(_env_str("STORAGE_DIR", str(BACKEND_DIR / "storage"))).resolve(),
+            storage_dir=storage_dir,
+            max_upload_bytes=_env_int("MAX_UPLOAD_BYTES", 10 * 1024 * 1024),
+            upload_chunk_bytes=_env_int("UPLOAD_CHUNK_BYTES", 1024 * 1024),
+            max_batch_files=_env_int("MAX_BATCH_FILES", 500),
+            max_batch_bytes=_env_int("MAX_BATCH_BYTES", 512 * 1024 * 1024),
+            export_zip_batch_size=_env_int("EXPORT_ZIP_BATCH_SIZE", 100),
+            export_zip_compress_level=_env_int("EXPORT_ZIP_COMPRESS_LEVEL", 6),
+            compression_enabled=_env_bool("COMPRESSION_ENABLED", True),
+            compression_min_bytes=_env_int("COMPRESSION_MIN_BYTES", 1024),
+            compression_offload_bytes=_env_int("COMPRESSION_OFFLOAD_BYTES", 256 * 1024),
+            compression_gzip_level=_env_int("COMPRESSION_GZIP_LEVEL", 6),
+            compression_brotli_quality=_env_int("COMPRESSION_BROTLI_QUALITY", 5),
+            compression_zstd_level=_env_int("COMPRESSION_ZSTD_LEVEL", 3),
+            compression_cache_mb=_env_int("COMPRESSION_CACHE_MB", 64),
+            file_send_mode=_env_str("FILE_SEND_MODE", "direct").lower() or "direct",
+            file_accel_prefix=_env_str("FILE_ACCEL_PREFIX", "/protected-storage/") or "/protected-storage/",
+            thumb_workers=_env_int("THUMB_WORKERS", 2),
+            thumb_quality=_env_int("THUMB_QUALITY", 80),
+            admin_emails=_env_list("ADMIN_EMAILS"),
+            queue_stats_cache_seconds=_env_int("QUEUE_STATS_CACHE_SECONDS", 10),
+            queue_metrics_enabled=_env_bool("QUEUE_METRICS_ENABLED", True),
+            worker_stale_seconds=_env_int("WORKER_STALE_SECONDS", 60),
+            upload_rate_per_minute=_env_int("UPLOAD_RATE_PER_MINUTE", 60),
+            upload_burst=_env_int("UPLOAD_BURST", 30),
+            user_max_pending=_env_int("USER_MAX_PENDING", 500),
+            queue_high_water=_env_int("QUEUE_HIGH_WATER", 10000),
+            queue_depth_cache_seconds=_env_int("QUEUE_DEPTH_CACHE_SECONDS", 5),
+            archive_enabled=_env_bool("ARCHIVE_ENABLED", False),
+            archive_dir=Path(_env_str("ARCHIVE_DIR", str(storage_dir / "archive"))).resolve(),
+            archive_after_days=_env_int("ARCHIVE_AFTER_DAYS", 365),
+            archive_artifacts=_env_bool("ARCHIVE_ARTIFACTS", False),
+            archive_batch_size=_env_int("ARCHIVE_BATCH_SIZE", 50),
+            archive_batch_pause_ms=_env_int("ARCHIVE_BATCH_PAUSE_MS", 500),
+            archive_max_batches=_env_int("ARCHIVE_MAX_BATCHES", 20),
+            archive_interval_seconds=_env_int("ARCHIVE_INTERVAL_SECONDS", 3600),
+            access_flush_seconds=_env_int("ACCESS_FLUSH_SECONDS", 30),
+            access_touch_min_seconds=_env_int("ACCESS_TOUCH_MIN_SECONDS", 3600),
+            storage_gc_enabled=_env_bool("STORAGE_GC_ENABLED", True),
+            storage_gc_interval_seconds=_env_int("STORAGE_GC_INTERVAL_SECONDS", 300),
+            storage_gc_batch_size=_env_int("STORAGE_GC_BATCH_SIZE", 200),
+            storage_gc_grace_seconds=_env_int("STORAGE_GC_GRACE_SECONDS", 3600),
             auth_enabled=_env_bool("AUTH_ENABLED", True),
             auth_cookie_name=_env_str("AUTH_COOKIE_NAME", "access_token") or "access_token",
             cookie_secure=_env_bool("COOKIE_SECURE", False),
@@ -70,20 +200,111 @@ def get_settings() -> Settings:
             cookie_max_age=cookie_max_age,
             dev_user_email=_env_str("DEV_USER_EMAIL", "dev@local") or "dev@local",
             dev_user_password=os.getenv("DEV_USER_PASSWORD", "devpass"),
+            auth_cache_ttl_seconds=_env_int("AUTH_CACHE_TTL_SECONDS", 60),
+            auth_cache_max_entries=_env_int("AUTH_CACHE_MAX_ENTRIES", 10000),
+            password_hash_workers=_env_int("PASSWORD_HASH_WORKERS", 2),
+            password_hash_max_queue=_env_int("PASSWORD_HASH_MAX_QUEUE", 32),
+            password_hash_timeout_seconds=_env_float("PASSWORD_HASH_TIMEOUT_SECONDS", 10.0),
+            auth_attempts_per_minute=_env_int("AUTH_ATTEMPTS_PER_MINUTE", 10),
+            auth_attempts_burst=_env_int("AUTH_ATTEMPTS_BURST", 5),
         )
 
         if not settings_obj.database_url:
             raise RuntimeError("DATABASE_URL is required")
 
+        if settings_obj.db_pool_size <= 0 or settings_obj.db_async_pool_size <= 0:
+            raise RuntimeError("DB_POOL_SIZE and DB_ASYNC_POOL_SIZE must be > 0")
+
+        if settings_obj.db_max_overflow < 0 or settings_obj.db_async_max_overflow < 0:
+            raise RuntimeError("DB_MAX_OVERFLOW and DB_ASYNC_MAX_OVERFLOW must be >= 0")
+
         if not settings_obj.jwt_secret_key or settings_obj.jwt_secret_key == "CHANGE_ME":
             raise RuntimeError("JWT_SECRET_KEY must be set and must not be CHANGE_ME")
 
         if settings_obj.jwt_access_token_expire_minutes <= 0:
             raise RuntimeError("JWT_ACCESS_TOKEN_EXPIRE_MINUTES must be > 0")
 
+        if settings_obj.max_upload_bytes <= 0:
+            raise RuntimeError("MAX_UPLOAD_BYTES must be > 0")
+
+        if settings_obj.upload_chunk_bytes <= 0:
+            raise RuntimeError("UPLOAD_CHUNK_BYTES must be > 0")
+
+        if settings_obj.max_batch_files <= 0:
+            raise RuntimeError("MAX_BATCH_FILES must be > 0")
+
+        if settings_obj.max_batch_bytes <= 0:
+            raise RuntimeError("MAX_BATCH_BYTES must be > 0")
+
+        if settings_obj.export_zip_batch_size <= 0:
+            raise RuntimeError("EXPORT_ZIP_BATCH_SIZE must be > 0")
+
+        if not 0 <= settings_obj.export_zip_compress_level <= 9:
+            raise RuntimeError("EXPORT_ZIP_COMPRESS_LEVEL must be in 0..9")
+
+        if settings_obj.compression_min_bytes < 0 or settings_obj.compression_offload_bytes < 0:
+            raise RuntimeError("COMPRESSION_MIN_BYTES and COMPRESSION_OFFLOAD_BYTES must be >= 0")
+
+        if not 1 <= settings_obj.compression_gzip_level <= 9:
+            raise RuntimeError("COMPRESSION_GZIP_LEVEL must be in 1..9")
+
+        if not 0 <= settings_obj.compression_brotli_quality <= 11:
+            raise RuntimeError("COMPRESSION_BROTLI_QUALITY must be in 0..11")
+
+        if not 1 <= settings_obj.compression_zstd_level <= 22:
+            raise RuntimeError("COMPRESSION_ZSTD_LEVEL must be in 1..22")
+
+        if settings_obj.compression_cache_mb < 0:
+            raise RuntimeError("COMPRESSION_CACHE_MB must be >= 0 (0 disables the cache)")
+
+        if settings_obj.thumb_workers < 0:
+            raise RuntimeError("THUMB_WORKERS must be >= 0 (0 disables background thumbnails)")
+
+        if not 1 <= settings_obj.thumb_quality <= 100:
+            raise RuntimeError("THUMB_QUALITY must be in 1..100")
+
+        if settings_obj.queue_stats_cache_seconds < 0:
+            raise RuntimeError("QUEUE_STATS_CACHE_SECONDS must be >= 0")
+
+        if settings_obj.worker_stale_seconds <= 0:
+            raise RuntimeError("WORKER_STALE_SECONDS must be > 0")
+
+        if settings_obj.upload_rate_per_minute < 0 or settings_obj.upload_burst < 0:
+            raise RuntimeError("UPLOAD_RATE_PER_MINUTE and UPLOAD_BURST must be >= 0 (0 disables the limit)")
+
+        if settings_obj.user_max_pending < 0 or settings_obj.queue_high_water < 0:
+            raise RuntimeError("USER_MAX_PENDING and QUEUE_HIGH_WATER must be >= 0 (0 disables the limit)")
+
+        if settings_obj.queue_depth_cache_seconds < 0:
+            raise RuntimeError("QUEUE_DEPTH_CACHE_SECONDS must be >= 0")
+
+        if settings_obj.archive_after_days <= 0:
+            raise RuntimeError("ARCHIVE_AFTER_DAYS must be > 0")
+
+        if settings_obj.archive_batch_size <= 0 or settings_obj.archive_max_batches <= 0:
+            raise RuntimeError("ARCHIVE_BATCH_SIZE and ARCHIVE_MAX_BATCHES must be > 0")
+
+        if settings_obj.archive_interval_seconds <= 0 or settings_obj.access_flush_seconds <= 0:
+            raise RuntimeError("ARCHIVE_INTERVAL_SECONDS and ACCESS_FLUSH_SECONDS must be > 0")
+
+        if settings_obj.storage_gc_interval_seconds <= 0:
+            raise RuntimeError("STORAGE_GC_INTERVAL_SECONDS must be > 0")
+
+        if settings_obj.storage_gc_batch_size <= 0:
+            raise RuntimeError("STORAGE_GC_BATCH_SIZE must be > 0")
+
         if settings_obj.cookie_max_age <= 0:
             raise RuntimeError("COOKIE_MAX_AGE must be > 0")
 
+        if settings_obj.auth_cache_ttl_seconds < 0:
+            raise RuntimeError("AUTH_CACHE_TTL_SECONDS must be >= 0 (0 disables the cache)")
+
+        if settings_obj.password_hash_workers < 0 or settings_obj.password_hash_max_queue < 0:
+            raise RuntimeError("PASSWORD_HASH_WORKERS and PASSWORD_HASH_MAX_QUEUE must be >= 0")
+
+        if settings_obj.password_hash_timeout_seconds <= 0:
+            raise RuntimeError("PASSWORD_HASH_TIMEOUT_SECONDS must be > 0")
+
         if settings_obj.cookie_samesite == "none" and not settings_obj.cookie_secure:
             raise RuntimeError("COOKIE_SECURE must be true when COOKIE_SAMESITE=none")
 
@@ -0,0 +1,183 @@
+"""
+Метрики Prometheus.
+
+При нескольких воркерах uvicorn каждый процесс считает своё. Чтобы /metrics
+отдавал сумму, задайте PROMETHEUS_MULTIPROC_DIR (пустой каталог, общий для воркеров)
+до старта процесса: prometheus_client читает переменную при создании метрик.
+"""
+
+import os
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+
+def _multiproc_dir() -> str | None:
+    return os.environ.get("PROMETHEUS_MULTIPROC_DIR") or os.environ.get("prometheus_multiproc_dir")
+
+
+# Свои collectors (например, гейджи очереди из БД): в multiprocess-режиме их нужно
+# регистрировать в реестре, который собирается на каждый запрос /metrics.
+_EXTRA_COLLECTORS: list = []
+
+
+def register_collector(collector) -> None:
+    if collector in _EXTRA_COLLECTORS:
+        return
+    _EXTRA_COLLECTORS.append(collector)
+    if not _multiproc_dir():
+        REGISTRY.register(collector)
+
+
+def render_latest() -> tuple[bytes, str]:
+    """
+    Текст для /metrics. В multiprocess-режиме собираем файлы всех воркеров.
+    """
+    if _multiproc_dir():
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        for collector in _EXTRA_COLLECTORS:
+            registry.register(collector)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead(pid: int) -> None:
+    """
+    Убирает livesum-гейджи завершившегося воркера, иначе они висят в сумме.
+    """
+    if _multiproc_dir():
+        multiprocess.mark_process_dead(pid)
+
+
+# ---------- пароли (bcrypt в отдельном пуле процессов) ----------
+
+PASSWORD_HASH_SECONDS = Histogram(
+    "password_hash_seconds",
+    "CPU time of one bcrypt hash/verify in the worker process",
+    ["op"],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.2, 0.3, 0.5, 1.0, 2.0),
+)
+PASSWORD_HASH_WAIT_SECONDS = Histogram(
+    "password_hash_wait_seconds",
+    "Wall time from submit to result, including queueing",
+    ["op"],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+PASSWORD_HASH_IN_FLIGHT = Gauge(
+    "password_hash_in_flight",
+    "Password hash jobs submitted and not finished yet",
+    multiprocess_mode="livesum",
+)
+PASSWORD_HASH_REJECTED = Counter(
+    "password_hash_rejected_total",
+    "Password hash jobs rejected before running",
+    ["reason"],
+)
+AUTH_RATE_LIMITED = Counter(
+    "auth_rate_limited_total",
+    "Login/register attempts rejected by the attempt limiter",
+    ["scope"],
+)
+UPLOAD_REJECTED = Counter(
+    "upload_rejected_total",
+    "Chart uploads rejected by admission control",
+    ["reason"],
+)
+
+# ---------- база данных (app.db.instrumentation) ----------
+
+DB_QUERY_SECONDS = Histogram(
+    "db_query_seconds",
+    "Duration of one SQL statement",
+    ["route"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+DB_QUERIES_PER_REQUEST = Histogram(
+    "db_queries_per_request",
+    "Number of SQL statements issued by one HTTP request",
+    ["route"],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 50, 100),
+)
+DB_TIME_PER_REQUEST_SECONDS = Histogram(
+    "db_time_per_request_seconds",
+    "Total SQL time of one HTTP request",
+    ["route"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+DB_CHECKOUT_WAIT_SECONDS = Histogram(
+    "db_pool_checkout_wait_seconds",
+    "Time spent waiting for a connection from the pool",
+    ["pool"],
+    buckets=(0.0001, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0),
+)
+DB_POOL_CHECKED_OUT = Gauge(
+    "db_pool_checked_out",
+    "Connections currently checked out of the pool",
+    ["pool"],
+    multiprocess_mode="livesum",
+)
+DB_POOL_OVERFLOW = Gauge(
+    "db_pool_overflow",
+    "Connections opened above pool_size",
+    ["pool"],
+    multiprocess_mode="livesum",
+)
+DB_SLOW_QUERIES = Counter(
+    "db_slow_queries_total",
+    "SQL statements slower than DB_SLOW_QUERY_MS",
+    ["route"],
+)
+DB_N_PLUS_ONE = Counter(
+    "db_n_plus_one_total",
+    "Requests where one statement repeated at least DB_N_PLUS_ONE_THRESHOLD times",
+    ["route"],
+)
+
+# ---------- HTTP (app.core.http_metrics) ----------
+
+HTTP_REQUESTS = Counter(
+    "http_requests_total",
+    "HTTP requests by route template and status code",
+    ["method", "route", "status"],
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_seconds",
+    "Time from request start to the last byte of the response",
+    ["method", "route"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0),
+)
+HTTP_RESPONSE_BYTES = Histogram(
+    "http_response_bytes",
+    "Response body size",
+    ["method", "route"],
+    buckets=(256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216, 67108864),
+)
+HTTP_IN_FLIGHT = Gauge(
+    "http_requests_in_flight",
+    "HTTP requests currently being served",
+    ["method", "route"],
+    multiprocess_mode="livesum",
+)
+
+# ---------- сжатие ответов (app.core.compression) ----------
+
+HTTP_COMPRESSION_BYTES = Counter(
+    "http_compression_bytes_total",
+    "Response body bytes before (stage=in) and after (stage=out) compression",
+    ["encoding", "stage"],
+)
+HTTP_COMPRESSION_CACHE = Counter(
+    "http_compression_cache_total",
+    "Lookups in the cache of compressed bodies",
+    ["result"],
+)
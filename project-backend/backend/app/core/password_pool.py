@@ -0,0 +1,191 @@
+from __future__ import annotations
+
+import asyncio
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
+import threading
+import time
+from typing import Any, Callable
+
+from fastapi import HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.core.metrics import (
+    PASSWORD_HASH_IN_FLIGHT,
+    PASSWORD_HASH_REJECTED,
+    PASSWORD_HASH_SECONDS,
+    PASSWORD_HASH_WAIT_SECONDS,
+)
+
+
+# ---------- функции, выполняемые в дочерних процессах ----------
+# Возвращают (результат, CPU-время), чтобы стоимость bcrypt попадала в метрики.
+
+def _hash_job(password: str) -> tuple[str, float]:
+    from app.core.security import get_password_hash
+
+    started = time.process_time()
+    hashed = get_password_hash(password)
+    return hashed, time.process_time() - started
+
+
+def _verify_job(plain_password: str, hashed_password: str) -> tuple[bool, float]:
+    from app.core.security import verify_password
+
+    started = time.process_time()
+    ok = verify_password(plain_password, hashed_password)
+    return ok, time.process_time() - started
+
+
+def _warmup_job() -> None:
+    # импорт passlib/bcrypt заранее, чтобы первый логин не платил за него
+    import app.core.security  # noqa: F401
+
+
+def _overloaded(detail: str) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail=detail,
+        headers={"Retry-After": "1"},
+    )
+
+
+class PasswordHasher:
+    """
+    bcrypt в отдельном ограниченном пуле процессов.
+
+    Хэширование занимает 100–300 мс CPU; в потоке AnyIO оно держало GIL,
+    и остальные эндпоинты стояли в очереди. Теперь поток эндпоинта только
+    ждёт future, а CPU тратится в дочернем процессе.
+
+    Глубина очереди ограничена: если занято workers + max_queue слотов,
+    сразу отвечаем 503, а не копим ожидающие запросы.
+    """
+
+    def __init__(self) -> None:
+        self._executor: ProcessPoolExecutor | None = None
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(
+            max(settings.password_hash_workers, 1) + max(settings.password_hash_max_queue, 0)
+        )
+
+    def start(self) -> None:
+        with self._lock:
+            if self._executor is None and settings.password_hash_workers > 0:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=settings.password_hash_workers,
+                    # spawn: форк процесса с потоками uvicorn/anyio небезопасен
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+                for _ in range(settings.password_hash_workers):
+                    self._executor.submit(_warmup_job)
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _restart(self, broken: ProcessPoolExecutor) -> None:
+        with self._lock:
+            if self._executor is not broken:
+                return
+            self._executor = None
+        broken.shutdown(wait=False, cancel_futures=True)
+        self.start()
+
+    def _release(self, _future: Future | None = None) -> None:
+        PASSWORD_HASH_IN_FLIGHT.dec()
+        self._slots.release()
+
+    def _submit(self, executor: ProcessPoolExecutor, fn: Callable[..., Any], *args: Any) -> Future:
+        """
+        Слот освобождается, когда задача завершилась в дочернем процессе, а не когда
+        её перестал ждать запрос: после таймаута bcrypt ещё занимает процесс пула.
+        """
+        PASSWORD_HASH_IN_FLIGHT.inc()
+        try:
+            future = executor.submit(fn, *args)
+        except BaseException:
+            self._release()
+            raise
+        future.add_done_callback(self._release)
+        return future
+
+    def _run(self, op: str, fn: Callable[..., tuple[Any, float]], *args: Any) -> Any:
+        executor = self._executor
+        if executor is None:
+            # пул не запущен (скрипты, миграции) — считаем в текущем процессе
+            result, cpu = fn(*args)
+            PASSWORD_HASH_SECONDS.labels(op=op).observe(cpu)
+            return result
+
+        if not self._slots.acquire(blocking=False):
+            PASSWORD_HASH_REJECTED.labels(reason="queue_full").inc()
+            raise _overloaded("Authentication is temporarily overloaded, retry later")
+
+        started = time.perf_counter()
+        try:
+            future = self._submit(executor, fn, *args)
+            result, cpu = future.result(timeout=settings.password_hash_timeout_seconds)
+        except FutureTimeoutError:
+            # ещё не начатая задача отменится; начатая держит слот до своего конца
+            future.cancel()
+            PASSWORD_HASH_REJECTED.labels(reason="timeout").inc()
+            raise _overloaded("Authentication timed out, retry later")
+        except BrokenProcessPool:
+            PASSWORD_HASH_REJECTED.labels(reason="broken_pool").inc()
+            self._restart(executor)
+            raise _overloaded("Authentication is temporarily unavailable, retry later")
+
+        PASSWORD_HASH_WAIT_SECONDS.labels(op=op).observe(time.perf_counter() - started)
+        PASSWORD_HASH_SECONDS.labels(op=op).observe(cpu)
+        return result
+
+    async def _run_async(self, op: str, fn: Callable[..., tuple[Any, float]], *args: Any) -> Any:
+        """
+        То же, что _run(), но для async def: ждём future в event loop,
+        не занимая поток из threadpool.
+        """
+        executor = self._executor
+        if executor is None:
+            result, cpu = await run_in_threadpool(fn, *args)
+            PASSWORD_HASH_SECONDS.labels(op=op).observe(cpu)
+            return result
+
+        if not self._slots.acquire(blocking=False):
+            PASSWORD_HASH_REJECTED.labels(reason="queue_full").inc()
+            raise _overloaded("Authentication is temporarily overloaded, retry later")
+
+        started = time.perf_counter()
+        try:
+            future = asyncio.wrap_future(self._submit(executor, fn, *args))
+            result, cpu = await asyncio.wait_for(future, settings.password_hash_timeout_seconds)
+        except asyncio.TimeoutError:
+            PASSWORD_HASH_REJECTED.labels(reason="timeout").inc()
+            raise _overloaded("Authentication timed out, retry later")
+        except BrokenProcessPool:
+            PASSWORD_HASH_REJECTED.labels(reason="broken_pool").inc()
+            self._restart(executor)
+            raise _overloaded("Authentication is temporarily unavailable, retry later")
+
+        PASSWORD_HASH_WAIT_SECONDS.labels(op=op).observe(time.perf_counter() - started)
+        PASSWORD_HASH_SECONDS.labels(op=op).observe(cpu)
+        return result
+
+    def hash(self, password: str) -> str:
+        return self._run("hash", _hash_job, password)
+
+    def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return self._run("verify", _verify_job, plain_password, hashed_password)
+
+    async def hash_async(self, password: str) -> str:
+        return await self._run_async("hash", _hash_job, password)
+
+    async def verify_async(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._run_async("verify", _verify_job, plain_password, hashed_password)
+
+
+password_hasher = PasswordHasher()
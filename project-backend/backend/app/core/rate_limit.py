@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+import math
+import threading
+import time
+from typing import Hashable
+
+
+class TokenBucketLimiter:
+    """
+    Token bucket на ключ (ip, email, user_id, ...), хранится в памяти процесса.
+    capacity — размер всплеска, rate — токенов в секунду.
+    Число ключей ограничено max_keys: самые давние вытесняются (LRU).
+    """
+
+    def __init__(self, capacity: float, rate: float, max_keys: int = 100_000) -> None:
+        self.capacity = float(capacity)
+        self.rate = float(rate)
+        self.max_keys = max(int(max_keys), 1)
+        self._buckets: OrderedDict[Hashable, tuple[float, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.capacity > 0 and self.rate > 0
+
+    def hit(self, key: Hashable, cost: float = 1.0, *, debt: bool = False) -> float:
+        """
+        Списывает cost токенов. Возвращает 0, если запрос разрешён,
+        иначе — через сколько секунд стоит повторить.
+
+        debt=True: достаточно min(cost, capacity) токенов, списывается весь cost.
+        Запрос больше ёмкости проходит с полного ведра, а следующие ждут,
+        пока долг не погасится.
+        """
+        if not self.enabled:
+            return 0.0
+
+        need = min(cost, self.capacity) if debt else cost
+        with self._lock:
+            tokens, now = self._refill(key)
+            if tokens >= need:
+                self._store(key, tokens - cost, now)
+                return 0.0
+            self._store(key, tokens, now)
+        return (need - tokens) / self.rate
+
+    def charge(self, key: Hashable, cost: float) -> None:
+        """
+        Списывает cost без проверки (ведро может уйти в минус): для стоимости,
+        которая стала известна после того, как запрос уже принят.
+        """
+        if not self.enabled or cost <= 0:
+            return
+        with self._lock:
+            tokens, now = self._refill(key)
+            self._store(key, tokens - cost, now)
+
+    def _refill(self, key: Hashable) -> tuple[float, float]:
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(key, (self.capacity, now))
+        return min(self.capacity, tokens + (now - updated) * self.rate), now
+
+    def _store(self, key: Hashable, tokens: float, now: float) -> None:
+        self._buckets[key] = (tokens, now)
+        self._buckets.move_to_end(key)
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+
+
+def retry_after_header(seconds: float) -> dict[str, str]:
+    return {"Retry-After": str(max(int(math.ceil(seconds)), 1))}
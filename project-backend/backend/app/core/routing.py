@@ -0,0 +1,26 @@
+from starlette.routing import Match
+from starlette.types import Scope
+
+UNMATCHED_ROUTE = "<unmatched>"
+
+
+def route_template(scope: Scope) -> str:
+    """
+    Шаблон маршрута для запроса (/api/v1/charts/{chart_id}), а не фактический путь:
+    метки метрик и логов не должны расти с числом id.
+    Вызывается до роутинга, поэтому маршрут подбираем сами по app.router.routes.
+    """
+    app = scope.get("app")
+    router = getattr(app, "router", None)
+    if router is None:
+        return UNMATCHED_ROUTE
+
+    partial: str | None = None
+    for route in router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return getattr(route, "path", UNMATCHED_ROUTE)
+        if match == Match.PARTIAL and partial is None:
+            # путь совпал, метод нет (405) — всё равно считаем по шаблону
+            partial = getattr(route, "path", None)
+    return partial or UNMATCHED_ROUTE
@@ -1,2 +1,3 @@
-from app.db.crud.user import user_crud  # noqa
-from app.db.crud.chart import chart_crud  # noqa
+from app.db.crud.user import async_user_crud, user_crud  # noqa
+from app.db.crud.chart import async_chart_crud, chart_crud  # noqa
+from app.db.crud.blob import async_blob_crud, blob_crud  # noqa
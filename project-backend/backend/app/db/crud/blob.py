@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import case, func, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.db.models.blob import Blob
+
+
+class BlobCRUD:
+    """
+    Операции не делают commit: счётчик ссылок меняется в одной транзакции
+    с созданием/удалением chart.
+    """
+
+    def get(self, db: Session, sha256: str) -> Optional[Blob]:
+        return db.get(Blob, sha256)
+
+    def release(self, db: Session, sha256: str) -> None:
+        db.execute(
+            update(Blob)
+            .where(Blob.sha256 == sha256)
+            .values(
+                ref_count=func.greatest(Blob.ref_count - 1, 0),
+                unreferenced_at=case((Blob.ref_count <= 1, func.now()), else_=None),
+            )
+        )
+
+    def claim_garbage(
+        self,
+        db: Session,
+        *,
+        unreferenced_before: datetime,
+        limit: int,
+    ) -> list[Blob]:
+        """
+        Блокирует пачку блобов без ссылок (SKIP LOCKED — чтобы несколько
+        процессов API не мешали друг другу и загрузкам).
+        """
+        stmt = (
+            select(Blob)
+            .where(
+                Blob.ref_count <= 0,
+                Blob.unreferenced_at.is_not(None),
+                Blob.unreferenced_at < unreferenced_before,
+            )
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        return list(db.execute(stmt).scalars())
+
+    def delete(self, db: Session, blob: Blob) -> None:
+        db.delete(blob)
+
+
+class AsyncBlobCRUD:
+    """
+    Взятие ссылок на блобы из async-эндпоинтов загрузки. Тоже без commit.
+    """
+
+    async def acquire(
+        self,
+        db: AsyncSession,
+        *,
+        sha256: str,
+        path: str,
+        size_bytes: Optional[int] = None,
+    ) -> str:
+        """
+        Увеличивает ref_count (или создаёт запись) и возвращает путь блоба.
+        Если блоб уже был, возвращается его сохранённый путь, а не переданный.
+        """
+        stmt = (
+            insert(Blob)
+            .values(sha256=sha256, path=path, size_bytes=size_bytes, ref_count=1)
+            .on_conflict_do_update(
+                index_elements=[Blob.sha256],
+                set_={
+                    "ref_count": Blob.ref_count + 1,
+                    "unreferenced_at": None,
+                },
+            )
+            .returning(Blob.path)
+        )
+        return (await db.execute(stmt)).scalar_one()
+
+    async def acquire_many(
+        self,
+        db: AsyncSession,
+        refs: dict[str, tuple[str, Optional[int], int]],
+    ) -> dict[str, str]:
+        """
+        Пакетный acquire одним INSERT ... ON CONFLICT.
+        refs: sha256 -> (путь, размер, сколько новых ссылок). Возвращает sha256 -> путь.
+        """
+        if not refs:
+            return {}
+        stmt = insert(Blob).values(
+            [
+                {"sha256": sha, "path": path, "size_bytes": size, "ref_count": count}
+                for sha, (path, size, count) in refs.items()
+            ]
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Blob.sha256],
+            set_={
+                "ref_count": Blob.ref_count + stmt.excluded.ref_count,
+                "unreferenced_at": None,
+            },
+        ).returning(Blob.sha256, Blob.path)
+        return {sha: path for sha, path in await db.execute(stmt)}
+
+
+blob_crud = BlobCRUD()
+async_blob_crud = AsyncBlobCRUD()
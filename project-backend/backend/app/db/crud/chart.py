@@ -1,39 +1,257 @@
 from __future__ import annotations
 
-from typing import Any, Optional
+from datetime import datetime, timedelta
+import json
+from typing import Any, Iterator, Optional
 
+from sqlalchemy import (
+    Select,
+    Text,
+    cast,
+    func,
+    insert,
+    literal,
+    literal_column,
+    or_,
+    select,
+    tuple_,
+    update,
+)
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from app.db.models.chart import Chart
+from app.db.crud.blob import blob_crud
+from app.db.models.chart import Chart, series_names_expr
+from app.db.models.queue import ChartJob
+
+
+ACTIVE_STATUSES = ("uploaded", "processing")
+
+# chart_jobs.priority: воркер берёт задачи с большим приоритетом первыми,
+# чтобы одиночная загрузка не ждала за пакетом из сотен файлов
+JOB_PRIORITY_INTERACTIVE = 0
+JOB_PRIORITY_BATCH = -10
+
+# пространство ключей advisory-блокировок каталогов артефактов: двухключевая форма
+# (класс, chart_id) не пересекается с одноключевой, которую берёт lock_archive
+_ARTIFACTS_LOCK_CLASS = 1
+
+_STATUS_COLUMNS = (
+    Chart.id,
+    Chart.status,
+    Chart.processed_at,
+    Chart.n_series,
+    Chart.error_message,
+)
+
+# Колонки ответа GET /charts и /charts/{id}, без original_path/sha256
+_RESPONSE_COLUMNS = (
+    Chart.id,
+    Chart.status,
+    Chart.original_filename,
+    Chart.mime_type,
+    Chart.created_at,
+    Chart.processed_at,
+    Chart.n_panels,
+    Chart.n_series,
+    Chart.result_version,
+    Chart.error_message,
+    Chart.archive_sha256,
+)
+
+
+# Колонки для выгрузки в ZIP (app.services.bulk_export)
+_EXPORT_COLUMNS = (
+    Chart.id,
+    Chart.status,
+    Chart.original_filename,
+    Chart.mime_type,
+    Chart.original_path,
+    Chart.created_at,
+    Chart.result_json,
+    Chart.archive_sha256,
+)
+
+
+# Колонки GET /charts/search (ChartSearchItem)
+_SEARCH_COLUMNS = (
+    Chart.id,
+    Chart.status,
+    Chart.original_filename,
+    Chart.mime_type,
+    Chart.created_at,
+    Chart.processed_at,
+    Chart.n_panels,
+    Chart.n_series,
+    Chart.error_message,
+)
+
+
+def _like_pattern(q: str) -> str:
+    escaped = q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def _response_select():
+    return select(*_RESPONSE_COLUMNS, Chart.result_json)
 
 
 class ChartCRUD:
-    def create(
+    def get(self, db: Session, chart_id: int) -> Optional[Chart]:
+        return db.query(Chart).filter(Chart.id == chart_id).first()
+
+    def get_statuses(self, db: Session, *, user_id: int, chart_ids: list[int]) -> list[Any]:
+        """
+        Только узкие колонки (без JSONB) — для опроса статусов.
+        """
+        if not chart_ids:
+            return []
+        stmt = (
+            select(*_STATUS_COLUMNS)
+            .where(Chart.user_id == user_id, Chart.id.in_(chart_ids))
+            .order_by(Chart.id)
+        )
+        return list(db.execute(stmt))
+
+    def get_active_statuses(self, db: Session, *, user_id: int) -> list[Any]:
+        """
+        Charts пользователя в очереди/обработке; идёт по частичному индексу ix_charts_user_active.
+        """
+        stmt = (
+            select(*_STATUS_COLUMNS)
+            .where(Chart.user_id == user_id, Chart.status.in_(ACTIVE_STATUSES))
+            .order_by(Chart.created_at)
+        )
+        return list(db.execute(stmt))
+
+    def get_response_row(
         self,
         db: Session,
         *,
+        chart_id: int,
         user_id: int,
-        original_filename: str,
-        mime_type: str,
-        sha256: str,
-        original_path: str,
-        status: str,
-    ) -> Chart:
-        obj = Chart(
-            user_id=user_id,
-            original_filename=original_filename,
-            mime_type=mime_type,
-            sha256=sha256,
-            original_path=original_path,
-            status=status,
+    ) -> Any | None:
+        stmt = _response_select().where(Chart.id == chart_id, Chart.user_id == user_id)
+        return db.execute(stmt).first()
+
+    def list_response_rows(self, db: Session, *, user_id: int) -> list[Any]:
+        stmt = (
+            _response_select()
+            .where(Chart.user_id == user_id)
+            .order_by(Chart.created_at.desc())
         )
-        db.add(obj)
-        db.commit()
-        db.refresh(obj)
-        return obj
+        return list(db.execute(stmt))
 
-    def get(self, db: Session, chart_id: int) -> Optional[Chart]:
-        return db.query(Chart).filter(Chart.id == chart_id).first()
+    def iter_export_batches(
+        self,
+        db: Session,
+        *,
+        user_id: int,
+        chart_ids: Optional[list[int]] = None,
+        since: Optional[datetime] = None,
+        status: Optional[str] = None,
+        batch_size: int = 100,
+    ) -> Iterator[list[Any]]:
+        """
+        Строки для массовой выгрузки пачками по batch_size. yield_per включает серверный
+        курсор (stream_results): в памяти не больше одной пачки строк с result_json.
+        Пачка — единица дочитывания связанных данных (серии одним запросом на пачку).
+        Итерировать нужно, пока сессия открыта.
+        """
+        stmt = select(*_EXPORT_COLUMNS).where(Chart.user_id == user_id)
+        if chart_ids is not None:
+            stmt = stmt.where(Chart.id.in_(chart_ids))
+        if since is not None:
+            stmt = stmt.where(Chart.created_at >= since)
+        if status is not None:
+            stmt = stmt.where(Chart.status == status)
+        stmt = stmt.order_by(Chart.id).execution_options(yield_per=batch_size)
+        yield from db.execute(stmt).partitions()
+
+    def search_select(
+        self,
+        *,
+        user_id: int,
+        q: Optional[str] = None,
+        statuses: Optional[list[str]] = None,
+        created_from: Optional[datetime] = None,
+        created_to: Optional[datetime] = None,
+        processed_from: Optional[datetime] = None,
+        processed_to: Optional[datetime] = None,
+        n_series_min: Optional[int] = None,
+        n_series_max: Optional[int] = None,
+        n_panels_min: Optional[int] = None,
+        n_panels_max: Optional[int] = None,
+        series_names: Optional[list[str]] = None,
+        after: Optional[tuple[datetime, int]] = None,
+        limit: int = 50,
+    ) -> Select:
+        """
+        Запрос поиска, новые сверху. Индексы:
+        - ix_charts_user_created — фильтр по пользователю, порядок и курсор (created_at, id);
+        - ix_charts_filename_trgm — q (ILIKE по подстроке имени файла);
+        - ix_charts_series_names — series_names (все имена должны встречаться в charts).
+        Остальные фильтры проверяются на найденных строках.
+        benchmarks/explain_search.py печатает планы на синтетических данных.
+        """
+        stmt = select(*_SEARCH_COLUMNS).where(Chart.user_id == user_id)
+
+        if q:
+            stmt = stmt.where(Chart.original_filename.ilike(_like_pattern(q), escape="\\"))
+        if statuses:
+            stmt = stmt.where(Chart.status.in_(statuses))
+        if created_from is not None:
+            stmt = stmt.where(Chart.created_at >= created_from)
+        if created_to is not None:
+            stmt = stmt.where(Chart.created_at < created_to)
+        if processed_from is not None:
+            stmt = stmt.where(Chart.processed_at >= processed_from)
+        if processed_to is not None:
+            stmt = stmt.where(Chart.processed_at < processed_to)
+        if n_series_min is not None:
+            stmt = stmt.where(Chart.n_series >= n_series_min)
+        if n_series_max is not None:
+            stmt = stmt.where(Chart.n_series <= n_series_max)
+        if n_panels_min is not None:
+            stmt = stmt.where(Chart.n_panels >= n_panels_min)
+        if n_panels_max is not None:
+            stmt = stmt.where(Chart.n_panels <= n_panels_max)
+        if series_names:
+            stmt = stmt.where(
+                series_names_expr(Chart.result_json).op("@>")(cast(literal(json.dumps(series_names), Text), JSONB))
+            )
+        if after is not None:
+            stmt = stmt.where(tuple_(Chart.created_at, Chart.id) < tuple_(*after))
+
+        return stmt.order_by(Chart.created_at.desc(), Chart.id.desc()).limit(limit)
+
+    def search(self, db: Session, **kwargs: Any) -> list[Any]:
+        return list(db.execute(self.search_select(**kwargs)))
+
+    def existing_ids(self, db: Session, chart_ids: list[int]) -> set[int]:
+        if not chart_ids:
+            return set()
+        rows = db.execute(select(Chart.id).where(Chart.id.in_(chart_ids)))
+        return {int(r[0]) for r in rows}
+
+    def path_in_use(self, db: Session, *, sha256: str, original_path: str) -> bool:
+        # фильтр по sha256 идёт по индексу ix_charts_sha256
+        row = db.execute(
+            select(Chart.id)
+            .where(Chart.sha256 == sha256, Chart.original_path == original_path)
+            .limit(1)
+        ).first()
+        return row is not None
+
+    def delete(self, db: Session, obj: Chart) -> None:
+        """
+        Удаляет chart и в той же транзакции отпускает ссылку на блоб оригинала.
+        Файлы удаляет фоновый сборщик (app.services.storage).
+        """
+        blob_crud.release(db, obj.sha256)
+        db.delete(obj)
+        db.commit()
 
     def set_status(
         self,
@@ -73,5 +291,278 @@ class ChartCRUD:
         db.refresh(obj)
         return obj
 
+    def get_result_for_patch(self, db: Session, *, chart_id: int, user_id: int) -> Any | None:
+        return db.execute(
+            select(
+                Chart.id,
+                Chart.status,
+                Chart.result_json,
+                Chart.result_version,
+                Chart.archive_sha256,
+            )
+            .where(Chart.id == chart_id, Chart.user_id == user_id)
+        ).first()
+
+    def patch_result(
+        self,
+        db: Session,
+        *,
+        chart_id: int,
+        user_id: int,
+        version: int,
+        result_json: Optional[dict[str, Any]],
+        n_panels: int,
+        n_series: int,
+    ) -> Optional[int]:
+        """
+        Новая версия результата после правки. Серии пишет вызывающий (chart_series)
+        в той же транзакции, result_json (без точек) — только если он изменился.
+        Обновление проходит, только если result_version не изменился с момента чтения.
+        Возвращает новую версию или None при конфликте. Без commit.
+        """
+        values: dict[str, Any] = {
+            "result_version": Chart.result_version + 1,
+            "n_panels": n_panels,
+            "n_series": n_series,
+        }
+        if result_json is not None:
+            values["result_json"] = result_json
+
+        stmt = (
+            update(Chart)
+            .where(
+                Chart.id == chart_id,
+                Chart.user_id == user_id,
+                Chart.status == "done",
+                Chart.result_version == version,
+                # строку успели архивировать: серии уже удалены, а result_json — заглушка
+                Chart.archived_at.is_(None),
+            )
+            .values(**values)
+            .returning(Chart.result_version)
+        )
+        row = db.execute(stmt).first()
+        return int(row[0]) if row else None
+
+    def lock_result(self, db: Session, *, chart_id: int, user_id: int) -> Any | None:
+        """
+        Строка charts под блокировкой до commit — перед записью одной серии.
+        Порядок блокировок charts -> chart_series тот же, что у PATCH, без взаимоблокировок.
+        """
+        return db.execute(
+            select(Chart.status, Chart.result_json, Chart.archive_sha256)
+            .where(Chart.id == chart_id, Chart.user_id == user_id)
+            .with_for_update(of=Chart)
+        ).first()
+
+    def bump_result_version(
+        self,
+        db: Session,
+        *,
+        chart_id: int,
+        result_json: Optional[dict[str, Any]] = None,
+    ) -> int:
+        """
+        result_version + 1 после записи одной серии: версия документа целиком
+        (GET /charts/{id}, PATCH) видит и такие правки. Без commit.
+        """
+        values: dict[str, Any] = {"result_version": Chart.result_version + 1}
+        if result_json is not None:
+            values["result_json"] = result_json
+        row = db.execute(
+            update(Chart).where(Chart.id == chart_id).values(**values).returning(Chart.result_version)
+        ).one()
+        return int(row[0])
+
+    # ---------- холодное хранение (app.services.archive) ----------
+
+    def claim_archive_candidates(
+        self,
+        db: Session,
+        *,
+        accessed_before: datetime,
+        limit: int,
+    ) -> list[Any]:
+        """
+        Давно не открывавшиеся завершённые charts, по частичному индексу
+        ix_charts_archive_candidates. Строки блокируются до commit; занятые
+        (их сейчас читают или правят) пропускаются.
+        """
+        accessed = func.coalesce(Chart.last_accessed_at, Chart.created_at)
+        stmt = (
+            select(Chart.id, Chart.result_json)
+            .where(
+                Chart.archived_at.is_(None),
+                Chart.status.in_(("done", "error")),
+                accessed < accessed_before,
+                Chart.result_json.is_not(None),
+            )
+            .order_by(accessed)
+            .limit(limit)
+            .with_for_update(of=Chart, skip_locked=True)
+        )
+        return list(db.execute(stmt))
+
+    def mark_archived(self, db: Session, *, chart_id: int, sha: str, stub: dict[str, Any]) -> None:
+        db.execute(
+            update(Chart)
+            .where(Chart.id == chart_id, Chart.archived_at.is_(None))
+            .values(result_json=stub, archived_at=func.now(), archive_sha256=sha)
+        )
+
+    def restore_archived(
+        self,
+        db: Session,
+        *,
+        chart_id: int,
+        sha: str,
+        result_json: Any,
+    ) -> bool:
+        """
+        Возвращает документ (result_json без точек) в строку, если она всё ещё ссылается
+        на тот же архив. False — её уже восстановил параллельный запрос или перезаписал
+        PUT/воркер. Без commit: серии пишутся в той же транзакции.
+        """
+        row = db.execute(
+            update(Chart)
+            .where(Chart.id == chart_id, Chart.archive_sha256 == sha)
+            .values(result_json=result_json, archived_at=None, archive_sha256=None)
+            .returning(Chart.id)
+        ).first()
+        return row is not None
+
+    def lock_archive(self, db: Session, sha: str, *, wait: bool = True) -> bool:
+        """
+        Advisory-блокировка файла архива до конца транзакции. Архиватор держит её
+        от записи файла до commit заглушки, сборщик — от проверки ссылок до удаления
+        файла: файл не пропадёт между записью и commit строки, которая на него ссылается.
+        wait=False — не ждать (сборщик просто пропускает занятый файл).
+        """
+        # первые 60 бит sha256 — положительный bigint
+        key = int(sha[:15], 16)
+        if wait:
+            db.execute(select(func.pg_advisory_xact_lock(key)))
+            return True
+        return bool(db.execute(select(func.pg_try_advisory_xact_lock(key))).scalar())
+
+    def lock_artifacts(self, db: Session, chart_id: int) -> None:
+        """
+        Advisory-блокировка каталога артефактов chart до конца транзакции: перенос
+        в архив и обратно для одного chart идёт по очереди, в том числе между процессами.
+        """
+        db.execute(select(func.pg_advisory_xact_lock(_ARTIFACTS_LOCK_CLASS, chart_id)))
+
+    def referenced_archives(self, db: Session, shas: list[str]) -> set[str]:
+        # частичный индекс ix_charts_archive_sha256
+        if not shas:
+            return set()
+        rows = db.execute(
+            select(Chart.archive_sha256).where(Chart.archive_sha256.in_(shas)).distinct()
+        )
+        return {r[0] for r in rows}
+
+    def touch_accessed(self, db: Session, chart_ids: list[int], *, min_interval: timedelta) -> int:
+        """
+        last_accessed_at = now() для пачки id; строки, тронутые позже чем
+        min_interval назад, не переписываются (меньше мёртвых версий строк).
+        """
+        if not chart_ids:
+            return 0
+        result = db.execute(
+            update(Chart)
+            .where(
+                Chart.id.in_(chart_ids),
+                or_(
+                    Chart.last_accessed_at.is_(None),
+                    Chart.last_accessed_at < func.now() - min_interval,
+                ),
+            )
+            .values(last_accessed_at=func.now())
+        )
+        db.commit()
+        return result.rowcount
+
+
+class AsyncChartCRUD:
+    """
+    Операции для async def эндпоинтов (AsyncSession поверх asyncpg).
+    """
+
+    async def create(
+        self,
+        db: AsyncSession,
+        *,
+        user_id: int,
+        original_filename: str,
+        mime_type: str,
+        sha256: str,
+        original_path: str,
+        status: str,
+        priority: int = JOB_PRIORITY_INTERACTIVE,
+    ) -> Chart:
+        """
+        Chart и (для status=uploaded) задача в chart_jobs — в одной транзакции.
+        """
+        obj = Chart(
+            user_id=user_id,
+            original_filename=original_filename,
+            mime_type=mime_type,
+            sha256=sha256,
+            original_path=original_path,
+            status=status,
+        )
+        db.add(obj)
+        await db.flush()
+        if status == "uploaded":
+            await db.execute(insert(ChartJob).values(chart_id=obj.id, priority=priority))
+        await db.commit()
+        await db.refresh(obj)
+        return obj
+
+    async def create_many(
+        self,
+        db: AsyncSession,
+        rows: list[dict[str, Any]],
+        *,
+        priority: int = JOB_PRIORITY_BATCH,
+    ) -> list[int]:
+        """
+        Вставка пачки charts (и их задач в chart_jobs) одним commit.
+        Возвращает id в порядке rows.
+        """
+        if not rows:
+            return []
+        stmt = insert(Chart).returning(Chart.id, sort_by_parameter_order=True)
+        ids = [int(r[0]) for r in await db.execute(stmt, rows)]
+        jobs = [
+            {"chart_id": chart_id, "priority": priority}
+            for chart_id, row in zip(ids, rows)
+            if row.get("status") == "uploaded"
+        ]
+        if jobs:
+            await db.execute(insert(ChartJob), jobs)
+        await db.commit()
+        return ids
+
+    async def get(self, db: AsyncSession, chart_id: int) -> Optional[Chart]:
+        return await db.get(Chart, chart_id)
+
+    async def count_active(self, db: AsyncSession, *, user_id: int, limit: int) -> int:
+        """
+        Charts пользователя в очереди/обработке, но не больше limit: читается
+        не больше limit записей частичного индекса ix_charts_user_active.
+        """
+        # статусы — литералы: asyncpg готовит запрос на сервере, и с bind-параметрами
+        # generic plan не смог бы доказать условие частичного индекса
+        statuses = [literal_column(f"'{s}'") for s in ACTIVE_STATUSES]
+        active = (
+            select(Chart.id)
+            .where(Chart.user_id == user_id, Chart.status.in_(statuses))
+            .limit(limit)
+            .subquery()
+        )
+        return int((await db.execute(select(func.count()).select_from(active))).scalar_one())
+
 
 chart_crud = ChartCRUD()
+async_chart_crud = AsyncChartCRUD()
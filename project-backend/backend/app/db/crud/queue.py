@@ -0,0 +1,157 @@
+from __future__ import annotations
+
+from datetime import timedelta
+from typing import Any
+
+from sqlalchemy import Float, cast, delete, extract, func, literal, select, type_coerce, update
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.db.models.chart import Chart
+from app.db.models.queue import ChartJob, ChartStatusCount, Worker
+
+# окна для скорости завершения и перцентилей времени обработки
+COMPLETION_WINDOWS = (timedelta(minutes=5), timedelta(hours=1), timedelta(hours=24))
+TURNAROUND_QUANTILES = (0.5, 0.9, 0.99)
+
+
+class QueueCRUD:
+    """
+    Запросы телеметрии очереди. Каждый читает либо маленькую таблицу, либо
+    диапазон частичного индекса — без полного прохода по charts.
+    """
+
+    def status_counts(self, db: Session) -> dict[str, int]:
+        # chart_status_counts ведёт триггер на charts
+        return {r.status: int(r.n) for r in db.execute(select(ChartStatusCount.status, ChartStatusCount.n))}
+
+    def oldest_created(self, db: Session) -> dict[str, Any]:
+        """
+        created_at самой старой строки в uploaded и processing: первая запись ix_charts_queue.
+        """
+        def _oldest(status: str):
+            return (
+                select(func.min(Chart.created_at))
+                .where(Chart.status == status)
+                .scalar_subquery()
+            )
+
+        row = db.execute(
+            select(
+                _oldest("uploaded").label("uploaded"),
+                _oldest("processing").label("processing"),
+                func.now().label("now"),
+            )
+        ).one()
+        return {"uploaded": row.uploaded, "processing": row.processing, "now": row.now}
+
+    def completion_stats(self, db: Session) -> list[dict[str, Any]]:
+        """
+        Завершения (done/error) и перцентили created_at -> processed_at по окнам COMPLETION_WINDOWS.
+        Читает только строки за самое длинное окно (ix_charts_processed_at), один проход.
+        """
+        longest = max(COMPLETION_WINDOWS)
+        # EXTRACT(epoch ...) в PostgreSQL 14+ — numeric, percentile_cont ждёт double precision
+        turnaround = cast(extract("epoch", Chart.processed_at - Chart.created_at), Float)
+        quantiles = type_coerce(literal(list(TURNAROUND_QUANTILES)), ARRAY(Float))
+
+        columns = []
+        for i, window in enumerate(COMPLETION_WINDOWS):
+            in_window = Chart.processed_at >= func.now() - window
+            columns += [
+                func.count().filter(in_window & (Chart.status == "done")).label(f"done_{i}"),
+                func.count().filter(in_window & (Chart.status == "error")).label(f"error_{i}"),
+                func.percentile_cont(quantiles)
+                .within_group(turnaround)
+                .filter(in_window & (Chart.status == "done"))
+                .label(f"q_{i}"),
+            ]
+
+        row = db.execute(
+            select(*columns).where(
+                Chart.processed_at.is_not(None),
+                Chart.processed_at >= func.now() - longest,
+            )
+        ).one()
+
+        out: list[dict[str, Any]] = []
+        for i, window in enumerate(COMPLETION_WINDOWS):
+            q = getattr(row, f"q_{i}") or [None] * len(TURNAROUND_QUANTILES)
+            out.append(
+                {
+                    "window": window,
+                    "done": int(getattr(row, f"done_{i}")),
+                    "error": int(getattr(row, f"error_{i}")),
+                    "turnaround": dict(zip(TURNAROUND_QUANTILES, q)),
+                }
+            )
+        return out
+
+    def workers(self, db: Session) -> list[Worker]:
+        return list(db.execute(select(Worker).order_by(Worker.last_seen_at.desc())).scalars())
+
+    def prune_workers(self, db: Session, *, older_than: timedelta) -> int:
+        """
+        Удаляет давно молчащих воркеров (процесс убит без штатного завершения).
+        """
+        result = db.execute(
+            Worker.__table__.delete().where(Worker.last_seen_at < func.now() - older_than)
+        )
+        db.commit()
+        return int(result.rowcount or 0)
+
+    def cancel_job(self, db: Session, *, chart_id: int, message: str) -> str | None:
+        """
+        pending — задача снимается сразу, chart переходит в error с message;
+        running — ставится cancel_requested, остановит воркер. Без commit.
+        Возвращает прежнее состояние задачи или None, если задачи нет.
+        """
+        removed = db.execute(
+            delete(ChartJob)
+            .where(ChartJob.chart_id == chart_id, ChartJob.state == "pending")
+            .returning(ChartJob.chart_id)
+        ).first()
+        if removed is not None:
+            db.execute(
+                update(Chart)
+                .where(Chart.id == chart_id)
+                .values(status="error", error_message=message, processed_at=func.now())
+            )
+            return "pending"
+
+        flagged = db.execute(
+            update(ChartJob)
+            .where(ChartJob.chart_id == chart_id, ChartJob.state == "running")
+            .values(cancel_requested=True)
+            .returning(ChartJob.chart_id)
+        ).first()
+        return "running" if flagged is not None else None
+
+
+class AsyncQueueCRUD:
+    """
+    То, что нужно на пути загрузки (AsyncSession): один запрос к двум маленьким таблицам.
+    """
+
+    async def load(self, db: AsyncSession, *, worker_stale: timedelta) -> dict[str, Any]:
+        """
+        pending — счётчик uploaded из chart_status_counts (ведёт триггер, без COUNT(*)),
+        per_minute — суммарная скорость живых воркеров по их heartbeat.
+        """
+        pending = (
+            select(ChartStatusCount.n)
+            .where(ChartStatusCount.status == "uploaded")
+            .scalar_subquery()
+        )
+        per_minute = (
+            select(func.coalesce(func.sum(Worker.jobs_per_minute), 0.0))
+            .where(Worker.last_seen_at >= func.now() - worker_stale)
+            .scalar_subquery()
+        )
+        row = (await db.execute(select(pending.label("pending"), per_minute.label("per_minute")))).one()
+        return {"pending": int(row.pending or 0), "per_minute": float(row.per_minute or 0.0)}
+
+
+queue_crud = QueueCRUD()
+async_queue_crud = AsyncQueueCRUD()
@@ -0,0 +1,183 @@
+from __future__ import annotations
+
+from typing import Any, Optional
+
+from sqlalchemy import and_, delete, not_, or_, select, tuple_, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from app.db.models.chart import Chart
+from app.db.models.series import ChartSeries
+
+_SERIES_COLUMNS = (
+    ChartSeries.chart_id,
+    ChartSeries.panel_id,
+    ChartSeries.series_id,
+    ChartSeries.name,
+    ChartSeries.style,
+    ChartSeries.points,
+)
+
+# GET/PUT /charts/{id}/series/{panel_id}/{series_id}
+_ROW_COLUMNS = (
+    ChartSeries.series_id,
+    ChartSeries.name,
+    ChartSeries.style,
+    ChartSeries.points,
+    ChartSeries.point_count,
+    ChartSeries.x_min,
+    ChartSeries.x_max,
+    ChartSeries.y_min,
+    ChartSeries.y_max,
+    ChartSeries.version,
+)
+
+
+class SeriesCRUD:
+    """
+    Строки chart_series. Запись всегда идёт вместе с изменением charts,
+    поэтому методы не делают commit — его делает вызывающий.
+    """
+
+    def list_for_charts(
+        self,
+        db: Session,
+        chart_ids: list[int],
+        *,
+        panel_id: Optional[str] = None,
+        series_id: Optional[str] = None,
+    ) -> list[Any]:
+        # префикс первичного ключа (chart_id, panel_id, series_id)
+        if not chart_ids:
+            return []
+        stmt = select(*_SERIES_COLUMNS).where(ChartSeries.chart_id.in_(chart_ids))
+        if panel_id:
+            stmt = stmt.where(ChartSeries.panel_id == panel_id)
+        if series_id:
+            stmt = stmt.where(ChartSeries.series_id == series_id)
+        return list(db.execute(stmt))
+
+    def list_keys(self, db: Session, chart_id: int, keys: list[tuple[str, str]]) -> list[Any]:
+        if not keys:
+            return []
+        stmt = select(*_SERIES_COLUMNS).where(
+            ChartSeries.chart_id == chart_id,
+            tuple_(ChartSeries.panel_id, ChartSeries.series_id).in_(keys),
+        )
+        return list(db.execute(stmt))
+
+    def list_for_user(self, db: Session, *, user_id: int) -> list[Any]:
+        stmt = (
+            select(*_SERIES_COLUMNS)
+            .join(Chart, Chart.id == ChartSeries.chart_id)
+            .where(Chart.user_id == user_id)
+        )
+        return list(db.execute(stmt))
+
+    def get_with_chart(
+        self,
+        db: Session,
+        *,
+        chart_id: int,
+        user_id: int,
+        panel_id: str,
+        series_id: str,
+    ) -> Any | None:
+        """
+        Одна серия и нужные для проверок поля chart одним запросом.
+        None — chart нет; серии нет — колонки серии (series_id и др.) NULL.
+        """
+        stmt = (
+            select(Chart.status, Chart.archive_sha256, *_ROW_COLUMNS)
+            .select_from(Chart)
+            .outerjoin(
+                ChartSeries,
+                and_(
+                    ChartSeries.chart_id == Chart.id,
+                    ChartSeries.panel_id == panel_id,
+                    ChartSeries.series_id == series_id,
+                ),
+            )
+            .where(Chart.id == chart_id, Chart.user_id == user_id)
+        )
+        return db.execute(stmt).first()
+
+    def upsert(self, db: Session, chart_id: int, values: list[dict[str, Any]]) -> None:
+        """
+        Вставка или обновление серий (values — SeriesRow.values()). Совпадающие
+        с записанными строки не переписываются, и их version не меняется.
+        """
+        if not values:
+            return
+        stmt = insert(ChartSeries)
+        excluded = stmt.excluded
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[ChartSeries.chart_id, ChartSeries.panel_id, ChartSeries.series_id],
+            set_={
+                "name": excluded.name,
+                "style": excluded.style,
+                "points": excluded.points,
+                "point_count": excluded.point_count,
+                "x_min": excluded.x_min,
+                "x_max": excluded.x_max,
+                "y_min": excluded.y_min,
+                "y_max": excluded.y_max,
+                "version": ChartSeries.version + 1,
+            },
+            where=or_(
+                ChartSeries.name.is_distinct_from(excluded.name),
+                ChartSeries.style.is_distinct_from(excluded.style),
+                ChartSeries.points.is_distinct_from(excluded.points),
+            ),
+        )
+        db.execute(stmt, [{"chart_id": chart_id, **v} for v in values])
+
+    def delete_keys(self, db: Session, chart_id: int, keys: list[tuple[str, str]]) -> None:
+        if not keys:
+            return
+        db.execute(
+            delete(ChartSeries).where(
+                ChartSeries.chart_id == chart_id,
+                tuple_(ChartSeries.panel_id, ChartSeries.series_id).in_(keys),
+            )
+        )
+
+    def delete_except(self, db: Session, chart_id: int, keep: list[tuple[str, str]]) -> None:
+        stmt = delete(ChartSeries).where(ChartSeries.chart_id == chart_id)
+        if keep:
+            stmt = stmt.where(not_(tuple_(ChartSeries.panel_id, ChartSeries.series_id).in_(keep)))
+        db.execute(stmt)
+
+    def delete_for_charts(self, db: Session, chart_ids: list[int]) -> None:
+        if chart_ids:
+            db.execute(delete(ChartSeries).where(ChartSeries.chart_id.in_(chart_ids)))
+
+    def update_one(
+        self,
+        db: Session,
+        *,
+        chart_id: int,
+        panel_id: str,
+        series_id: str,
+        version: int,
+        values: dict[str, Any],
+    ) -> Optional[int]:
+        """
+        Перезапись одной серии, если её version не изменился с момента чтения.
+        Возвращает новую версию или None при конфликте.
+        """
+        row = db.execute(
+            update(ChartSeries)
+            .where(
+                ChartSeries.chart_id == chart_id,
+                ChartSeries.panel_id == panel_id,
+                ChartSeries.series_id == series_id,
+                ChartSeries.version == version,
+            )
+            .values(**values, version=ChartSeries.version + 1)
+            .returning(ChartSeries.version)
+        ).first()
+        return int(row[0]) if row else None
+
+
+series_crud = SeriesCRUD()
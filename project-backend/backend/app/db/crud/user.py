@@ -1,7 +1,10 @@
 from typing import Optional
 
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
+from app.core.auth_cache import invalidate_user
 from app.core.security import get_password_hash
 from app.db.models.user import User
 from app.schemas.user import UserCreate
@@ -14,10 +17,19 @@ class UserCRUD:
     def get_by_email(self, db: Session, email: str) -> Optional[User]:
         return db.query(User).filter(User.email == email).first()
 
-    def create(self, db: Session, user_in: UserCreate) -> User:
+    def create(
+        self,
+        db: Session,
+        user_in: UserCreate,
+        hashed_password: Optional[str] = None,
+    ) -> User:
+        """
+        hashed_password можно посчитать заранее (например, в пуле процессов),
+        иначе пароль хэшируется здесь.
+        """
         db_obj = User(
             email=user_in.email,
-            hashed_password=get_password_hash(user_in.password),
+            hashed_password=hashed_password or get_password_hash(user_in.password),
             is_active=True,
         )
         db.add(db_obj)
@@ -25,5 +37,37 @@ class UserCRUD:
         db.refresh(db_obj)
         return db_obj
 
+    def set_active(self, db: Session, user: User, is_active: bool) -> User:
+        user.is_active = is_active
+        db.commit()
+        db.refresh(user)
+        # деактивированный пользователь не должен проходить по кэшу get_current_user
+        invalidate_user(user.id)
+        return user
+
+
+class AsyncUserCRUD:
+    async def get_by_id(self, db: AsyncSession, user_id: int) -> Optional[User]:
+        return await db.get(User, user_id)
+
+    async def get_by_email(self, db: AsyncSession, email: str) -> Optional[User]:
+        result = await db.execute(select(User).where(User.email == email).limit(1))
+        return result.scalars().first()
+
+    async def create(self, db: AsyncSession, user_in: UserCreate, hashed_password: str) -> User:
+        """
+        Пароль хэшируется заранее (password_hasher), чтобы bcrypt не выполнялся в event loop.
+        """
+        db_obj = User(
+            email=user_in.email,
+            hashed_password=hashed_password,
+            is_active=True,
+        )
+        db.add(db_obj)
+        await db.commit()
+        await db.refresh(db_obj)
+        return db_obj
+
 
 user_crud = UserCRUD()
+async_user_crud = AsyncUserCRUD()
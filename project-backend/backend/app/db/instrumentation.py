@@ -0,0 +1,184 @@
+from __future__ import annotations
+
+from collections import Counter
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+import logging
+import time
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import settings
+from app.core.metrics import (
+    DB_CHECKOUT_WAIT_SECONDS,
+    DB_N_PLUS_ONE,
+    DB_POOL_CHECKED_OUT,
+    DB_POOL_OVERFLOW,
+    DB_QUERIES_PER_REQUEST,
+    DB_QUERY_SECONDS,
+    DB_SLOW_QUERIES,
+    DB_TIME_PER_REQUEST_SECONDS,
+)
+from app.core.routing import route_template
+
+logger = logging.getLogger(__name__)
+
+# запросы вне HTTP (сборщик мусора, скрипты)
+BACKGROUND_ROUTE = "<background>"
+
+
+@dataclass
+class QueryStats:
+    """
+    Счётчики SQL одного HTTP-запроса.
+    Объект изменяемый: копия контекста в threadpool (sync-эндпоинты)
+    и в greenlet asyncpg видит тот же объект.
+    """
+
+    route: str
+    query_count: int = 0
+    db_time: float = 0.0
+    checkout_wait: float = 0.0
+    statements: Counter[str] = field(default_factory=Counter)
+    n_plus_one: bool = False
+
+
+_current: ContextVar[QueryStats | None] = ContextVar("db_query_stats", default=None)
+
+
+def current_stats() -> QueryStats | None:
+    return _current.get()
+
+
+# ---------- пул: время ожидания соединения и заполненность ----------
+
+def _update_pool_gauges(pool: QueuePool, label: str) -> None:
+    DB_POOL_CHECKED_OUT.labels(pool=label).set(pool.checkedout())
+    # overflow() отрицательный, пока пул не заполнен до pool_size
+    DB_POOL_OVERFLOW.labels(pool=label).set(max(pool.overflow(), 0))
+
+
+class TimedQueuePool(QueuePool):
+    """
+    QueuePool, который меряет ожидание в checkout.
+    У SQLAlchemy нет события "начали ждать соединение", поэтому оборачиваем _do_get.
+    """
+
+    pool_label = "sync"
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            waited = time.perf_counter() - started
+            DB_CHECKOUT_WAIT_SECONDS.labels(pool=self.pool_label).observe(waited)
+            stats = _current.get()
+            if stats is not None:
+                stats.checkout_wait += waited
+            _update_pool_gauges(self, self.pool_label)
+
+    def _do_return_conn(self, record) -> None:
+        super()._do_return_conn(record)
+        _update_pool_gauges(self, self.pool_label)
+
+
+class TimedAsyncQueuePool(TimedQueuePool, AsyncAdaptedQueuePool):
+    pool_label = "async"
+
+
+# ---------- события курсора ----------
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    context._query_started_at = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    started = getattr(context, "_query_started_at", None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+
+    stats = _current.get()
+    route = stats.route if stats is not None else BACKGROUND_ROUTE
+    DB_QUERY_SECONDS.labels(route=route).observe(elapsed)
+
+    if stats is not None:
+        stats.query_count += 1
+        stats.db_time += elapsed
+        # параметры в тексте не подставлены, поэтому одинаковые запросы
+        # с разными id дают один и тот же ключ
+        stats.statements[statement] += 1
+        threshold = settings.db_n_plus_one_threshold
+        if threshold > 0 and not stats.n_plus_one and stats.statements[statement] >= threshold:
+            stats.n_plus_one = True
+            DB_N_PLUS_ONE.labels(route=route).inc()
+            logger.warning(
+                "possible N+1 on %s: statement repeated %d times: %s",
+                route,
+                stats.statements[statement],
+                _short(statement),
+            )
+
+    elapsed_ms = elapsed * 1000.0
+    if settings.db_slow_query_ms > 0 and elapsed_ms >= settings.db_slow_query_ms:
+        DB_SLOW_QUERIES.labels(route=route).inc()
+        logger.warning("slow query %.1f ms on %s: %s", elapsed_ms, route, _short(statement))
+
+
+def _short(statement: str, limit: int = 500) -> str:
+    flat = " ".join(statement.split())
+    return flat if len(flat) <= limit else flat[:limit] + "..."
+
+
+def instrument_engine(engine: Engine) -> None:
+    """
+    Вешает хуки на движок. Для AsyncEngine передавать async_engine.sync_engine.
+    """
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+# ---------- middleware ----------
+
+class DBStatsMiddleware:
+    """
+    Открывает QueryStats на каждый HTTP-запрос, после ответа пишет метрики.
+    В режиме DEBUG добавляет заголовки X-DB-Query-Count / X-DB-Time-ms / X-DB-Checkout-Wait-ms.
+    Заголовки уходят вместе с началом ответа, поэтому запросы из тела
+    StreamingResponse в них не попадают (в метрики попадают).
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = QueryStats(route=route_template(scope))
+        token = _current.set(stats)
+
+        async def send_with_headers(message: Message) -> None:
+            if message["type"] == "http.response.start" and settings.debug:
+                headers = list(message.get("headers", []))
+                headers.extend(
+                    [
+                        (b"x-db-query-count", str(stats.query_count).encode()),
+                        (b"x-db-time-ms", f"{stats.db_time * 1000.0:.1f}".encode()),
+                        (b"x-db-checkout-wait-ms", f"{stats.checkout_wait * 1000.0:.1f}".encode()),
+                    ]
+                )
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_headers)
+        finally:
+            _current.reset(token)
+            DB_QUERIES_PER_REQUEST.labels(route=stats.route).observe(stats.query_count)
+            DB_TIME_PER_REQUEST_SECONDS.labels(route=stats.route).observe(stats.db_time)
@@ -1,2 +1,5 @@
 from app.db.models.user import User  # noqa
 from app.db.models.chart import Chart  # noqa
+from app.db.models.blob import Blob  # noqa
+from app.db.models.queue import ChartJob, ChartStatusCount, Worker  # noqa
+from app.db.models.series import ChartSeries  # noqa
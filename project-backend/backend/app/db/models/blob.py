@@ -0,0 +1,24 @@
+from sqlalchemy import BigInteger, Column, DateTime, Integer, String, func
+
+from app.db.base import Base
+
+
+class Blob(Base):
+    """
+    Оригинал в content-addressed хранилище: один файл на sha256,
+    ref_count — сколько charts на него ссылается.
+    """
+
+    __tablename__ = "blobs"
+
+    sha256 = Column(String(64), primary_key=True)
+
+    # путь относительно storage_dir (у старых записей может быть абсолютным)
+    path = Column(String(1024), nullable=False)
+    size_bytes = Column(BigInteger, nullable=True)
+
+    ref_count = Column(Integer, nullable=False, default=0)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    # когда ref_count упал до 0; сборщик удаляет такие блобы после grace-периода
+    unreferenced_at = Column(DateTime(timezone=True), nullable=True)
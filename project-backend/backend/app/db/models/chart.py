@@ -1,8 +1,19 @@
-from sqlalchemy import Column, DateTime, Integer, String, Text, func
+from sqlalchemy import Column, DateTime, Index, Integer, String, Text, func, literal_column, text
 from sqlalchemy.dialects.postgresql import JSONB
 
 from app.db.base import Base
 
+# Имена всех серий: ["name1", "name2", ...]. jsonpath — литерал, а не bind-параметр:
+# иначе выражение в запросе не совпадёт с выражением индекса ix_charts_series_names.
+SERIES_NAMES_JSONPATH = "$.panels[*].series[*].name"
+
+
+def series_names_expr(result_json):
+    return func.jsonb_path_query_array(
+        result_json,
+        literal_column(f"'{SERIES_NAMES_JSONPATH}'::jsonpath"),
+    )
+
 
 class Chart(Base):
     __tablename__ = "charts"
@@ -21,9 +32,69 @@ class Chart(Base):
     error_message = Column(Text, nullable=True)
 
     result_json = Column(JSONB, nullable=True)
+    # растёт при каждом сохранении правок (PUT/PATCH result_json)
+    result_version = Column(Integer, nullable=False, server_default=text("0"))
 
     n_panels = Column(Integer, nullable=True)
     n_series = Column(Integer, nullable=True)
 
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     processed_at = Column(DateTime(timezone=True), nullable=True)
+
+    # холодное хранение (app.services.archive): last_accessed_at обновляется пачками
+    # и не чаще ACCESS_TOUCH_MIN_SECONDS; при archived_at result_json — заглушка,
+    # полный документ лежит в архиве по archive_sha256
+    last_accessed_at = Column(DateTime(timezone=True), nullable=True)
+    archived_at = Column(DateTime(timezone=True), nullable=True)
+    archive_sha256 = Column(String(64), nullable=True)
+
+    __table_args__ = (
+        # опрос "моих незавершённых" charts: маленький частичный индекс
+        Index(
+            "ix_charts_user_active",
+            "user_id",
+            "created_at",
+            postgresql_where=text("status IN ('uploaded', 'processing')"),
+        ),
+        # очередь целиком (телеметрия, выбор задачи воркером): самый старый uploaded/processing
+        Index(
+            "ix_charts_queue",
+            "status",
+            "created_at",
+            postgresql_where=text("status IN ('uploaded', 'processing')"),
+        ),
+        # завершения за последние N минут/часов (телеметрия)
+        Index(
+            "ix_charts_processed_at",
+            "processed_at",
+            postgresql_where=text("processed_at IS NOT NULL"),
+        ),
+        # кандидаты в архив: ещё не архивированные завершённые charts по времени доступа
+        Index(
+            "ix_charts_archive_candidates",
+            func.coalesce(last_accessed_at, created_at).label("accessed"),
+            postgresql_where=text("archived_at IS NULL AND status IN ('done', 'error')"),
+        ),
+        # сборщик проверяет, ссылается ли кто-то на файл архива
+        Index(
+            "ix_charts_archive_sha256",
+            "archive_sha256",
+            postgresql_where=text("archive_sha256 IS NOT NULL"),
+        ),
+        # GET /charts/search: keyset-пагинация по (created_at, id) в пределах пользователя
+        Index("ix_charts_user_created", user_id, created_at.desc(), id.desc()),
+        # поиск по подстроке имени файла (ILIKE '%...%'), нужен pg_trgm
+        Index(
+            "ix_charts_filename_trgm",
+            original_filename,
+            postgresql_using="gin",
+            postgresql_ops={"original_filename": "gin_trgm_ops"},
+        ),
+        # фильтр по именам серий: series_names_expr(result_json) @> '["name"]'
+        Index(
+            "ix_charts_series_names",
+            series_names_expr(result_json).label("series_names"),
+            postgresql_using="gin",
+            postgresql_ops={"series_names": "jsonb_path_ops"},
+        ),
+    )
@@ -0,0 +1,81 @@
+from sqlalchemy import (
+    BigInteger,
+    Boolean,
+    Column,
+    DateTime,
+    Float,
+    ForeignKey,
+    Index,
+    Integer,
+    SmallInteger,
+    String,
+    func,
+    text,
+)
+
+from app.db.base import Base
+
+
+class ChartStatusCount(Base):
+    """
+    Число charts в каждом статусе. Ведётся триггером на charts (миграция e7a9c1d3f545),
+    из приложения только читается: счётчики без COUNT(*) по всей таблице.
+    """
+
+    __tablename__ = "chart_status_counts"
+
+    status = Column(String(32), primary_key=True)
+    n = Column(BigInteger, nullable=False, default=0)
+
+
+class Worker(Base):
+    """
+    Живые ml-worker'ы: каждый процесс обновляет свою строку раз в WORKER_HEARTBEAT_SECONDS.
+    """
+
+    __tablename__ = "workers"
+
+    id = Column(String(128), primary_key=True)
+    hostname = Column(String(255), nullable=False)
+    pid = Column(Integer, nullable=False)
+
+    started_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    last_seen_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+    current_chart_id = Column(Integer, nullable=True)
+    jobs_done = Column(BigInteger, nullable=False, default=0)
+    jobs_failed = Column(BigInteger, nullable=False, default=0)
+    # завершённых задач в минуту за последние 5 минут (считает сам воркер)
+    jobs_per_minute = Column(Float, nullable=False, default=0.0)
+
+
+class ChartJob(Base):
+    """
+    Очередь обработки: строка на chart в статусе uploaded/processing, узкая и короткоживущая.
+    Воркер забирает pending по частичному индексу ix_chart_jobs_pending и удаляет строку
+    вместе с записью результата, так что стоимость выборки не зависит от числа charts.
+    """
+
+    __tablename__ = "chart_jobs"
+
+    chart_id = Column(Integer, ForeignKey("charts.id", ondelete="CASCADE"), primary_key=True)
+    state = Column(String(16), nullable=False, server_default=text("'pending'"))  # pending|running
+    # больше — раньше; пакетные загрузки идут после одиночных
+    priority = Column(SmallInteger, nullable=False, server_default=text("0"))
+    attempts = Column(Integer, nullable=False, server_default=text("0"))
+    # POST /charts/{id}/cancel для running: воркер проверяет флаг и убивает процесс задачи
+    cancel_requested = Column(Boolean, nullable=False, server_default=text("false"))
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    claimed_at = Column(DateTime(timezone=True), nullable=True)
+    claimed_by = Column(String(128), nullable=True)  # workers.id
+
+    __table_args__ = (
+        Index(
+            "ix_chart_jobs_pending",
+            priority.desc(),
+            created_at,
+            chart_id,
+            postgresql_where=text("state = 'pending'"),
+        ),
+    )
@@ -0,0 +1,34 @@
+from sqlalchemy import Column, Float, ForeignKey, Integer, LargeBinary, Text, text
+from sqlalchemy.dialects.postgresql import JSONB
+
+from app.db.base import Base
+
+
+class ChartSeries(Base):
+    """
+    Серия результата отдельной строкой (app.services.chart_series). В charts.result_json
+    на её месте остаётся ссылка {"id", "name"}: чтение и правка одной серии —
+    одна строка, а не весь документ.
+    """
+
+    __tablename__ = "chart_series"
+
+    chart_id = Column(Integer, ForeignKey("charts.id", ondelete="CASCADE"), primary_key=True)
+    panel_id = Column(Text, primary_key=True)
+    series_id = Column(Text, primary_key=True)
+
+    # name дублируется в ссылке result_json — по нему ищет ix_charts_series_names
+    name = Column(Text, nullable=True)
+    style = Column(JSONB(none_as_null=True), nullable=True)
+
+    # float64 little-endian: x0, y0, x1, y1, ... — 16 байт на точку
+    points = Column(LargeBinary, nullable=False)
+    point_count = Column(Integer, nullable=False)
+    # NULL у пустой серии
+    x_min = Column(Float, nullable=True)
+    x_max = Column(Float, nullable=True)
+    y_min = Column(Float, nullable=True)
+    y_max = Column(Float, nullable=True)
+
+    # растёт при каждой записи серии (PUT /charts/{id}/series/...)
+    version = Column(Integer, nullable=False, server_default=text("0"))
@@ -1,13 +1,32 @@
 from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker
 
 from app.core.config import settings
+from app.db.instrumentation import TimedAsyncQueuePool, TimedQueuePool, instrument_engine
+
+
+def _async_database_url() -> str:
+    """
+    Для async-движка нужен asyncpg: postgresql[+psycopg2]://... -> postgresql+asyncpg://...
+    Можно задать явно через ASYNC_DATABASE_URL.
+    """
+    if settings.async_database_url:
+        return settings.async_database_url
+    url = make_url(settings.database_url)
+    return url.set(drivername="postgresql+asyncpg").render_as_string(hide_password=False)
+
 
 # Создаём engine на основе строки подключения из .env
 engine = create_engine(
     settings.database_url,
     future=True,
+    poolclass=TimedQueuePool,
     pool_pre_ping=True,
+    pool_size=settings.db_pool_size,
+    max_overflow=settings.db_max_overflow,
+    pool_timeout=settings.db_pool_timeout_seconds,
 )
 
 # Фабрика сессий: используется в зависимостях FastAPI (app.api.deps.get_db)
@@ -17,3 +36,39 @@ SessionLocal = sessionmaker(
     bind=engine,
     future=True,
 )
+
+# Async engine для async def эндпоинтов: запросы не блокируют event loop.
+# Пул отдельный от синхронного, суммарно соединений: оба pool_size + max_overflow.
+async_engine = create_async_engine(
+    _async_database_url(),
+    poolclass=TimedAsyncQueuePool,
+    pool_pre_ping=True,
+    pool_size=settings.db_async_pool_size,
+    max_overflow=settings.db_async_max_overflow,
+    pool_timeout=settings.db_pool_timeout_seconds,
+)
+
+# Счётчики запросов, время в БД и медленные запросы (app.db.instrumentation)
+instrument_engine(engine)
+instrument_engine(async_engine.sync_engine)
+
+# expire_on_commit=False: после commit атрибуты читаются без неявного (синхронного) запроса
+AsyncSessionLocal = async_sessionmaker(
+    async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False,
+)
+
+
+def begin_snapshot(db: Session) -> None:
+    """
+    Завершает текущую транзакцию сессии и открывает новую в REPEATABLE READ:
+    чтения до следующего commit/rollback видят один снимок БД. Так строка charts
+    и её chart_series согласованы, даже если между запросами закоммитит
+    архиватор или сохранение. Только для чтения: запись в таком снимке может
+    упасть с serialization failure. Уровень изоляции сбрасывается, когда
+    соединение возвращается в пул.
+    """
+    db.commit()
+    db.connection(execution_options={"isolation_level": "REPEATABLE READ"})
@@ -1,11 +1,26 @@
-from contextlib import asynccontextmanager
+import asyncio
+from contextlib import asynccontextmanager, suppress
+import logging
 import os
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.api.v1 import router as api_v1_router
+from app.core.compression import CompressionMiddleware
 from app.core.config import settings
+from app.core.http_metrics import HTTPMetricsMiddleware
+from app.core.metrics import mark_process_dead, register_collector, render_latest
+from app.core.password_pool import password_hasher
+from app.db.instrumentation import DBStatsMiddleware
+from app.db.session import async_engine
+from app.services.archive import access_tracker, result_archiver
+from app.services.queue_stats import queue_metrics_collector
+from app.services.renditions import rendition_service
+from app.services.storage import storage_sweeper
+
+logger = logging.getLogger(__name__)
 
 
 def _cors_origins() -> list[str]:
@@ -28,13 +43,39 @@ def _cors_origins() -> list[str]:
 @asynccontextmanager
 async def lifespan(_: FastAPI):
     settings.storage_dir.mkdir(parents=True, exist_ok=True)
-    yield
+    password_hasher.start()
+    rendition_service.start()
+    if settings.queue_metrics_enabled:
+        register_collector(queue_metrics_collector)
+
+    gc_task = asyncio.create_task(storage_sweeper.run_forever()) if settings.storage_gc_enabled else None
+    archive_task = asyncio.create_task(result_archiver.run_forever()) if settings.archive_enabled else None
+    access_task = asyncio.create_task(access_tracker.run_forever())
+    try:
+        yield
+    finally:
+        password_hasher.shutdown()
+        rendition_service.shutdown()
+        for task in (gc_task, archive_task, access_task):
+            if task is not None:
+                task.cancel()
+                with suppress(asyncio.CancelledError):
+                    await task
+        # отметки доступа, накопленные с последнего сброса
+        try:
+            await asyncio.to_thread(access_tracker.flush)
+        except Exception:
+            logger.exception("access tracker final flush failed")
+        await async_engine.dispose()
+        mark_process_dead(os.getpid())
 
 
 app = FastAPI(
     title="Chart Extraction API",
     version="1.0.0",
     lifespan=lifespan,
+    # orjson вместо json.dumps для всех ответов-моделей
+    default_response_class=ORJSONResponse,
 )
 
 app.add_middleware(
@@ -44,6 +85,11 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(DBStatsMiddleware)
+# снаружи DBStats, внутри метрик: HTTPMetrics видит размер тела на проводе
+app.add_middleware(CompressionMiddleware)
+# добавлен последним — внешний слой, считает и ответы CORS preflight
+app.add_middleware(HTTPMetricsMiddleware)
 
 
 @app.get("/health", tags=["health"])
@@ -51,4 +97,10 @@ async def health_check() -> dict[str, str]:
     return {"status": "ok"}
 
 
+@app.get("/metrics", tags=["health"], include_in_schema=False)
+def metrics() -> Response:
+    body, content_type = render_latest()
+    return Response(content=body, media_type=content_type)
+
+
 app.include_router(api_v1_router, prefix="/api/v1")
\ No newline at end of file
@@ -0,0 +1,41 @@
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Optional
+
+from pydantic import BaseModel
+
+
+class QueueWindowStats(BaseModel):
+    window_seconds: int
+    done: int
+    error: int
+    # done + error в минуту, среднее по окну
+    completed_per_minute: float
+    # created_at -> processed_at для done: ожидание в очереди + обработка
+    turnaround_p50_seconds: Optional[float] = None
+    turnaround_p90_seconds: Optional[float] = None
+    turnaround_p99_seconds: Optional[float] = None
+
+
+class WorkerInfo(BaseModel):
+    id: str
+    hostname: str
+    pid: int
+    started_at: datetime
+    last_seen_at: datetime
+    alive: bool
+    current_chart_id: Optional[int] = None
+    jobs_done: int
+    jobs_failed: int
+    jobs_per_minute: float
+
+
+class QueueTelemetry(BaseModel):
+    generated_at: datetime
+    counts: dict[str, int]
+    oldest_uploaded_age_seconds: Optional[float] = None
+    oldest_processing_age_seconds: Optional[float] = None
+    windows: list[QueueWindowStats]
+    workers_alive: int
+    workers: list[WorkerInfo]
@@ -2,9 +2,9 @@ from __future__ import annotations
 
 from datetime import datetime
 from enum import Enum
-from typing import Any, Optional
+from typing import Annotated, Any, Literal, Optional, Union
 
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict, Field
 
 
 class ChartStatus(str, Enum):
@@ -26,4 +26,133 @@ class ChartCreateResponse(BaseModel):
     n_series: Optional[int] = None
 
     result_json: Optional[dict[str, Any]] = None
+    # версия result_json для оптимистичной блокировки (PATCH /result_json)
+    result_version: int = 0
     error_message: Optional[str] = None
+
+
+class ChartStatusItem(BaseModel):
+    # облегчённый ответ для опроса статусов: без result_json
+    id: int
+    status: ChartStatus
+    processed_at: Optional[datetime] = None
+    n_series: Optional[int] = None
+    error_message: Optional[str] = None
+
+
+class ChartSearchItem(BaseModel):
+    # строка результата поиска: без result_json
+    id: int
+    status: ChartStatus
+    original_filename: str
+    mime_type: str
+    created_at: datetime
+    processed_at: Optional[datetime] = None
+    n_panels: Optional[int] = None
+    n_series: Optional[int] = None
+    error_message: Optional[str] = None
+
+
+class ChartSearchPage(BaseModel):
+    items: list[ChartSearchItem]
+    # непрозрачный курсор следующей страницы; None — страниц больше нет
+    next_cursor: Optional[str] = None
+
+
+class ChartBatchError(BaseModel):
+    index: int  # порядковый номер файла в пачке (с учётом файлов внутри ZIP)
+    filename: str
+    detail: str
+
+
+class ChartBatchUploadResponse(BaseModel):
+    # id созданных charts в порядке файлов пачки; файлы с ошибками пропущены
+    ids: list[int]
+    errors: list[ChartBatchError] = []
+
+
+# ---------- PATCH /charts/{id}/result_json ----------
+
+class JsonPatchOp(BaseModel):
+    # RFC 6902
+    model_config = ConfigDict(populate_by_name=True)
+
+    op: Literal["add", "remove", "replace", "move", "copy", "test"]
+    path: str
+    value: Any = None
+    from_: Optional[str] = Field(default=None, alias="from")
+
+
+class ReplaceSeriesOp(BaseModel):
+    op: Literal["replace_series"]
+    panel_id: str
+    series_id: str
+    series: dict[str, Any]
+
+
+class InsertPointsOp(BaseModel):
+    op: Literal["insert_points"]
+    panel_id: str
+    series_id: str
+    index: Optional[int] = None  # None — в конец
+    points: list[Any]
+
+
+class DeletePointsOp(BaseModel):
+    op: Literal["delete_points"]
+    panel_id: str
+    series_id: str
+    start: int = Field(ge=0)
+    count: int = Field(ge=1)
+
+
+ChartPatchOp = Annotated[
+    Union[JsonPatchOp, ReplaceSeriesOp, InsertPointsOp, DeletePointsOp],
+    Field(discriminator="op"),
+]
+
+
+class ChartPatchRequest(BaseModel):
+    version: int  # result_version, на котором основаны изменения
+    ops: list[ChartPatchOp] = Field(min_length=1)
+
+
+class ChartPatchResponse(BaseModel):
+    id: int
+    result_version: int
+    n_panels: Optional[int] = None
+    n_series: Optional[int] = None
+
+
+# ---------- GET/PUT /charts/{id}/series/{panel_id}/{series_id} ----------
+
+class ChartSeriesResponse(BaseModel):
+    chart_id: int
+    panel_id: str
+    id: str
+    name: Optional[str] = None
+    style: Optional[dict[str, Any]] = None
+    points: list[list[float]]
+    point_count: int
+    # границы точек; None у пустой серии
+    x_min: Optional[float] = None
+    x_max: Optional[float] = None
+    y_min: Optional[float] = None
+    y_max: Optional[float] = None
+    version: int  # версия серии для PUT
+
+
+class ChartSeriesUpdate(BaseModel):
+    version: int  # version серии, на которой основаны изменения
+    name: Optional[str] = None
+    style: Optional[dict[str, Any]] = None
+    points: list[Any]
+
+
+class ChartSeriesUpdateResponse(BaseModel):
+    chart_id: int
+    panel_id: str
+    id: str
+    version: int
+    point_count: int
+    result_version: int
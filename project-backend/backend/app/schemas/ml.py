@@ -1,7 +1,9 @@
 from enum import Enum
-from typing import List, Optional, Tuple
+from itertools import chain
+from typing import Annotated, Any, List, Optional, Tuple
 
-from pydantic import BaseModel
+import numpy as np
+from pydantic import BaseModel, PlainSerializer, PlainValidator, WithJsonSchema
 
 
 class ScaleType(str, Enum):
@@ -16,12 +18,74 @@ class SeriesStyle(BaseModel):
     dash: Optional[str] = None
 
 
+_BOOL_TYPES = frozenset({bool, np.bool_})
+
+
+def _has_bool(value: Any) -> bool:
+    # np.asarray молча приводит True/False к 1.0/0.0; проход по типам — на уровне C
+    if isinstance(value, np.ndarray):
+        return value.dtype == np.bool_
+    return not _BOOL_TYPES.isdisjoint(map(type, chain.from_iterable(value)))
+
+
+def to_points_array(value: Any) -> np.ndarray:
+    """
+    [[x, y], ...] -> float64-массив формы (n, 2) одной операцией.
+    Проверки (форма, тип, конечность) тоже векторные, а не по точке.
+    """
+    if isinstance(value, (str, bytes, dict)):
+        raise ValueError("points must be a list of [x, y] pairs")
+    try:
+        arr = np.asarray(value, dtype=np.float64)
+    except (TypeError, ValueError):
+        raise ValueError("points must be a list of [x, y] numeric pairs")
+
+    if arr.size == 0:
+        return np.empty((0, 2), dtype=np.float64)
+    if arr.ndim != 2 or arr.shape[1] != 2:
+        raise ValueError("points must be a list of [x, y] pairs")
+    if _has_bool(value):
+        raise ValueError("points must be a list of [x, y] numeric pairs")
+    if not np.isfinite(arr).all():
+        raise ValueError("points must be finite numbers")
+    return arr
+
+
+def _points_to_list(arr: np.ndarray) -> list[list[float]]:
+    return arr.tolist()
+
+
+# Точки серии: numpy (n, 2) float64 — 16 байт на точку вместо ~100+ у tuple из двух float.
+# На входе и выходе (JSON, model_dump) — прежний формат [[x, y], ...].
+PointsArray = Annotated[
+    np.ndarray,
+    PlainValidator(to_points_array),
+    PlainSerializer(_points_to_list, return_type=list),
+    WithJsonSchema(
+        {
+            "type": "array",
+            "items": {"type": "array", "items": {"type": "number"}, "minItems": 2, "maxItems": 2},
+        }
+    ),
+]
+
+
 class Series(BaseModel):
     id: str
     name: Optional[str] = None
     style: Optional[SeriesStyle] = None
-    # список точек: [ [x, y], ... ] уже в единицах осей
-    points: List[Tuple[float, float]]
+    # список точек: [ [x, y], ... ] уже в единицах осей; внутри — PointsArray
+    points: PointsArray
+
+    def __eq__(self, other: Any) -> bool:
+        # сравнение BaseModel по полям упирается в ndarray == ndarray (неоднозначная истинность)
+        if not isinstance(other, BaseModel):
+            return NotImplemented
+        if type(self) is not type(other):
+            return False
+        fields = {k: v for k, v in self.__dict__.items() if k != "points"}
+        other_fields = {k: v for k, v in other.__dict__.items() if k != "points"}
+        return fields == other_fields and np.array_equal(self.points, other.points)
 
 
 class Panel(BaseModel):
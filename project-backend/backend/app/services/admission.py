@@ -0,0 +1,161 @@
+"""
+Допуск загрузок в очередь обработки (admission control).
+
+Проверки до записи файла в storage/, от дешёвых к дорогим:
+- глобальная глубина очереди выше QUEUE_HIGH_WATER -> 503;
+- token bucket пользователя (UPLOAD_RATE_PER_MINUTE, UPLOAD_BURST) -> 429;
+- у пользователя уже USER_MAX_PENDING charts в очереди/обработке -> 429.
+Retry-After считается из скорости живых воркеров. Очередь не растёт выше
+high-water mark, поэтому ожидание принятой загрузки ограничено.
+"""
+from __future__ import annotations
+
+import asyncio
+from dataclasses import dataclass
+from datetime import timedelta
+import time
+
+from fastapi import HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.metrics import UPLOAD_REJECTED
+from app.core.rate_limit import TokenBucketLimiter, retry_after_header
+from app.db.crud.chart import async_chart_crud
+from app.db.crud.queue import async_queue_crud
+
+# без живых воркеров скорость неизвестна
+FALLBACK_RETRY_SECONDS = 60
+MAX_RETRY_SECONDS = 3600
+
+
+@dataclass
+class QueueLoad:
+    pending: int
+    per_minute: float
+
+
+def _drain_seconds(jobs: int, per_minute: float) -> float:
+    """
+    За сколько воркеры обработают jobs задач при текущей скорости.
+    """
+    if per_minute <= 0:
+        return FALLBACK_RETRY_SECONDS
+    return min(max(jobs, 1) * 60.0 / per_minute, MAX_RETRY_SECONDS)
+
+
+def _reject(status_code: int, reason: str, detail: str, retry_after: float) -> HTTPException:
+    UPLOAD_REJECTED.labels(reason=reason).inc()
+    return HTTPException(
+        status_code=status_code,
+        detail=detail,
+        headers=retry_after_header(retry_after),
+    )
+
+
+class QueueLoadCache:
+    """
+    Глубина очереди и скорость воркеров, кэш на QUEUE_DEPTH_CACHE_SECONDS в процессе.
+    Принятые этим процессом файлы сразу прибавляются к pending, чтобы всплеск загрузок
+    внутри TTL не проскочил high-water mark.
+    """
+
+    def __init__(self) -> None:
+        self._lock = asyncio.Lock()
+        self._load: QueueLoad | None = None
+        self._loaded_at = 0.0
+
+    def _fresh(self) -> bool:
+        ttl = float(settings.queue_depth_cache_seconds)
+        return self._load is not None and time.monotonic() - self._loaded_at < ttl
+
+    async def get(self, db: AsyncSession) -> QueueLoad:
+        if self._fresh():
+            return self._load
+        async with self._lock:
+            # пока ждали lock, кэш мог обновить другой запрос
+            if not self._fresh():
+                row = await async_queue_crud.load(
+                    db,
+                    worker_stale=timedelta(seconds=settings.worker_stale_seconds),
+                )
+                self._load = QueueLoad(pending=row["pending"], per_minute=row["per_minute"])
+                self._loaded_at = time.monotonic()
+            return self._load
+
+    def note_admitted(self, n: int) -> None:
+        if self._load is not None:
+            self._load.pending += n
+
+
+class AdmissionController:
+    def __init__(self) -> None:
+        self._limiter = TokenBucketLimiter(
+            capacity=settings.upload_burst,
+            rate=settings.upload_rate_per_minute / 60.0,
+        )
+        self._queue = QueueLoadCache()
+
+    async def check_queue(self, db: AsyncSession, n_files: int) -> QueueLoad:
+        """
+        Только глобальная глубина очереди: 503, если n_files не помещаются под QUEUE_HIGH_WATER.
+        """
+        load = await self._queue.get(db)
+        high_water = settings.queue_high_water
+        if high_water and load.pending + n_files > high_water:
+            raise _reject(
+                status.HTTP_503_SERVICE_UNAVAILABLE,
+                "queue_full",
+                "Processing queue is full, retry later",
+                _drain_seconds(load.pending + n_files - high_water, load.per_minute),
+            )
+        return load
+
+    async def admit(self, db: AsyncSession, *, user_id: int, n_files: int = 1) -> int | None:
+        """
+        Все проверки перед приёмом n_files файлов. Возвращает, сколько charts пользователь
+        ещё может поставить в очередь (None — без ограничения): пакет после распаковки
+        ZIP может оказаться больше n_files, остаток доплачивается в admit_extra().
+        """
+        load = await self.check_queue(db, n_files)
+
+        # пакет больше ёмкости ведра проходит с полного ведра и уводит его в долг
+        retry_after = self._limiter.hit(user_id, cost=float(n_files), debt=True)
+        if retry_after > 0:
+            raise _reject(
+                status.HTTP_429_TOO_MANY_REQUESTS,
+                "rate",
+                "Too many uploads, retry later",
+                retry_after,
+            )
+
+        max_pending = settings.user_max_pending
+        if not max_pending:
+            return None
+        active = await async_chart_crud.count_active(db, user_id=user_id, limit=max_pending)
+        allowance = max_pending - active
+        if allowance <= 0:
+            raise _reject(
+                status.HTTP_429_TOO_MANY_REQUESTS,
+                "user_pending",
+                f"Too many charts waiting for processing (max {max_pending})",
+                _drain_seconds(1, load.per_minute),
+            )
+        return allowance
+
+    async def admit_extra(self, db: AsyncSession, *, user_id: int, n_extra: int, batch_files: int) -> None:
+        """
+        Доплата за файлы, ставшие известными после admit() (содержимое ZIP):
+        high-water проверяется на весь пакет (batch_files), ведро списывает n_extra
+        без отказа — загрузка уже принята, долг задержит следующие.
+        """
+        if n_extra <= 0:
+            return
+        await self.check_queue(db, batch_files)
+        self._limiter.charge(user_id, float(n_extra))
+
+    def admitted(self, n: int) -> None:
+        self._queue.note_admitted(n)
+
+
+admission = AdmissionController()
@@ -0,0 +1,340 @@
+"""
+Холодное хранение result_json давно не открывавшихся charts.
+
+Архиватор пачками переносит документ (result_json вместе с сериями из chart_series)
+в сжатые content-addressed файлы archive_dir/results/<ab>/<sha256>.json.gz, удаляет
+серии, а в строке оставляет заглушку: id панелей и серий с именами (для поиска)
+и artifacts (для списка).
+Чтение через GET /charts/{id} и экспорт возвращает документ в строку (rehydrate).
+Время доступа копится в памяти (AccessTracker) и пишется в БД пачками.
+"""
+from __future__ import annotations
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+import gzip
+from hashlib import sha256
+import logging
+import os
+from pathlib import Path
+import shutil
+import tempfile
+import threading
+import time
+from typing import Any, Optional
+
+import orjson
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.crud.chart import chart_crud
+from app.db.crud.series import series_crud
+from app.db.session import SessionLocal
+from app.services.chart_series import assemble_result, split_result
+
+logger = logging.getLogger(__name__)
+
+GZIP_LEVEL = 6
+
+
+def _stub(result_json: Any) -> dict[str, Any]:
+    """
+    Что остаётся в строке вместо архивированного документа. Точек нет;
+    имена серий нужны индексу ix_charts_series_names, artifacts — списку charts.
+    """
+    doc = result_json if isinstance(result_json, dict) else {}
+    panels = doc.get("panels") if isinstance(doc.get("panels"), list) else []
+    stub: dict[str, Any] = {
+        "archived": True,
+        "panels": [
+            {
+                "id": p.get("id"),
+                "series": [
+                    {"id": s.get("id"), "name": s.get("name")}
+                    for s in (p.get("series") or [])
+                    if isinstance(s, dict)
+                ],
+            }
+            for p in panels
+            if isinstance(p, dict)
+        ],
+    }
+    if "artifacts" in doc:
+        stub["artifacts"] = doc["artifacts"]
+    return stub
+
+
+def _move_tree(src: Path, dst: Path) -> None:
+    """
+    Переносит файлы src/ в dst/ по одному; уже существующие в dst не трогает
+    (после прерванного переноса обе копии совпадают или в dst новее). src удаляется.
+    Файлы и каталоги, которые успел перенести кто-то другой, пропускаются
+    (os.walk молча обходит исчезнувшие каталоги).
+    """
+    for dirpath, _dirnames, filenames in os.walk(src):
+        for name in sorted(filenames):
+            path = Path(dirpath) / name
+            target = dst / path.relative_to(src)
+            if target.exists():
+                continue
+            target.parent.mkdir(parents=True, exist_ok=True)
+            try:
+                shutil.move(str(path), str(target))
+            except FileNotFoundError:
+                if not target.exists():
+                    raise
+    shutil.rmtree(src, ignore_errors=True)
+
+
+class ArchiveStore:
+    """
+    Файлы архива. Имя — sha256 от orjson-байтов документа (до сжатия), поэтому
+    одинаковые результаты хранятся один раз, а загрузка проверяет целостность.
+    """
+
+    @property
+    def root(self) -> Path:
+        return Path(settings.archive_dir).resolve()
+
+    @property
+    def results_dir(self) -> Path:
+        return self.root / "results"
+
+    @property
+    def tmp_dir(self) -> Path:
+        return self.root / "tmp"
+
+    def result_path(self, sha: str) -> Path:
+        return self.results_dir / sha[:2] / f"{sha}.json.gz"
+
+    def encode(self, result_json: Any) -> tuple[str, bytes]:
+        data = orjson.dumps(result_json, option=orjson.OPT_SORT_KEYS)
+        return sha256(data).hexdigest(), data
+
+    def write(self, sha: str, data: bytes) -> None:
+        """
+        Пишет файл архива (sha, data — из encode()). Вызывать под chart_crud.lock_archive(sha),
+        если строка со ссылкой на файл ещё не закоммичена.
+        """
+        final_path = self.result_path(sha)
+        if final_path.exists():
+            # тот же документ уже в архиве: освежаем mtime, чтобы сборщик его не тронул
+            os.utime(final_path)
+            return
+
+        self.tmp_dir.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(prefix="archive_", suffix=".part", dir=self.tmp_dir)
+        tmp_path = Path(tmp_name)
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                fh.write(gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0))
+                fh.flush()
+                os.fsync(fh.fileno())
+            final_path.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(tmp_path, final_path)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+
+    def load(self, sha: str) -> Any:
+        data = gzip.decompress(self.result_path(sha).read_bytes())
+        if sha256(data).hexdigest() != sha:
+            raise ValueError(f"archived result {sha} is corrupted")
+        return orjson.loads(data)
+
+    # ---------- артефакты: storage/charts/<id>/ <-> archive_dir/charts/<id>/ ----------
+
+    def hot_artifacts_dir(self, chart_id: int) -> Path:
+        return Path(settings.storage_dir).resolve() / "charts" / str(chart_id)
+
+    def cold_artifacts_dir(self, chart_id: int) -> Path:
+        return self.root / "charts" / str(chart_id)
+
+    def locate_artifact(self, rel: str) -> Optional[Path]:
+        """
+        Архивная копия артефакта по его пути в storage/ (charts/<id>/...), без переноса.
+        """
+        root = self.root
+        path = (root / rel).resolve()
+        if root not in path.parents or not path.is_file():
+            return None
+        return path
+
+    def _move_artifacts(self, chart_id: int, src: Path, dst: Path) -> bool:
+        if not src.is_dir():
+            return False
+        # галерея открывает оригинал и превью всех артефактов chart параллельно:
+        # переносы одного каталога идут по очереди (блокировка снимается с закрытием сессии)
+        with SessionLocal() as db:
+            chart_crud.lock_artifacts(db, chart_id)
+            if not src.is_dir():
+                return False
+            _move_tree(src, dst)
+        return True
+
+    def archive_artifacts(self, chart_id: int) -> None:
+        self._move_artifacts(chart_id, self.hot_artifacts_dir(chart_id), self.cold_artifacts_dir(chart_id))
+
+    def restore_artifacts(self, chart_id: int) -> bool:
+        """
+        Возвращает артефакты в storage/. PNG уже сжаты, поэтому они только переносятся.
+        """
+        return self._move_artifacts(chart_id, self.cold_artifacts_dir(chart_id), self.hot_artifacts_dir(chart_id))
+
+
+archive_store = ArchiveStore()
+
+
+class AccessTracker:
+    """
+    Id charts, открытых с последнего сброса. flush() пишет last_accessed_at одним
+    UPDATE и пропускает строки, тронутые недавно (ACCESS_TOUCH_MIN_SECONDS):
+    горячие charts не переписываются на каждый просмотр.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._pending: set[int] = set()
+
+    def touch(self, chart_id: int) -> None:
+        with self._lock:
+            self._pending.add(int(chart_id))
+
+    def flush(self) -> int:
+        with self._lock:
+            ids, self._pending = self._pending, set()
+        if not ids:
+            return 0
+        try:
+            with SessionLocal() as db:
+                return chart_crud.touch_accessed(
+                    db,
+                    sorted(ids),
+                    min_interval=timedelta(seconds=max(int(settings.access_touch_min_seconds), 0)),
+                )
+        except Exception:
+            # не теряем отметки: вернутся в следующий сброс
+            with self._lock:
+                self._pending |= ids
+            raise
+
+    async def run_forever(self) -> None:
+        interval = float(settings.access_flush_seconds)
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await run_in_threadpool(self.flush)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("access tracker flush failed")
+
+
+access_tracker = AccessTracker()
+
+
+class ResultArchiver:
+    """
+    Фоновый перенос result_json в архив и обратный перенос при чтении.
+    Проход — не больше ARCHIVE_MAX_BATCHES пачек по ARCHIVE_BATCH_SIZE строк
+    с паузой ARCHIVE_BATCH_PAUSE_MS, каждая пачка — своя короткая транзакция.
+    """
+
+    def archive_batch(self) -> int:
+        cutoff = datetime.now(timezone.utc) - timedelta(days=int(settings.archive_after_days))
+        archived: list[int] = []
+        with SessionLocal() as db:
+            rows = chart_crud.claim_archive_candidates(
+                db,
+                accessed_before=cutoff,
+                limit=max(int(settings.archive_batch_size), 1),
+            )
+            series: dict[int, list[Any]] = {}
+            for s in series_crud.list_for_charts(db, [row.id for row in rows]):
+                series.setdefault(s.chart_id, []).append(s)
+
+            encoded = []
+            for row in rows:
+                doc = assemble_result(row.result_json, series.get(row.id, ()))
+                encoded.append((row.id, doc, *archive_store.encode(doc)))
+
+            # блокировки до commit: сборщик не удалит файл, на который вот-вот сошлётся
+            # строка; порядок по sha — чтобы два архиватора не ждали друг друга
+            for sha in sorted({sha for _, _, sha, _ in encoded}):
+                chart_crud.lock_archive(db, sha)
+            for chart_id, doc, sha, data in encoded:
+                archive_store.write(sha, data)
+                chart_crud.mark_archived(db, chart_id=chart_id, sha=sha, stub=_stub(doc))
+                archived.append(chart_id)
+            series_crud.delete_for_charts(db, archived)
+            db.commit()
+
+        # файлы артефактов переносим после commit: до него строка ещё не архивная
+        if settings.archive_artifacts:
+            for chart_id in archived:
+                try:
+                    archive_store.archive_artifacts(chart_id)
+                except OSError:
+                    logger.warning("cannot archive artifacts of chart %s", chart_id, exc_info=True)
+        return len(archived)
+
+    def archive_once(self) -> int:
+        total = 0
+        pause = max(int(settings.archive_batch_pause_ms), 0) / 1000
+        for i in range(max(int(settings.archive_max_batches), 1)):
+            if i and pause:
+                time.sleep(pause)
+            n = self.archive_batch()
+            total += n
+            if n < settings.archive_batch_size:
+                break
+        return total
+
+    def rehydrate(self, db: Session, chart_id: int, sha: str) -> bool:
+        """
+        Возвращает документ из архива в строку. UPDATE условный (archive_sha256 = sha):
+        при параллельном чтении того же chart документ пишется один раз.
+        Серии возвращаются в chart_series в той же транзакции.
+        result_version не меняется — содержимое то же, что до архивации.
+        Файл архива не удаляется: на него могут ссылаться другие charts, его уберёт сборщик.
+        """
+        result_json, rows = split_result(archive_store.load(sha))
+        restored = chart_crud.restore_archived(db, chart_id=chart_id, sha=sha, result_json=result_json)
+        if restored:
+            series_crud.upsert(db, chart_id, [r.values() for r in rows])
+        db.commit()
+        try:
+            archive_store.restore_artifacts(chart_id)
+        except OSError:
+            logger.warning("cannot restore artifacts of chart %s", chart_id, exc_info=True)
+        return restored
+
+    def load_readonly(self, sha: Optional[str], result_json: Any) -> Any:
+        """
+        Полный документ без записи в БД (массовая выгрузка не должна
+        возвращать в горячую таблицу всё, что экспортирует).
+        """
+        if not sha:
+            return result_json
+        try:
+            return archive_store.load(sha)
+        except (OSError, ValueError):
+            logger.warning("cannot load archived result %s", sha, exc_info=True)
+            return None
+
+    async def run_forever(self) -> None:
+        interval = float(settings.archive_interval_seconds)
+        while True:
+            try:
+                n = await run_in_threadpool(self.archive_once)
+                if n:
+                    logger.info("archived %s chart results", n)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("result archiver failed")
+            await asyncio.sleep(interval)
+
+
+result_archiver = ResultArchiver()
@@ -1,55 +1,103 @@
 from fastapi import HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.core.security import verify_password, create_access_token
-from app.db.crud.user import user_crud
+from app.core.config import settings
+from app.core.metrics import AUTH_RATE_LIMITED
+from app.core.password_pool import password_hasher
+from app.core.rate_limit import TokenBucketLimiter, retry_after_header
+from app.core.security import create_access_token
+from app.db.crud.user import async_user_crud
 from app.db.models.user import User
 from app.schemas.auth import LoginRequest, RegisterRequest, Token
 from app.schemas.user import UserCreate, UserRead
 
 
+def _attempts_limiter() -> TokenBucketLimiter:
+    return TokenBucketLimiter(
+        capacity=settings.auth_attempts_burst,
+        rate=settings.auth_attempts_per_minute / 60.0,
+    )
+
+
+def _check_attempt(limiter: TokenBucketLimiter, key: str | None, scope: str) -> None:
+    """
+    Ограничение попыток до bcrypt: перебор паролей не должен съедать пул хэширования.
+    """
+    if not key:
+        return
+    retry_after = limiter.hit(key)
+    if retry_after > 0:
+        AUTH_RATE_LIMITED.labels(scope=scope).inc()
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many attempts, retry later",
+            headers=retry_after_header(retry_after),
+        )
+
+
 class AuthService:
     """
     Сервис авторизации: регистрация, логин, простая аутентификация пользователя.
+    bcrypt считается в password_hasher (отдельные процессы), попытки ограничены по ip и email.
     """
 
-    def register(self, db: Session, data: RegisterRequest) -> UserRead:
+    def __init__(self) -> None:
+        self._login_ip = _attempts_limiter()
+        self._login_account = _attempts_limiter()
+        self._register_ip = _attempts_limiter()
+
+    async def register(
+        self,
+        db: AsyncSession,
+        data: RegisterRequest,
+        client_ip: str | None = None,
+    ) -> UserRead:
         """
         Регистрация нового пользователя.
         """
+        _check_attempt(self._register_ip, client_ip, "register_ip")
+
         # Проверяем, что такого email ещё нет
-        existing = user_crud.get_by_email(db, data.email)
+        existing = await async_user_crud.get_by_email(db, data.email)
         if existing:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="User with this email already exists",
             )
 
-        # Создаём пользователя через CRUD (там уже хэшируется пароль)
-        user = user_crud.create(
+        user = await async_user_crud.create(
             db,
             UserCreate(email=data.email, password=data.password),
+            hashed_password=await password_hasher.hash_async(data.password),
         )
         return UserRead.model_validate(user)
 
-    def authenticate(self, db: Session, email: str, password: str) -> User | None:
+    async def authenticate(self, db: AsyncSession, email: str, password: str) -> User | None:
         """
         Проверка пары email/пароль. Возвращает пользователя или None.
         """
-        user = user_crud.get_by_email(db, email)
+        user = await async_user_crud.get_by_email(db, email)
         if not user:
             return None
-        if not verify_password(password, user.hashed_password):
+        if not await password_hasher.verify_async(password, user.hashed_password):
             return None
         if not user.is_active:
             return None
         return user
 
-    def login(self, db: Session, data: LoginRequest) -> Token:
+    async def login(
+        self,
+        db: AsyncSession,
+        data: LoginRequest,
+        client_ip: str | None = None,
+    ) -> Token:
         """
         Логин: проверка email/пароля и выдача JWT-токена.
         """
-        user = self.authenticate(db, data.email, data.password)
+        _check_attempt(self._login_ip, client_ip, "login_ip")
+        _check_attempt(self._login_account, data.email.lower(), "login_account")
+
+        user = await self.authenticate(db, data.email, data.password)
         if not user:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -0,0 +1,213 @@
+"""
+Выгрузка нескольких charts одним ZIP (GET /charts/export.zip).
+
+Архив пишется в несикаемый буфер (zipfile ставит data descriptor после каждой записи),
+буфер сливается в ответ после каждого chart и каждого куска файла. Строки читаются
+серверным курсором пачками (серии — одним запросом на пачку), так что память
+не зависит от числа charts в выгрузке.
+"""
+from __future__ import annotations
+
+from datetime import datetime
+import json
+import logging
+from pathlib import Path
+import re
+import time
+from typing import Any, BinaryIO, Iterator, Optional
+import zipfile
+
+from fastapi import HTTPException
+from pydantic import ValidationError
+
+from app.core.config import settings
+from app.db.crud.chart import chart_crud
+from app.db.session import SessionLocal, begin_snapshot
+from app.schemas.ml import Panel
+from app.services.archive import archive_store, result_archiver
+from app.services.chart_series import series_store
+from app.services.storage import blob_store
+from app.utils.export import (
+    ChunkBuffer,
+    csv_excel_bytes,
+    export_to_csv,
+    export_to_json,
+    export_to_table_csv,
+)
+
+logger = logging.getLogger(__name__)
+
+FILE_CHUNK_BYTES = 1024 * 1024
+
+# уже сжатые форматы кладём без deflate: выигрыша нет, только CPU
+_STORED_SUFFIXES = frozenset({".png", ".jpg", ".jpeg", ".webp", ".gif", ".gz", ".zip", ".npz"})
+
+# ключ артефакта идёт в имя файла архива: без "/" и ".."
+_UNSAFE_NAME = re.compile(r"[^\w.-]+")
+
+_DATA_NAMES = {
+    "csv": "data.csv",
+    "json": "data.json",
+    "table": "data_table.csv",
+}
+
+
+def _parse_panels(result_json: Any) -> Optional[list[Panel]]:
+    panels_raw = result_json.get("panels") if isinstance(result_json, dict) else None
+    if not isinstance(panels_raw, list) or not panels_raw:
+        return None
+    try:
+        return [Panel.model_validate(p) for p in panels_raw]
+    except (ValidationError, TypeError, ValueError):
+        return None
+
+
+def _render_data(panels: list[Panel], fmt: str) -> Optional[bytes]:
+    if fmt == "json":
+        return export_to_json(panels).encode("utf-8")
+    if fmt == "table":
+        content = export_to_table_csv(panels)
+        return csv_excel_bytes(content) if content else None
+    return csv_excel_bytes(export_to_csv(panels))
+
+
+def _resolve(raw_path: Any, *, allow_absolute: bool) -> Optional[Path]:
+    if not isinstance(raw_path, str) or not raw_path.strip():
+        return None
+    if Path(raw_path).is_absolute() and not allow_absolute:
+        return None
+    try:
+        path = blob_store.resolve(raw_path)
+    except HTTPException:
+        return None
+    return path if path.is_file() else None
+
+
+def _write_file(
+    zf: zipfile.ZipFile,
+    buf: ChunkBuffer,
+    arcname: str,
+    src: BinaryIO,
+    suffix: str,
+) -> Iterator[bytes]:
+    info = zipfile.ZipInfo(arcname, date_time=time.localtime()[:6])
+    info.compress_type = zipfile.ZIP_STORED if suffix in _STORED_SUFFIXES else zipfile.ZIP_DEFLATED
+    with zf.open(info, mode="w", force_zip64=True) as dst:
+        while chunk := src.read(FILE_CHUNK_BYTES):
+            dst.write(chunk)
+            yield buf.drain()
+
+
+def _chart_files(row: Any, *, include_originals: bool, include_artifacts: bool) -> list[tuple[str, Path]]:
+    prefix = f"chart_{row.id}"
+    files: list[tuple[str, Path]] = []
+
+    if include_originals:
+        path = _resolve(row.original_path, allow_absolute=True)
+        if path is not None:
+            files.append((f"{prefix}/original{path.suffix.lower()}", path))
+
+    artifacts = row.result_json.get("artifacts") if isinstance(row.result_json, dict) else None
+    if include_artifacts and isinstance(artifacts, dict):
+        for key, rel in artifacts.items():
+            path = _resolve(rel, allow_absolute=False)
+            if path is None and isinstance(rel, str) and not Path(rel).is_absolute():
+                path = archive_store.locate_artifact(rel)
+            if path is not None:
+                name = _UNSAFE_NAME.sub("_", str(key)).strip(".") or "artifact"
+                files.append((f"{prefix}/artifacts/{name}{path.suffix.lower()}", path))
+
+    return files
+
+
+def iter_charts_zip(
+    *,
+    user_id: int,
+    chart_ids: Optional[list[int]] = None,
+    since: Optional[datetime] = None,
+    status: Optional[str] = None,
+    fmt: str = "csv",
+    include_originals: bool = False,
+    include_artifacts: bool = False,
+) -> Iterator[bytes]:
+    """
+    Генератор байтов ZIP: chart_<id>/data.* (+ original.*, artifacts/*) и manifest.json в конце.
+    Charts без результата попадают только в manifest (с полем error).
+    Сессия своя: зависимость get_db закрывается раньше, чем дочитается StreamingResponse.
+    """
+    buf = ChunkBuffer()
+    manifest: list[dict[str, Any]] = []
+    data_name = _DATA_NAMES[fmt]
+
+    db = SessionLocal()
+    try:
+        # строки и их chart_series — из одного снимка на всю выгрузку
+        begin_snapshot(db)
+        with zipfile.ZipFile(
+            buf,
+            mode="w",
+            compression=zipfile.ZIP_DEFLATED,
+            compresslevel=settings.export_zip_compress_level,
+            allowZip64=True,
+        ) as zf:
+            batches = chart_crud.iter_export_batches(
+                db,
+                user_id=user_id,
+                chart_ids=chart_ids,
+                since=since,
+                status=status,
+                batch_size=settings.export_zip_batch_size,
+            )
+            for batch in batches:
+                # серии всей пачки одним запросом, а не по запросу на chart
+                docs = series_store.load_many(
+                    db, {row.id: row.result_json for row in batch if not row.archive_sha256}
+                )
+                for row in batch:
+                    entry: dict[str, Any] = {
+                        "id": row.id,
+                        "status": row.status,
+                        "original_filename": row.original_filename,
+                        "created_at": row.created_at.isoformat() if row.created_at else None,
+                        "files": [],
+                    }
+                    manifest.append(entry)
+
+                    # архивированный документ читается из файла, в строку не возвращается
+                    if row.archive_sha256:
+                        doc = result_archiver.load_readonly(row.archive_sha256, row.result_json)
+                    else:
+                        doc = docs[row.id]
+                    panels = _parse_panels(doc)
+                    data = _render_data(panels, fmt) if panels else None
+                    if data is None:
+                        entry["error"] = "Export is not available"
+                    else:
+                        arcname = f"chart_{row.id}/{data_name}"
+                        zf.writestr(arcname, data)
+                        entry["files"].append(arcname)
+                        yield buf.drain()
+
+                    files = _chart_files(
+                        row,
+                        include_originals=include_originals,
+                        include_artifacts=include_artifacts,
+                    )
+                    for arcname, path in files:
+                        # открываем до начала записи в архив: файл мог исчезнуть (GC)
+                        try:
+                            src = path.open("rb")
+                        except OSError:
+                            logger.warning("export.zip: cannot open %s", path, exc_info=True)
+                            continue
+                        with src:
+                            yield from _write_file(zf, buf, arcname, src, path.suffix.lower())
+                        entry["files"].append(arcname)
+
+            zf.writestr(
+                "manifest.json",
+                json.dumps({"charts": manifest}, ensure_ascii=False, indent=2),
+            )
+        yield buf.drain()
+    finally:
+        db.close()
@@ -0,0 +1,385 @@
+"""
+Результат chart по строкам: серии в chart_series, остальное — в charts.result_json.
+
+split_result() выносит из документа серии вида {"id", "name", "style", "points"},
+оставляя на их месте ссылки {"id", "name"}; assemble_result() собирает документ
+обратно. Серии с другими ключами, невалидными точками или повторным id остаются
+в result_json как есть: такой документ тоже собирается без потерь.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any, Iterable, Optional
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from app.db.crud.series import series_crud
+from app.schemas.chart import ChartPatchOp, JsonPatchOp, ReplaceSeriesOp
+from app.schemas.ml import to_points_array
+from app.utils.json_patch import JsonPatchError, Path, get_at, parse_pointer
+
+# формат chart_series.points: x0, y0, x1, y1, ... (тот же пишет ml-worker)
+POINTS_DTYPE = np.dtype("<f8")
+
+_SERIES_KEYS = frozenset({"id", "name", "style", "points"})
+
+SeriesKey = tuple[str, str]
+
+
+def encode_points(points: np.ndarray) -> bytes:
+    return np.ascontiguousarray(points, dtype=POINTS_DTYPE).tobytes()
+
+
+def decode_points(data: bytes) -> np.ndarray:
+    # psycopg2 отдаёт bytea как memoryview — frombuffer берёт его без копии;
+    # astype копирует только на big-endian машине (orjson сериализует лишь нативный порядок)
+    return np.frombuffer(data, dtype=POINTS_DTYPE).astype(np.float64, copy=False).reshape(-1, 2)
+
+
+@dataclass
+class SeriesRow:
+    panel_id: str
+    series_id: str
+    name: Optional[str]
+    style: Any
+    points: np.ndarray  # (n, 2) float64
+
+    @property
+    def key(self) -> SeriesKey:
+        return self.panel_id, self.series_id
+
+    def ref(self) -> dict[str, Any]:
+        return {"id": self.series_id, "name": self.name}
+
+    def values(self) -> dict[str, Any]:
+        """
+        Колонки chart_series без chart_id.
+        """
+        return {
+            "panel_id": self.panel_id,
+            "series_id": self.series_id,
+            **series_values(self.name, self.style, self.points),
+        }
+
+
+def series_values(name: Optional[str], style: Any, points: np.ndarray) -> dict[str, Any]:
+    empty = len(points) == 0
+    return {
+        "name": name,
+        "style": style,
+        "points": encode_points(points),
+        "point_count": len(points),
+        "x_min": None if empty else float(points[:, 0].min()),
+        "x_max": None if empty else float(points[:, 0].max()),
+        "y_min": None if empty else float(points[:, 1].min()),
+        "y_max": None if empty else float(points[:, 1].max()),
+    }
+
+
+def _series_row(panel_id: str, series: Any) -> Optional[SeriesRow]:
+    if not isinstance(series, dict) or "points" not in series or not _SERIES_KEYS.issuperset(series):
+        return None
+    series_id, name = series.get("id"), series.get("name")
+    if not isinstance(series_id, str) or not (name is None or isinstance(name, str)):
+        return None
+    try:
+        points = to_points_array(series["points"])
+    except ValueError:
+        return None
+    return SeriesRow(panel_id, series_id, name, series.get("style"), points)
+
+
+def split_result(doc: Any, *, reserved: Iterable[SeriesKey] = ()) -> tuple[Any, list[SeriesRow]]:
+    """
+    Документ -> (result_json со ссылками на серии, строки chart_series).
+    reserved — ключи ссылок, которые уже есть в документе (PATCH): серия с таким
+    ключом остаётся в result_json, чтобы не перезаписать строку ссылки.
+    Исходный документ не меняется.
+    """
+    if not isinstance(doc, dict) or not isinstance(doc.get("panels"), list):
+        return doc, []
+
+    rows: list[SeriesRow] = []
+    seen: set[SeriesKey] = set(reserved)
+    panels: list[Any] = []
+    for panel in doc["panels"]:
+        panel_id = panel.get("id") if isinstance(panel, dict) else None
+        if not isinstance(panel_id, str) or not isinstance(panel.get("series"), list):
+            panels.append(panel)
+            continue
+
+        series_list: list[Any] = []
+        for series in panel["series"]:
+            row = _series_row(panel_id, series)
+            if row is None or row.key in seen:
+                series_list.append(series)
+                continue
+            seen.add(row.key)
+            rows.append(row)
+            series_list.append(row.ref())
+        panels.append({**panel, "series": series_list})
+
+    return {**doc, "panels": panels}, rows
+
+
+def _full_series(series_id: Any, row: Any) -> dict[str, Any]:
+    return {
+        "id": series_id,
+        "name": row.name,
+        "style": row.style,
+        "points": decode_points(row.points).tolist(),
+    }
+
+
+def assemble_result(
+    result_json: Any,
+    rows: Iterable[Any],
+    *,
+    panel_id: Optional[str] = None,
+    series_id: Optional[str] = None,
+) -> Any:
+    """
+    result_json + строки chart_series -> полный документ (точки — списки [x, y]).
+    С panel_id/series_id в панелях остаются только подходящие серии — так экспорт
+    одной серии читает одну строку chart_series. Фильтр тот же, что в app.utils.export.
+    """
+    if not isinstance(result_json, dict) or not isinstance(result_json.get("panels"), list):
+        return result_json
+
+    by_key = {(r.panel_id, r.series_id): r for r in rows}
+    panels: list[Any] = []
+    for panel in result_json["panels"]:
+        if not isinstance(panel, dict) or not isinstance(panel.get("series"), list):
+            panels.append(panel)
+            continue
+
+        pid = panel.get("id")
+        series_list: list[Any] = []
+        for series in panel["series"]:
+            sid = series.get("id") if isinstance(series, dict) else None
+            if (panel_id and pid != panel_id) or (series_id and sid != series_id):
+                continue
+            row = by_key.get((pid, sid)) if isinstance(series, dict) and "points" not in series else None
+            if row is None:
+                series_list.append(series)
+                continue
+            series_list.append(_full_series(sid, row))
+        panels.append({**panel, "series": series_list})
+
+    return {**result_json, "panels": panels}
+
+
+def find_ref(result_json: Any, panel_id: str, series_id: str) -> Optional[dict[str, Any]]:
+    """
+    Первая серия с такими id в result_json: ссылка (без "points") или серия,
+    оставшаяся в документе целиком.
+    """
+    panels = result_json.get("panels") if isinstance(result_json, dict) else None
+    for panel in panels if isinstance(panels, list) else ():
+        if isinstance(panel, dict) and panel.get("id") == panel_id:
+            for series in panel.get("series") or ():
+                if isinstance(series, dict) and series.get("id") == series_id:
+                    return series
+    return None
+
+
+def rename_ref(result_json: dict[str, Any], panel_id: str, series_id: str, name: Optional[str]) -> dict[str, Any]:
+    """
+    Копия result_json с новым именем в ссылке на серию (имя нужно поиску по сериям).
+    """
+    ref = find_ref(result_json, panel_id, series_id)
+    panels = []
+    for panel in result_json["panels"]:
+        if isinstance(panel, dict) and panel.get("id") == panel_id:
+            panel = {**panel, "series": [{**s, "name": name} if s is ref else s for s in panel["series"]]}
+        panels.append(panel)
+    return {**result_json, "panels": panels}
+
+
+def changed_rows(old: Iterable[Any], new: list[SeriesRow]) -> tuple[list[SeriesRow], list[SeriesKey]]:
+    """
+    Что записать после правки документа: новые и изменённые серии, ключи удалённых.
+    """
+    old_by_key = {(r.panel_id, r.series_id): r for r in old}
+    changed: list[SeriesRow] = []
+    for row in new:
+        prev = old_by_key.pop(row.key, None)
+        if (
+            prev is None
+            or prev.name != row.name
+            or prev.style != row.style
+            or bytes(prev.points) != encode_points(row.points)
+        ):
+            changed.append(row)
+    return changed, list(old_by_key)
+
+
+def _dict_ids(node: Any) -> set[int]:
+    """
+    id() всех dict в поддереве; в точки серий не спускаемся.
+    """
+    out: set[int] = set()
+    stack = [node]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, dict):
+            out.add(id(item))
+            stack.extend(v for k, v in item.items() if k != "points")
+        elif isinstance(item, list):
+            stack.extend(item)
+    return out
+
+
+class SeriesLoader:
+    """
+    Точки для PATCH по мере надобности. Операции применяются к result_json со
+    ссылками; серия читается из chart_series и разворачивается на месте ссылки,
+    только когда операция лезет внутрь неё, переносит/копирует/сравнивает поддерево
+    с ней или меняет id её панели. Работа пропорциональна правке, а не документу.
+    Ссылки узнаются по identity: документ — своя копия result_json.
+    """
+
+    def __init__(self, db: Session, chart_id: int, doc: Any) -> None:
+        self.db = db
+        self.chart_id = chart_id
+        # id(ссылки) -> ссылка; объекты держим, чтобы id не переиспользовались
+        self._refs: dict[int, dict[str, Any]] = {}
+        self.original_keys: set[SeriesKey] = set()
+        for panel_id, ref in self._iter_refs(doc):
+            self._refs[id(ref)] = ref
+            self.original_keys.add((panel_id, ref.get("id")))
+        # строки, развёрнутые в документ, — для changed_rows
+        self.loaded: list[Any] = []
+
+    @staticmethod
+    def _iter_refs(doc: Any) -> Iterable[tuple[Any, dict[str, Any]]]:
+        panels = doc.get("panels") if isinstance(doc, dict) else None
+        for panel in panels if isinstance(panels, list) else ():
+            if not isinstance(panel, dict) or not isinstance(panel.get("series"), list):
+                continue
+            for series in panel["series"]:
+                if isinstance(series, dict) and "points" not in series:
+                    yield panel.get("id"), series
+
+    def is_stored(self, series: Any) -> bool:
+        return id(series) in self._refs
+
+    def kept_keys(self, doc: Any) -> set[SeriesKey]:
+        """
+        Ключи ссылок, оставшихся в документе нетронутыми.
+        """
+        return {(panel_id, ref.get("id")) for panel_id, ref in self._iter_refs(doc) if self.is_stored(ref)}
+
+    def before_op(self, doc: Any, op: ChartPatchOp) -> None:
+        if isinstance(op, ReplaceSeriesOp):
+            # серия заменяется целиком, старые точки не нужны
+            return
+        if not isinstance(op, JsonPatchOp):
+            self._expand(doc, lambda panel_id, ref: panel_id == op.panel_id and ref.get("id") == op.series_id)
+            return
+        try:
+            if op.op in ("move", "copy"):
+                self._expand_subtree(doc, parse_pointer(op.from_ or ""))
+            if op.op == "test":
+                self._expand_subtree(doc, parse_pointer(op.path))
+            else:
+                self._expand_into(doc, parse_pointer(op.path))
+        except JsonPatchError:
+            # ошибку в пути покажет сама операция
+            return
+
+    def _expand_into(self, doc: Any, path: Path) -> None:
+        if len(path) >= 5 and path[0] == "panels" and path[2] == "series":
+            self._expand_subtree(doc, path[:4])
+        elif len(path) == 3 and path[0] == "panels" and path[2] == "id":
+            # у ссылок панели меняется ключ
+            self._expand_subtree(doc, path[:2])
+
+    def _expand_subtree(self, doc: Any, path: Path) -> None:
+        if len(path) >= 5 and path[0] == "panels" and path[2] == "series":
+            # путь внутрь серии: у ссылки его ещё нет, разворачиваем серию целиком
+            path = path[:4]
+        try:
+            inside = _dict_ids(get_at(doc, path))
+        except JsonPatchError:
+            return
+        self._expand(doc, lambda panel_id, ref: id(ref) in inside)
+
+    def _expand(self, doc: Any, match) -> None:
+        targets = [
+            (panel_id, ref)
+            for panel_id, ref in self._iter_refs(doc)
+            if self.is_stored(ref) and match(panel_id, ref)
+        ]
+        if not targets:
+            return
+        rows = series_crud.list_keys(self.db, self.chart_id, list({(p, r.get("id")) for p, r in targets}))
+        by_key = {(r.panel_id, r.series_id): r for r in rows}
+        self.loaded.extend(rows)
+
+        full = {}
+        for panel_id, ref in targets:
+            del self._refs[id(ref)]
+            row = by_key.get((panel_id, ref.get("id")))
+            if row is not None:
+                full[id(ref)] = _full_series(ref.get("id"), row)
+        for panel in doc["panels"]:
+            if isinstance(panel, dict) and isinstance(panel.get("series"), list):
+                for i, series in enumerate(panel["series"]):
+                    if id(series) in full:
+                        panel["series"][i] = full[id(series)]
+
+
+class SeriesStore:
+    """
+    Чтение и запись результата chart через chart_series. Без commit:
+    вызывающий пишет charts в той же транзакции.
+    """
+
+    def load(
+        self,
+        db: Session,
+        chart_id: int,
+        result_json: Any,
+        *,
+        panel_id: Optional[str] = None,
+        series_id: Optional[str] = None,
+    ) -> Any:
+        rows = series_crud.list_for_charts(db, [chart_id], panel_id=panel_id, series_id=series_id)
+        return assemble_result(result_json, rows, panel_id=panel_id, series_id=series_id)
+
+    def load_many(self, db: Session, results: dict[int, Any]) -> dict[int, Any]:
+        """
+        Полные документы нескольких charts: серии всех charts одним запросом.
+        """
+        by_chart: dict[int, list[Any]] = {}
+        for row in series_crud.list_for_charts(db, list(results)):
+            by_chart.setdefault(row.chart_id, []).append(row)
+        return {
+            chart_id: assemble_result(result_json, by_chart.get(chart_id, ()))
+            for chart_id, result_json in results.items()
+        }
+
+    def load_for_user(self, db: Session, *, user_id: int, results: dict[int, Any]) -> dict[int, Any]:
+        """
+        Полные документы для списка charts пользователя: все серии одним запросом.
+        """
+        by_chart: dict[int, list[Any]] = {}
+        for row in series_crud.list_for_user(db, user_id=user_id):
+            by_chart.setdefault(row.chart_id, []).append(row)
+        return {
+            chart_id: assemble_result(result_json, by_chart.get(chart_id, ()))
+            for chart_id, result_json in results.items()
+        }
+
+    def replace(self, db: Session, chart_id: int, rows: list[SeriesRow]) -> None:
+        """
+        Серии chart становятся ровно rows (PUT /result_json). Строку charts вызывающий
+        обновляет раньше: блокировки charts -> chart_series в одном порядке везде.
+        """
+        series_crud.delete_except(db, chart_id, [r.key for r in rows])
+        series_crud.upsert(db, chart_id, [r.values() for r in rows])
+
+
+series_store = SeriesStore()
@@ -1,13 +1,45 @@
-from pathlib import Path
+import copy
+from dataclasses import dataclass
+import mimetypes
+from pathlib import Path, PurePosixPath
+import zipfile
+import zlib
 
 from fastapi import HTTPException, UploadFile, status
 from fastapi.concurrency import run_in_threadpool
+from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from app.core.config import settings
-from app.db.crud.chart import chart_crud
-from app.schemas.chart import ChartCreateResponse, ChartStatus
-from app.utils.hashing import sha256_bytes
+from app.db.crud.chart import async_chart_crud, chart_crud
+from app.db.crud.queue import queue_crud
+from app.db.crud.series import series_crud
+from app.db.models.chart import Chart
+from app.schemas.chart import (
+    ChartBatchError,
+    ChartBatchUploadResponse,
+    ChartCreateResponse,
+    ChartPatchRequest,
+    ChartPatchResponse,
+    ChartSeriesUpdate,
+    ChartSeriesUpdateResponse,
+    ChartStatus,
+)
+from app.schemas.ml import Series
+from app.services import result_patch
+from app.services.admission import admission
+from app.services.archive import access_tracker, result_archiver
+from app.services.chart_series import (
+    SeriesLoader,
+    changed_rows,
+    find_ref,
+    rename_ref,
+    series_values,
+    split_result,
+)
+from app.services.renditions import rendition_service
+from app.services.storage import StagedFile, blob_store
 
 
 def _safe_filename(name: str) -> str:
@@ -15,13 +47,160 @@ def _safe_filename(name: str) -> str:
     return cleaned[:200] or "upload.bin"
 
 
-def _max_upload_bytes() -> int:
-    raw = getattr(settings, "max_upload_bytes", 10 * 1024 * 1024)
+# error_message отменённого chart; воркер пишет то же для running
+CANCELLED_MESSAGE = "Cancelled"
+
+_ZIP_MIME_TYPES = {"application/zip", "application/x-zip-compressed"}
+_IMAGE_EXTS = {".png", ".jpg", ".jpeg", ".webp", ".bmp", ".gif", ".tif", ".tiff"}
+
+
+def _file_ext(filename: str) -> str:
+    return Path(filename).suffix.lower() or ".bin"
+
+
+def _is_zip(upload: UploadFile) -> bool:
+    name = (upload.filename or "").lower()
+    return name.endswith(".zip") or (upload.content_type or "").lower() in _ZIP_MIME_TYPES
+
+
+def _too_many_files(max_files: int) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"Too many files in batch (max {max_files})",
+    )
+
+
+def _batch_too_large() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"Batch is too large (max {settings.max_batch_bytes} bytes)",
+    )
+
+
+def _version_conflict(current: int | None) -> HTTPException:
+    detail = "result_json was changed by another save, reload and retry"
+    if current is not None:
+        detail += f" (current version {current})"
+    return HTTPException(status_code=status.HTTP_409_CONFLICT, detail=detail)
+
+
+@dataclass
+class _BatchEntry:
+    index: int
+    filename: str
+    mime_type: str
+    staged: StagedFile | None = None
+    error: str | None = None
+
+
+def _zip_files(zf: zipfile.ZipFile) -> list[zipfile.ZipInfo]:
+    """
+    Файлы архива без каталогов, служебных __MACOSX/ и скрытых.
+    """
+    files = []
+    for info in zf.infolist():
+        base = PurePosixPath(info.filename).name
+        if info.is_dir() or info.filename.startswith("__MACOSX/") or base.startswith("."):
+            continue
+        files.append(info)
+    return files
+
+
+def _count_zip_images(upload: UploadFile) -> int:
+    """
+    Сколько charts даст ZIP — по центральному каталогу, без распаковки.
+    Битый архив — 0: ошибку покажет _stage_zip. Вызывать из threadpool.
+    """
+    if upload.size is not None and upload.size > settings.max_batch_bytes:
+        return 0
     try:
-        value = int(raw)
-    except (TypeError, ValueError):
-        value = 10 * 1024 * 1024
-    return max(value, 1)
+        upload.file.seek(0)
+        with zipfile.ZipFile(upload.file) as zf:
+            return sum(
+                1
+                for info in _zip_files(zf)
+                if _file_ext(info.filename) in _IMAGE_EXTS and info.file_size <= settings.max_upload_bytes
+            )
+    except zipfile.BadZipFile:
+        return 0
+
+
+def _stage_zip(upload: UploadFile, start_index: int, max_files: int, budget: int) -> list[_BatchEntry]:
+    """
+    Разбирает ZIP из уже принятой загрузки (UploadFile.file seekable).
+    Каждый файл архива стримится в temp с хэшированием, как обычная загрузка.
+    budget — сколько байт ещё можно распаковать в пакете (MAX_BATCH_BYTES минус
+    уже принятое); при превышении — 413, распакованное удаляется.
+    Вызывать из threadpool.
+    """
+    entries: list[_BatchEntry] = []
+    archive_name = _safe_filename(upload.filename or "upload.zip")
+
+    if upload.size is not None and upload.size > settings.max_batch_bytes:
+        return [
+            _BatchEntry(
+                index=start_index,
+                filename=archive_name,
+                mime_type="application/zip",
+                error=f"Archive is too large (max {settings.max_batch_bytes} bytes)",
+            )
+        ]
+
+    try:
+        upload.file.seek(0)
+        with zipfile.ZipFile(upload.file) as zf:
+            for info in _zip_files(zf):
+                base = PurePosixPath(info.filename).name
+                if start_index + len(entries) >= max_files:
+                    raise _too_many_files(max_files)
+
+                filename = _safe_filename(base)
+                entry = _BatchEntry(
+                    index=start_index + len(entries),
+                    filename=filename,
+                    mime_type=mimetypes.guess_type(filename)[0] or "application/octet-stream",
+                )
+                entries.append(entry)
+
+                if _file_ext(filename) not in _IMAGE_EXTS:
+                    entry.error = "Unsupported file type"
+                    continue
+                # file_size из заголовка — быстрая проверка; реальный размер проверит stage_fileobj
+                if info.file_size > settings.max_upload_bytes:
+                    entry.error = f"File is too large (max {settings.max_upload_bytes} bytes)"
+                    continue
+
+                try:
+                    with zf.open(info) as src:
+                        entry.staged = blob_store.stage_fileobj(src)
+                except HTTPException as e:
+                    entry.error = str(e.detail)
+                except (zipfile.BadZipFile, zlib.error, RuntimeError, NotImplementedError):
+                    entry.error = "Corrupted or unsupported archive entry"
+
+                if entry.staged is not None:
+                    budget -= entry.staged.size
+                    if budget < 0:
+                        raise _batch_too_large()
+    except zipfile.BadZipFile:
+        for entry in entries:
+            if entry.staged is not None:
+                blob_store.discard(entry.staged.tmp_path)
+        return [
+            _BatchEntry(
+                index=start_index,
+                filename=archive_name,
+                mime_type="application/zip",
+                error="Invalid ZIP archive",
+            )
+        ]
+    except BaseException:
+        for entry in entries:
+            if entry.staged is not None:
+                blob_store.discard(entry.staged.tmp_path)
+        raise
+
+    return entries
 
 
 def _parse_chart_status(raw_status: str) -> ChartStatus:
@@ -45,6 +224,7 @@ def _to_chart_response(chart) -> ChartCreateResponse:
         n_panels=chart.n_panels,
         n_series=chart.n_series,
         result_json=chart.result_json,
+        result_version=chart.result_version or 0,
         error_message=chart.error_message,
     )
 
@@ -52,58 +232,29 @@ def _to_chart_response(chart) -> ChartCreateResponse:
 class ChartService:
     async def upload_and_enqueue(
         self,
-        db: Session,
+        db: AsyncSession,
         *,
         user_id: int,
         upload: UploadFile,
     ) -> ChartCreateResponse:
-        original_path: Path | None = None
-        wrote_new_file = False
+        staged: StagedFile | None = None
 
         try:
-            max_bytes = _max_upload_bytes()
-            buf = bytearray()
-
-            while True:
-                chunk = await upload.read(1024 * 1024)
-                if not chunk:
-                    break
-                buf.extend(chunk)
-                if len(buf) > max_bytes:
-                    raise HTTPException(
-                        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
-                        detail=f"File is too large (max {max_bytes} bytes)",
-                    )
-
-            if not buf:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="Empty file",
-                )
+            # до записи в storage/: при перегрузке файл не занимает диск
+            await admission.admit(db, user_id=user_id)
+            staged = await blob_store.stage(upload)
+            sha = staged.sha256
 
-            file_bytes = bytes(buf)
-            sha = sha256_bytes(file_bytes)
             filename = _safe_filename(upload.filename or "upload.bin")
             ext = Path(filename).suffix.lower() or ".bin"
 
-            base_dir = Path(settings.storage_dir).resolve()
-            base_dir.mkdir(parents=True, exist_ok=True)
-
-            original_path = (base_dir / f"user_{user_id}" / f"{sha}{ext}").resolve()
-            if original_path != base_dir and base_dir not in original_path.parents:
-                raise HTTPException(
-                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                    detail="Invalid storage path",
-                )
-
-            original_path.parent.mkdir(parents=True, exist_ok=True)
-
-            if not original_path.exists():
-                await run_in_threadpool(original_path.write_bytes, file_bytes)
-                wrote_new_file = True
-
+            original_path: Path | None = None
+            wrote_new_file = False
             try:
-                chart = chart_crud.create(
+                original_path, wrote_new_file = await blob_store.acquire(db, staged, ext)
+                staged = None
+
+                chart = await async_chart_crud.create(
                     db,
                     user_id=user_id,
                     original_filename=filename,
@@ -113,15 +264,344 @@ class ChartService:
                     status=ChartStatus.uploaded.value,
                 )
             except Exception:
-                db.rollback()
+                await db.rollback()
                 if wrote_new_file and original_path is not None:
-                    try:
-                        await run_in_threadpool(original_path.unlink)
-                    except FileNotFoundError:
-                        pass
+                    await run_in_threadpool(blob_store.discard, original_path)
                 raise
 
+            admission.admitted(1)
+            rendition_service.schedule(original_path)
             return _to_chart_response(chart)
 
         finally:
-            await upload.close()
\ No newline at end of file
+            if staged is not None:
+                await run_in_threadpool(blob_store.discard, staged.tmp_path)
+            await upload.close()
+
+    async def upload_batch(
+        self,
+        db: AsyncSession,
+        *,
+        user_id: int,
+        uploads: list[UploadFile],
+    ) -> ChartBatchUploadResponse:
+        """
+        Пакетная загрузка: отдельные файлы и/или ZIP-архивы.
+        Все файлы сначала стримятся в temp, потом блобы и charts создаются
+        одной транзакцией. Ошибки отдельных файлов не валят всю пачку.
+        """
+        max_files = settings.max_batch_files
+        entries: list[_BatchEntry] = []
+        # всё, что уже лежит в temp: отдельные файлы и распакованное из ZIP
+        staged_bytes = 0
+
+        try:
+            # ZIP сначала считается одним файлом; его содержимое доплачивается
+            # по центральному каталогу до распаковки
+            allowance = await admission.admit(db, user_id=user_id, n_files=len(uploads))
+            batch_files = len(uploads)
+
+            for upload in uploads:
+                if _is_zip(upload):
+                    n_images = await run_in_threadpool(_count_zip_images, upload)
+                    batch_files += n_images - 1
+                    await admission.admit_extra(
+                        db,
+                        user_id=user_id,
+                        n_extra=n_images - 1,
+                        batch_files=batch_files,
+                    )
+                    zip_entries = await run_in_threadpool(
+                        _stage_zip,
+                        upload,
+                        len(entries),
+                        max_files,
+                        settings.max_batch_bytes - staged_bytes,
+                    )
+                    entries.extend(zip_entries)
+                    staged_bytes += sum(e.staged.size for e in zip_entries if e.staged is not None)
+                    continue
+
+                if len(entries) >= max_files:
+                    raise _too_many_files(max_files)
+
+                filename = _safe_filename(upload.filename or "upload.bin")
+                entry = _BatchEntry(
+                    index=len(entries),
+                    filename=filename,
+                    mime_type=upload.content_type or "application/octet-stream",
+                )
+                entries.append(entry)
+                try:
+                    entry.staged = await blob_store.stage(upload)
+                except HTTPException as e:
+                    entry.error = str(e.detail)
+                    continue
+                staged_bytes += entry.staged.size
+                if staged_bytes > settings.max_batch_bytes:
+                    # принятое раньше удалит finally
+                    raise _batch_too_large()
+
+            ok = [e for e in entries if e.staged is not None]
+            if allowance is not None:
+                for e in ok[allowance:]:
+                    e.error = "Too many charts waiting for processing"
+                    await run_in_threadpool(blob_store.discard, e.staged.tmp_path)
+                    e.staged = None
+                ok = ok[:allowance]
+            if ok:
+                await admission.check_queue(db, len(ok))
+            ids: list[int] = []
+
+            if ok:
+                created: list[Path] = []
+                try:
+                    paths, created = await blob_store.acquire_many(
+                        db,
+                        [(e.staged, _file_ext(e.filename)) for e in ok],
+                    )
+                    ids = await async_chart_crud.create_many(
+                        db,
+                        [
+                            {
+                                "user_id": user_id,
+                                "original_filename": e.filename,
+                                "mime_type": e.mime_type,
+                                "sha256": e.staged.sha256,
+                                "original_path": str(path),
+                                "status": ChartStatus.uploaded.value,
+                            }
+                            for e, path in zip(ok, paths)
+                        ],
+                    )
+                except Exception:
+                    await db.rollback()
+                    for path in created:
+                        await run_in_threadpool(blob_store.discard, path)
+                    raise
+
+                admission.admitted(len(ids))
+                for path in dict.fromkeys(paths):
+                    rendition_service.schedule(path)
+
+            return ChartBatchUploadResponse(
+                ids=ids,
+                errors=[
+                    ChartBatchError(index=e.index, filename=e.filename, detail=e.error)
+                    for e in entries
+                    if e.error is not None
+                ],
+            )
+
+        finally:
+            # temp-файлы, которые не были перенесены в blobs/ (ошибка или откат)
+            for e in entries:
+                if e.staged is not None:
+                    await run_in_threadpool(blob_store.discard, e.staged.tmp_path)
+            for upload in uploads:
+                await upload.close()
+
+    def delete_chart(self, db: Session, chart: Chart) -> None:
+        """
+        Удаление chart: ссылка на блоб отпускается в той же транзакции,
+        сам файл и charts/<id>/ удалит фоновый сборщик. Задача в chart_jobs
+        удаляется каскадом — воркер, который её выполняет, считает это отменой.
+        """
+        sha, original_path = chart.sha256, chart.original_path
+        chart_crud.delete(db, chart)
+        blob_store.release_legacy_copy(db, sha256=sha, original_path=original_path)
+
+    def cancel_chart(self, db: Session, chart: Chart) -> Chart:
+        """
+        Отмена обработки: ожидающая задача снимается сразу, выполняемую
+        воркер остановит при следующей проверке флага (CANCEL_CHECK_SECONDS).
+        """
+        state = queue_crud.cancel_job(db, chart_id=chart.id, message=CANCELLED_MESSAGE)
+        if state is None:
+            raise HTTPException(status_code=409, detail="Chart is not queued or processing")
+        db.commit()
+        db.refresh(chart)
+        return chart
+
+    def rehydrate(self, db: Session, chart_id: int, sha: str) -> None:
+        """
+        Возвращает архивированный result_json в строку (см. app.services.archive).
+        """
+        try:
+            result_archiver.rehydrate(db, chart_id, sha)
+        except (OSError, ValueError):
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Archived result is not available",
+            )
+
+    def get_series(
+        self,
+        db: Session,
+        *,
+        chart_id: int,
+        user_id: int,
+        panel_id: str,
+        series_id: str,
+    ):
+        """
+        Одна серия одним запросом (chart_series по первичному ключу).
+        """
+        def fetch():
+            return series_crud.get_with_chart(
+                db,
+                chart_id=chart_id,
+                user_id=user_id,
+                panel_id=panel_id,
+                series_id=series_id,
+            )
+
+        row = fetch()
+        if row is not None and row.archive_sha256:
+            self.rehydrate(db, chart_id, row.archive_sha256)
+            row = fetch()
+        if row is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Chart not found")
+        if row.series_id is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Series not found")
+        access_tracker.touch(chart_id)
+        return row
+
+    def update_series(
+        self,
+        db: Session,
+        *,
+        chart_id: int,
+        user_id: int,
+        panel_id: str,
+        series_id: str,
+        data: ChartSeriesUpdate,
+    ) -> ChartSeriesUpdateResponse:
+        """
+        Перезапись одной серии: UPDATE одной строки chart_series с проверкой её version.
+        Правки разных серий не конфликтуют; в charts растёт только result_version
+        (и имя в ссылке, если оно изменилось).
+        """
+        try:
+            series = Series.model_validate(
+                {"id": series_id, "name": data.name, "style": data.style, "points": data.points}
+            )
+        except (ValidationError, TypeError, ValueError):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid series")
+
+        chart = chart_crud.lock_result(db, chart_id=chart_id, user_id=user_id)
+        if chart is not None and chart.archive_sha256:
+            db.rollback()
+            self.rehydrate(db, chart_id, chart.archive_sha256)
+            chart = chart_crud.lock_result(db, chart_id=chart_id, user_id=user_id)
+        if chart is None:
+            db.rollback()
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Chart not found")
+        if chart.status != ChartStatus.done.value or not isinstance(chart.result_json, dict):
+            db.rollback()
+            raise HTTPException(status_code=409, detail="Chart is not ready for editing")
+
+        ref = find_ref(chart.result_json, panel_id, series_id)
+        if ref is None:
+            db.rollback()
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Series not found")
+        if "points" in ref:
+            # серия осталась в result_json (нестандартные поля) — правится через PATCH
+            db.rollback()
+            raise HTTPException(
+                status_code=409,
+                detail="Series is not stored separately, use PATCH /result_json",
+            )
+
+        new_version = series_crud.update_one(
+            db,
+            chart_id=chart_id,
+            panel_id=panel_id,
+            series_id=series_id,
+            version=data.version,
+            values=series_values(data.name, data.style, series.points),
+        )
+        if new_version is None:
+            db.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Series was changed by another save, reload and retry",
+            )
+
+        renamed = None
+        if ref.get("name") != data.name:
+            renamed = rename_ref(chart.result_json, panel_id, series_id, data.name)
+        result_version = chart_crud.bump_result_version(db, chart_id=chart_id, result_json=renamed)
+        db.commit()
+        access_tracker.touch(chart_id)
+
+        return ChartSeriesUpdateResponse(
+            chart_id=chart_id,
+            panel_id=panel_id,
+            id=series_id,
+            version=new_version,
+            point_count=len(series.points),
+            result_version=result_version,
+        )
+
+    def patch_result_json(
+        self,
+        db: Session,
+        *,
+        chart_id: int,
+        user_id: int,
+        data: ChartPatchRequest,
+    ) -> ChartPatchResponse:
+        """
+        Частичное сохранение правок редактора.
+        Валидируются только затронутые серии/панели; записываются только изменённые
+        строки chart_series и result_json (без точек), если он изменился.
+        Конкурирующее сохранение даёт 409.
+        """
+        row = chart_crud.get_result_for_patch(db, chart_id=chart_id, user_id=user_id)
+        if row is not None and row.archive_sha256:
+            self.rehydrate(db, chart_id, row.archive_sha256)
+            row = chart_crud.get_result_for_patch(db, chart_id=chart_id, user_id=user_id)
+        if row is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Chart not found")
+        if row.status != ChartStatus.done.value or not isinstance(row.result_json, dict):
+            raise HTTPException(status_code=409, detail="Chart is not ready for editing")
+        if row.result_version != data.version:
+            raise _version_conflict(row.result_version)
+
+        # копия: apply_ops меняет документ на месте, а row.result_json нужен для сравнения;
+        # точки подгружаются только у серий, которых касаются операции
+        doc = copy.deepcopy(row.result_json)
+        loader = SeriesLoader(db, chart_id, doc)
+        doc, check_paths = result_patch.apply_ops(doc, data.ops, before=loader.before_op)
+        result_patch.validate_paths(doc, check_paths, stored=loader.is_stored)
+        n_panels, n_series = result_patch.count_panels(doc)
+
+        kept = loader.kept_keys(doc)
+        result_json, rows = split_result(doc, reserved=kept)
+        changed, _ = changed_rows(loader.loaded, rows)
+        removed = list(loader.original_keys - kept - {r.key for r in rows})
+        # UPDATE charts первым: проверка версии и блокировка строки до записи серий
+        new_version = chart_crud.patch_result(
+            db,
+            chart_id=chart_id,
+            user_id=user_id,
+            version=data.version,
+            result_json=None if result_json == row.result_json else result_json,
+            n_panels=n_panels,
+            n_series=n_series,
+        )
+        if new_version is None:
+            db.rollback()
+            raise _version_conflict(None)
+        series_crud.upsert(db, chart_id, [r.values() for r in changed])
+        series_crud.delete_keys(db, chart_id, removed)
+        db.commit()
+        access_tracker.touch(chart_id)
+
+        return ChartPatchResponse(
+            id=chart_id,
+            result_version=new_version,
+            n_panels=n_panels,
+            n_series=n_series,
+        )
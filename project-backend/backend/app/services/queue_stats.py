@@ -0,0 +1,179 @@
+"""
+Телеметрия очереди обработки: глубина, возраст, скорость завершения, воркеры.
+
+Снимок строится несколькими дешёвыми запросами (app.db.crud.queue) и кэшируется
+на QUEUE_STATS_CACHE_SECONDS: админ-эндпоинт и /metrics не нагружают БД чаще.
+"""
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+import logging
+import threading
+import time
+from typing import Iterator, Optional
+
+from prometheus_client.core import GaugeMetricFamily
+
+from app.core.config import settings
+from app.db.crud.queue import queue_crud
+from app.db.session import SessionLocal
+from app.schemas.admin import QueueTelemetry, QueueWindowStats, WorkerInfo
+
+logger = logging.getLogger(__name__)
+
+
+def _age_seconds(oldest: Optional[datetime], now: datetime) -> Optional[float]:
+    return None if oldest is None else max((now - oldest).total_seconds(), 0.0)
+
+
+def _window_label(seconds: int) -> str:
+    if seconds % 3600 == 0:
+        return f"{seconds // 3600}h"
+    return f"{seconds // 60}m"
+
+
+class QueueStatsService:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._cached: Optional[QueueTelemetry] = None
+        self._cached_at = 0.0
+
+    def build(self, db) -> QueueTelemetry:
+        counts = queue_crud.status_counts(db)
+        oldest = queue_crud.oldest_created(db)
+        now: datetime = oldest["now"]
+
+        windows = []
+        for w in queue_crud.completion_stats(db):
+            seconds = int(w["window"].total_seconds())
+            q = w["turnaround"]
+            windows.append(
+                QueueWindowStats(
+                    window_seconds=seconds,
+                    done=w["done"],
+                    error=w["error"],
+                    completed_per_minute=(w["done"] + w["error"]) * 60.0 / seconds,
+                    turnaround_p50_seconds=q.get(0.5),
+                    turnaround_p90_seconds=q.get(0.9),
+                    turnaround_p99_seconds=q.get(0.99),
+                )
+            )
+
+        stale_before = now - timedelta(seconds=settings.worker_stale_seconds)
+        workers = [
+            WorkerInfo(
+                id=w.id,
+                hostname=w.hostname,
+                pid=w.pid,
+                started_at=w.started_at,
+                last_seen_at=w.last_seen_at,
+                alive=w.last_seen_at >= stale_before,
+                current_chart_id=w.current_chart_id,
+                jobs_done=int(w.jobs_done or 0),
+                jobs_failed=int(w.jobs_failed or 0),
+                jobs_per_minute=float(w.jobs_per_minute or 0.0),
+            )
+            for w in queue_crud.workers(db)
+        ]
+
+        return QueueTelemetry(
+            generated_at=now,
+            counts=counts,
+            oldest_uploaded_age_seconds=_age_seconds(oldest["uploaded"], now),
+            oldest_processing_age_seconds=_age_seconds(oldest["processing"], now),
+            windows=windows,
+            workers_alive=sum(1 for w in workers if w.alive),
+            workers=workers,
+        )
+
+    def snapshot(self) -> QueueTelemetry:
+        """
+        Кэшированный снимок; под блокировкой, чтобы параллельные запросы не строили его одновременно.
+        """
+        with self._lock:
+            ttl = settings.queue_stats_cache_seconds
+            if self._cached is not None and time.monotonic() - self._cached_at < ttl:
+                return self._cached
+
+            db = SessionLocal()
+            try:
+                self._cached = self.build(db)
+            finally:
+                db.close()
+            self._cached_at = time.monotonic()
+            return self._cached
+
+
+class QueueMetricsCollector:
+    """
+    Collector для prometheus_client: гейджи очереди из кэшированного снимка.
+    Ошибка БД не ломает /metrics — секция просто пропускается.
+    """
+
+    def __init__(self, service: QueueStatsService) -> None:
+        self._service = service
+
+    def describe(self) -> list:
+        # без describe() регистрация вызвала бы collect(), то есть запрос в БД при импорте
+        return []
+
+    def collect(self) -> Iterator[GaugeMetricFamily]:
+        try:
+            snap = self._service.snapshot()
+        except Exception:
+            logger.warning("queue telemetry unavailable", exc_info=True)
+            return
+
+        charts = GaugeMetricFamily("chart_queue_charts", "Charts by status", labels=["status"])
+        for status, n in sorted(snap.counts.items()):
+            charts.add_metric([status], n)
+        yield charts
+
+        oldest = GaugeMetricFamily(
+            "chart_queue_oldest_age_seconds",
+            "Age of the oldest chart in the status (0 when empty)",
+            labels=["status"],
+        )
+        oldest.add_metric(["uploaded"], snap.oldest_uploaded_age_seconds or 0.0)
+        oldest.add_metric(["processing"], snap.oldest_processing_age_seconds or 0.0)
+        yield oldest
+
+        completed = GaugeMetricFamily(
+            "chart_queue_completed",
+            "Charts finished within the trailing window",
+            labels=["window", "status"],
+        )
+        turnaround = GaugeMetricFamily(
+            "chart_queue_turnaround_seconds",
+            "created_at -> processed_at of done charts within the trailing window",
+            labels=["window", "quantile"],
+        )
+        for w in snap.windows:
+            label = _window_label(w.window_seconds)
+            completed.add_metric([label, "done"], w.done)
+            completed.add_metric([label, "error"], w.error)
+            for quantile, value in (
+                ("0.5", w.turnaround_p50_seconds),
+                ("0.9", w.turnaround_p90_seconds),
+                ("0.99", w.turnaround_p99_seconds),
+            ):
+                if value is not None:
+                    turnaround.add_metric([label, quantile], value)
+        yield completed
+        yield turnaround
+
+        yield GaugeMetricFamily("chart_workers_alive", "Workers with a recent heartbeat", value=snap.workers_alive)
+
+        per_minute = GaugeMetricFamily(
+            "chart_worker_jobs_per_minute",
+            "Jobs finished per minute over the last 5 minutes, as reported by the worker",
+            labels=["worker"],
+        )
+        for w in snap.workers:
+            if w.alive:
+                per_minute.add_metric([w.id], w.jobs_per_minute)
+        yield per_minute
+
+
+queue_stats = QueueStatsService()
+queue_metrics_collector = QueueMetricsCollector(queue_stats)
@@ -0,0 +1,151 @@
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import os
+from pathlib import Path
+import tempfile
+import threading
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Фиксированный набор размеров (длинная сторона, px): кэш не растёт от произвольных ?size=
+THUMB_SIZES = (160, 320, 640)
+THUMB_MEDIA_TYPE = "image/webp"
+
+# большие сканы не должны съедать память при декодировании
+Image.MAX_IMAGE_PIXELS = 64 * 1024 * 1024
+
+
+def pick_size(requested: int | None) -> int:
+    """
+    Ближайший размер из THUMB_SIZES не меньше запрошенного (или наибольший).
+    """
+    if requested is None:
+        return THUMB_SIZES[1]
+    for size in THUMB_SIZES:
+        if size >= requested:
+            return size
+    return THUMB_SIZES[-1]
+
+
+def thumb_path(source: Path, size: int) -> Path:
+    """
+    Превью лежит рядом с исходником: blobs/ab/<sha>.png -> blobs/ab/<sha>.thumb_320.webp.
+    """
+    return source.with_name(f"{source.stem}.thumb_{size}.webp")
+
+
+def thumb_paths(source: Path) -> list[Path]:
+    return [thumb_path(source, size) for size in THUMB_SIZES]
+
+
+def _prepare(img: Image.Image) -> Image.Image:
+    img = ImageOps.exif_transpose(img)
+    if img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info):
+        return img.convert("RGBA")
+    return img.convert("RGB")
+
+
+def _save_atomic(img: Image.Image, dst: Path) -> None:
+    # temp в storage/tmp: тот же том (атомарный rename), брошенные файлы чистит сборщик
+    tmp_dir = Path(settings.storage_dir).resolve() / "tmp"
+    tmp_dir.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(prefix="thumb_", suffix=".part", dir=tmp_dir)
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            img.save(fh, format="WEBP", quality=settings.thumb_quality, method=4)
+        os.replace(tmp_name, dst)
+    except BaseException:
+        Path(tmp_name).unlink(missing_ok=True)
+        raise
+
+
+def render(source: Path, sizes: tuple[int, ...] = THUMB_SIZES) -> list[Path]:
+    """
+    Создаёт недостающие превью для source. Исходник декодируется один раз,
+    размеры считаются от большего к меньшему. Уже существующие файлы не трогаем.
+    """
+    missing = [s for s in sorted(sizes, reverse=True) if not thumb_path(source, s).exists()]
+    if not missing:
+        return []
+
+    created: list[Path] = []
+    with Image.open(source) as opened:
+        # draft() для JPEG декодирует сразу в уменьшенном масштабе
+        opened.draft("RGB", (missing[0], missing[0]))
+        img = _prepare(opened)
+        for size in missing:
+            img.thumbnail((size, size), Image.Resampling.LANCZOS)
+            dst = thumb_path(source, size)
+            _save_atomic(img, dst)
+            created.append(dst)
+    return created
+
+
+def remove_thumbs(source: Path) -> None:
+    for p in thumb_paths(source):
+        p.unlink(missing_ok=True)
+
+
+class RenditionService:
+    """
+    Фоновая генерация превью после загрузки.
+    Pillow отпускает GIL на декодировании/ресайзе/кодировании, поэтому хватает потоков.
+    Если пул не запущен (скрипты, отключено настройкой) — schedule() ничего не делает,
+    превью создастся лениво при первом запросе.
+    """
+
+    def __init__(self) -> None:
+        self._executor: ThreadPoolExecutor | None = None
+        self._lock = threading.Lock()
+        self._pending: set[Path] = set()
+
+    def start(self) -> None:
+        with self._lock:
+            if self._executor is None and settings.thumb_workers > 0:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=settings.thumb_workers,
+                    thread_name_prefix="thumbs",
+                )
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def schedule(self, source: Path) -> None:
+        with self._lock:
+            if self._executor is None or source in self._pending:
+                return
+            self._pending.add(source)
+            self._executor.submit(self._run, source)
+
+    def _run(self, source: Path) -> None:
+        try:
+            render(source)
+        except (OSError, UnidentifiedImageError, Image.DecompressionBombError) as e:
+            logger.info("thumbnails skipped for %s: %s", source, e)
+        except Exception:
+            logger.exception("thumbnail generation failed for %s", source)
+        finally:
+            with self._lock:
+                self._pending.discard(source)
+
+    def ensure(self, source: Path, size: int) -> Path:
+        """
+        Путь к превью нужного размера; при промахе генерируем синхронно
+        (вызывать из threadpool). Заодно создаются остальные размеры.
+        """
+        dst = thumb_path(source, size)
+        if not dst.is_file():
+            render(source)
+        return dst
+
+
+rendition_service = RenditionService()
@@ -0,0 +1,164 @@
+from __future__ import annotations
+
+from typing import Any, Callable, Optional
+
+from fastapi import HTTPException, status
+from pydantic import ValidationError
+
+from app.schemas.chart import ChartPatchOp, DeletePointsOp, InsertPointsOp, ReplaceSeriesOp
+from app.schemas.ml import Panel, Series, to_points_array
+from app.utils.json_patch import JsonPatchError, Path, apply_op, get_at, minimize_paths
+
+MAX_PATCH_OPS = 1000
+
+
+def _bad_request(detail: str) -> HTTPException:
+    return HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=detail)
+
+
+def _series_index(doc: dict[str, Any], panel_id: str, series_id: str) -> tuple[int, int]:
+    panels = doc.get("panels")
+    if not isinstance(panels, list):
+        raise _bad_request("Invalid panels")
+    for pi, panel in enumerate(panels):
+        if isinstance(panel, dict) and panel.get("id") == panel_id:
+            for si, series in enumerate(panel.get("series") or []):
+                if isinstance(series, dict) and series.get("id") == series_id:
+                    return pi, si
+            raise _bad_request(f"Series not found: {panel_id}/{series_id}")
+    raise _bad_request(f"Panel not found: {panel_id}")
+
+
+def _validated_points(raw: list[Any]) -> list[list[float]]:
+    try:
+        return to_points_array(raw).tolist()
+    except ValueError:
+        raise _bad_request("Invalid points")
+
+
+def _apply_series_op(doc: dict[str, Any], op: ChartPatchOp) -> tuple[Path, bool]:
+    """
+    Операции над серией по id панели/серии.
+    Возвращает (изменённый путь, нужна ли валидация серии целиком).
+    """
+    pi, si = _series_index(doc, op.panel_id, op.series_id)
+    series_path: Path = ("panels", str(pi), "series", str(si))
+    series = doc["panels"][pi]["series"][si]
+
+    if isinstance(op, ReplaceSeriesOp):
+        doc["panels"][pi]["series"][si] = op.series
+        return series_path, True
+
+    points = series.get("points")
+    if not isinstance(points, list):
+        raise _bad_request("Invalid points")
+
+    if isinstance(op, InsertPointsOp):
+        index = len(points) if op.index is None else op.index
+        if not 0 <= index <= len(points):
+            raise _bad_request("Point index out of range")
+        # проверяем только новые точки: остальные уже валидны
+        points[index:index] = _validated_points(op.points)
+    elif isinstance(op, DeletePointsOp):
+        if op.start + op.count > len(points):
+            raise _bad_request("Point range out of bounds")
+        del points[op.start:op.start + op.count]
+
+    return series_path + ("points",), False
+
+
+def apply_ops(
+    doc: dict[str, Any],
+    ops: list[ChartPatchOp],
+    *,
+    before: Optional[Callable[[Any, ChartPatchOp], None]] = None,
+) -> tuple[dict[str, Any], list[Path]]:
+    """
+    Применяет операции к документу.
+    Возвращает (документ, пути для валидации). before(doc, op) вызывается перед
+    каждой операцией — так сервис подгружает точки только затронутых серий
+    (app.services.chart_series.SeriesLoader).
+    """
+    if len(ops) > MAX_PATCH_OPS:
+        raise _bad_request(f"Too many ops (max {MAX_PATCH_OPS})")
+
+    check: list[Path] = []
+    for op in ops:
+        if before is not None:
+            before(doc, op)
+        if isinstance(op, (ReplaceSeriesOp, InsertPointsOp, DeletePointsOp)):
+            path, validate = _apply_series_op(doc, op)
+            if validate:
+                check.append(path)
+            continue
+
+        raw = {"op": op.op, "path": op.path, "value": op.value, "from": op.from_ or ""}
+        try:
+            doc, dirty = apply_op(doc, raw)
+        except JsonPatchError as e:
+            if op.op == "test":
+                raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+            raise _bad_request(str(e))
+        check.extend(dirty)
+
+    if not isinstance(doc, dict):
+        raise _bad_request("result_json must be an object")
+    return doc, minimize_paths(check)
+
+
+def _without_stored(panel: Any, stored: Optional[Callable[[Any], bool]]) -> Any:
+    if stored is None or not isinstance(panel, dict) or not isinstance(panel.get("series"), list):
+        return panel
+    return {**panel, "series": [s for s in panel["series"] if not stored(s)]}
+
+
+def validate_paths(
+    doc: dict[str, Any],
+    paths: list[Path],
+    *,
+    stored: Optional[Callable[[Any], bool]] = None,
+) -> None:
+    """
+    Валидирует только затронутые части:
+    - серия (panels/i/series/j/...) — Series;
+    - массив серий или панель целиком — Panel;
+    - прочие поля панели — Panel без серий;
+    - весь документ или panels — все панели.
+    stored(series) — нетронутая ссылка на строку chart_series: её точки уже проверены
+    при записи, в панели она пропускается.
+    Ключи вне panels (artifacts, ml_meta) схемой не проверяются, как и в PUT.
+    """
+    panels = doc.get("panels")
+    if not isinstance(panels, list) or not panels:
+        raise _bad_request("Invalid panels")
+
+    try:
+        for path in paths:
+            if len(path) <= 1:
+                if not path or path[0] == "panels":
+                    for panel in panels:
+                        Panel.model_validate(_without_stored(panel, stored))
+                continue
+            if path[0] != "panels":
+                continue
+
+            panel = get_at(doc, path[:2])
+            if len(path) == 2 or (len(path) == 3 and path[2] == "series"):
+                Panel.model_validate(_without_stored(panel, stored))
+            elif path[2] == "series":
+                series = get_at(doc, path[:4])
+                if stored is None or not stored(series):
+                    Series.model_validate(series)
+            else:
+                if not isinstance(panel, dict):
+                    raise _bad_request("Invalid panels")
+                Panel.model_validate({**panel, "series": []})
+    except (ValidationError, TypeError, ValueError, JsonPatchError):
+        raise _bad_request("Invalid panels")
+
+
+def count_panels(doc: dict[str, Any]) -> tuple[int, int]:
+    panels = doc.get("panels") or []
+    n_series = sum(len(p.get("series") or []) for p in panels if isinstance(p, dict))
+    return len(panels), n_series
+
@@ -0,0 +1,460 @@
+from __future__ import annotations
+
+import asyncio
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from hashlib import sha256
+import logging
+import os
+from pathlib import Path
+import shutil
+import tempfile
+import time
+from typing import BinaryIO, Iterator
+
+from fastapi import HTTPException, UploadFile, status
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.crud.blob import async_blob_crud, blob_crud
+from app.db.crud.chart import chart_crud
+from app.db.session import SessionLocal
+from app.services.archive import archive_store
+from app.services.renditions import remove_thumbs
+
+logger = logging.getLogger(__name__)
+
+
+def _max_upload_bytes() -> int:
+    raw = getattr(settings, "max_upload_bytes", 10 * 1024 * 1024)
+    try:
+        value = int(raw)
+    except (TypeError, ValueError):
+        value = 10 * 1024 * 1024
+    return max(value, 1)
+
+
+def _upload_chunk_bytes() -> int:
+    raw = getattr(settings, "upload_chunk_bytes", 1024 * 1024)
+    try:
+        value = int(raw)
+    except (TypeError, ValueError):
+        value = 1024 * 1024
+    return max(value, 1)
+
+
+def _unlink_quiet(path: Path) -> None:
+    try:
+        path.unlink()
+    except FileNotFoundError:
+        pass
+
+
+def _write_chunk(fh: BinaryIO, hasher, chunk: bytes) -> None:
+    # hashlib и запись в файл отпускают GIL на больших кусках
+    hasher.update(chunk)
+    fh.write(chunk)
+
+
+def _flush_and_fsync(fh: BinaryIO) -> None:
+    fh.flush()
+    os.fsync(fh.fileno())
+
+
+def _too_large(max_bytes: int) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"File is too large (max {max_bytes} bytes)",
+    )
+
+
+def _empty_file() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail="Empty file",
+    )
+
+
+@dataclass
+class StagedFile:
+    tmp_path: Path
+    sha256: str
+    size: int
+
+
+class BlobStore:
+    """
+    Content-addressed хранилище оригиналов: storage/blobs/<ab>/<sha256><ext>.
+    Один файл на содержимое, независимо от того, сколько пользователей его загрузили.
+    """
+
+    @property
+    def root(self) -> Path:
+        return Path(settings.storage_dir).resolve()
+
+    @property
+    def tmp_dir(self) -> Path:
+        return self.root / "tmp"
+
+    def blob_rel_path(self, sha: str, ext: str) -> str:
+        return f"blobs/{sha[:2]}/{sha}{ext}"
+
+    def resolve(self, raw_path: str) -> Path:
+        """
+        Путь блоба -> абсолютный путь внутри storage_dir.
+        Абсолютные пути допускаются для записей, перенесённых из user_<id>/.
+        """
+        root = self.root
+        p = Path(raw_path)
+        file_path = p.resolve() if p.is_absolute() else (root / p).resolve()
+        if file_path == root or root not in file_path.parents:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Invalid storage path",
+            )
+        return file_path
+
+    def _new_temp(self) -> tuple[int, Path]:
+        tmp_dir = self.tmp_dir
+        tmp_dir.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(prefix="upload_", suffix=".part", dir=tmp_dir)
+        return fd, Path(tmp_name)
+
+    async def stage(self, upload: UploadFile) -> StagedFile:
+        """
+        Пишем загрузку во временный файл по кускам, считая sha256 на лету.
+        В памяти держим только один кусок, а не весь файл.
+        Временный файл лежит в том же томе, чтобы rename был атомарным.
+        """
+        max_bytes = _max_upload_bytes()
+        chunk_size = _upload_chunk_bytes()
+
+        fd, tmp_path = self._new_temp()
+
+        hasher = sha256()
+        size = 0
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                while True:
+                    chunk = await upload.read(chunk_size)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if size > max_bytes:
+                        raise _too_large(max_bytes)
+                    await run_in_threadpool(_write_chunk, fh, hasher, chunk)
+
+                if size == 0:
+                    raise _empty_file()
+
+                await run_in_threadpool(_flush_and_fsync, fh)
+        except BaseException:
+            await run_in_threadpool(_unlink_quiet, tmp_path)
+            raise
+
+        return StagedFile(tmp_path=tmp_path, sha256=hasher.hexdigest(), size=size)
+
+    def stage_fileobj(self, src: BinaryIO) -> StagedFile:
+        """
+        Синхронный вариант stage() для уже открытых потоков (например, файлов внутри ZIP).
+        Вызывать из threadpool.
+        """
+        max_bytes = _max_upload_bytes()
+        chunk_size = _upload_chunk_bytes()
+
+        fd, tmp_path = self._new_temp()
+
+        hasher = sha256()
+        size = 0
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                while True:
+                    chunk = src.read(chunk_size)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if size > max_bytes:
+                        raise _too_large(max_bytes)
+                    _write_chunk(fh, hasher, chunk)
+
+                if size == 0:
+                    raise _empty_file()
+
+                _flush_and_fsync(fh)
+        except BaseException:
+            _unlink_quiet(tmp_path)
+            raise
+
+        return StagedFile(tmp_path=tmp_path, sha256=hasher.hexdigest(), size=size)
+
+    async def acquire(self, db: AsyncSession, staged: StagedFile, ext: str) -> tuple[Path, bool]:
+        """
+        Берёт ссылку на блоб (без commit) и кладёт файл на место, если его ещё нет.
+        Возвращает (путь, создан_ли_файл_этим_вызовом).
+
+        Порядок важен: сначала upsert в blobs (строка блокируется до commit),
+        потом проверка файла. Сборщик удаляет файл только под блокировкой строки,
+        поэтому не может удалить его между этими шагами.
+        """
+        rel = await async_blob_crud.acquire(
+            db,
+            sha256=staged.sha256,
+            path=self.blob_rel_path(staged.sha256, ext),
+            size_bytes=staged.size,
+        )
+        final_path = self.resolve(rel)
+        created = await run_in_threadpool(self.commit_file, staged.tmp_path, final_path)
+        return final_path, created
+
+    async def acquire_many(
+        self,
+        db: AsyncSession,
+        staged: list[tuple[StagedFile, str]],
+    ) -> tuple[list[Path], list[Path]]:
+        """
+        То же, что acquire(), для пачки файлов: один upsert на все блобы.
+        staged — пары (файл, расширение). Возвращает пути в том же порядке
+        и список файлов, созданных этим вызовом (для отката).
+        """
+        refs: dict[str, tuple[str, int, int]] = {}
+        for item, ext in staged:
+            path, size, count = refs.get(
+                item.sha256,
+                (self.blob_rel_path(item.sha256, ext), item.size, 0),
+            )
+            refs[item.sha256] = (path, size, count + 1)
+
+        paths = await async_blob_crud.acquire_many(db, refs)
+
+        def _place() -> tuple[list[Path], list[Path]]:
+            out: list[Path] = []
+            created: list[Path] = []
+            for item, _ in staged:
+                final_path = self.resolve(paths[item.sha256])
+                if self.commit_file(item.tmp_path, final_path):
+                    created.append(final_path)
+                out.append(final_path)
+            return out, created
+
+        return await run_in_threadpool(_place)
+
+    def commit_file(self, tmp_path: Path, final_path: Path) -> bool:
+        """
+        Атомарно переносим временный файл на место блоба.
+        Если такой файл уже есть — временный удаляем.
+        """
+        final_path.parent.mkdir(parents=True, exist_ok=True)
+        if final_path.exists():
+            _unlink_quiet(tmp_path)
+            return False
+        os.replace(tmp_path, final_path)
+        return True
+
+    def discard(self, path: Path) -> None:
+        _unlink_quiet(path)
+
+    def release_legacy_copy(self, db: Session, *, sha256: str, original_path: str) -> None:
+        """
+        Оригиналы, загруженные до перехода на blobs/, лежат в user_<id>/ и могут
+        дублировать блоб. Такую копию удаляем сразу, если на неё больше никто не ссылается.
+        """
+        blob = blob_crud.get(db, sha256)
+        try:
+            chart_file = self.resolve(original_path)
+            if blob is None or self.resolve(blob.path) == chart_file:
+                return
+        except HTTPException:
+            return
+        if chart_crud.path_in_use(db, sha256=sha256, original_path=original_path):
+            return
+        _unlink_quiet(chart_file)
+        remove_thumbs(chart_file)
+
+
+blob_store = BlobStore()
+
+
+class StorageSweeper:
+    """
+    Фоновый сборщик мусора в storage/:
+    - блобы с ref_count = 0 старше grace-периода (вместе с их превью);
+    - каталоги charts/<id>/ (в storage/ и в архиве), для которых больше нет строки в charts;
+    - файлы архива result_json, на которые не ссылается ни один chart;
+    - брошенные временные файлы загрузок и архиватора.
+    Каждый проход ограничен batch_size, чтобы не держать блокировки и диск долго.
+    """
+
+    def __init__(self) -> None:
+        self._artifact_dirs: dict[Path, Iterator[os.DirEntry] | None] = {}
+        self._archive_files: Iterator[os.DirEntry] | None = None
+
+    def _batch_size(self) -> int:
+        return max(int(settings.storage_gc_batch_size), 1)
+
+    def _grace(self) -> timedelta:
+        return timedelta(seconds=max(int(settings.storage_gc_grace_seconds), 0))
+
+    def sweep_blobs(self) -> int:
+        cutoff = datetime.now(timezone.utc) - self._grace()
+        removed = 0
+        with SessionLocal() as db:
+            blobs = blob_crud.claim_garbage(
+                db,
+                unreferenced_before=cutoff,
+                limit=self._batch_size(),
+            )
+            for blob in blobs:
+                try:
+                    file_path = blob_store.resolve(blob.path)
+                except HTTPException:
+                    logger.warning("blob %s has path outside storage: %s", blob.sha256, blob.path)
+                else:
+                    _unlink_quiet(file_path)
+                    remove_thumbs(file_path)
+                blob_crud.delete(db, blob)
+                removed += 1
+            db.commit()
+        return removed
+
+    def _next_artifact_dirs(self, charts_dir: Path, limit: int) -> list[Path]:
+        """
+        Итератор по charts/ живёт между проходами:
+        каждый проход смотрит следующую пачку каталогов, а не все сразу.
+        """
+        out: list[Path] = []
+        restarted = False
+        while len(out) < limit:
+            if self._artifact_dirs.get(charts_dir) is None:
+                if restarted or not charts_dir.is_dir():
+                    break
+                self._artifact_dirs[charts_dir] = iter(os.scandir(charts_dir))
+                restarted = True
+            entry = next(self._artifact_dirs[charts_dir], None)
+            if entry is None:
+                self._artifact_dirs[charts_dir] = None
+                continue
+            if entry.is_dir(follow_symlinks=False) and entry.name.isdigit():
+                out.append(Path(entry.path))
+        return out
+
+    def sweep_artifact_dirs(self) -> int:
+        dirs: list[Path] = []
+        for charts_dir in (blob_store.root / "charts", archive_store.root / "charts"):
+            dirs += self._next_artifact_dirs(charts_dir, self._batch_size())
+        if not dirs:
+            return 0
+
+        with SessionLocal() as db:
+            alive = chart_crud.existing_ids(db, [int(d.name) for d in dirs])
+
+        removed = 0
+        for d in dirs:
+            if int(d.name) in alive:
+                continue
+            shutil.rmtree(d, ignore_errors=True)
+            removed += 1
+        return removed
+
+    def _iter_archive_files(self) -> Iterator[os.DirEntry]:
+        results_dir = archive_store.results_dir
+        if not results_dir.is_dir():
+            return
+        with os.scandir(results_dir) as shards:
+            for shard in shards:
+                if not shard.is_dir(follow_symlinks=False):
+                    continue
+                with os.scandir(shard.path) as files:
+                    for entry in files:
+                        if entry.name.endswith(".json.gz") and entry.is_file(follow_symlinks=False):
+                            yield entry
+
+    def sweep_archives(self) -> int:
+        """
+        Файл архива удаляется, если на его sha256 не ссылается ни один chart и он
+        старше grace-периода. Последняя проверка и удаление идут под
+        chart_crud.lock_archive: архиватор держит ту же блокировку от записи
+        файла до commit заглушки.
+        """
+        if self._archive_files is None:
+            self._archive_files = self._iter_archive_files()
+
+        cutoff = time.time() - self._grace().total_seconds()
+        candidates: dict[str, Path] = {}
+        while len(candidates) < self._batch_size():
+            entry = next(self._archive_files, None)
+            if entry is None:
+                self._archive_files = None
+                break
+            try:
+                if entry.stat().st_mtime < cutoff:
+                    candidates[entry.name[: -len(".json.gz")]] = Path(entry.path)
+            except FileNotFoundError:
+                continue
+        if not candidates:
+            return 0
+
+        removed = 0
+        with SessionLocal() as db:
+            referenced = chart_crud.referenced_archives(db, list(candidates))
+            for sha, path in candidates.items():
+                if sha in referenced:
+                    continue
+                # архиватор мог взять этот файл после проверки выше: под блокировкой
+                # проверяем ссылки и mtime ещё раз, занятый файл ждёт следующего прохода
+                try:
+                    if not chart_crud.lock_archive(db, sha, wait=False):
+                        continue
+                    if chart_crud.referenced_archives(db, [sha]) or path.stat().st_mtime >= cutoff:
+                        continue
+                    _unlink_quiet(path)
+                    removed += 1
+                except FileNotFoundError:
+                    continue
+                finally:
+                    # конец транзакции снимает блокировку
+                    db.commit()
+        return removed
+
+    def sweep_tmp(self) -> int:
+        cutoff = time.time() - max(self._grace().total_seconds(), 3600)
+        removed = 0
+        for tmp_dir in (blob_store.tmp_dir, archive_store.tmp_dir):
+            if not tmp_dir.is_dir():
+                continue
+            with os.scandir(tmp_dir) as it:
+                for entry in it:
+                    if removed >= self._batch_size():
+                        return removed
+                    try:
+                        if entry.is_file(follow_symlinks=False) and entry.stat().st_mtime < cutoff:
+                            _unlink_quiet(Path(entry.path))
+                            removed += 1
+                    except FileNotFoundError:
+                        continue
+        return removed
+
+    def sweep_once(self) -> dict[str, int]:
+        return {
+            "blobs": self.sweep_blobs(),
+            "artifact_dirs": self.sweep_artifact_dirs(),
+            "archives": self.sweep_archives(),
+            "tmp_files": self.sweep_tmp(),
+        }
+
+    async def run_forever(self) -> None:
+        interval = float(settings.storage_gc_interval_seconds)
+        while True:
+            try:
+                stats = await run_in_threadpool(self.sweep_once)
+                if any(stats.values()):
+                    logger.info("storage gc: %s", stats)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("storage gc failed")
+            await asyncio.sleep(interval)
+
+
+storage_sweeper = StorageSweeper()
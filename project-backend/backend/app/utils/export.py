@@ -1,56 +1,56 @@
 from __future__ import annotations
 
+import codecs
 import csv
 import json
 from io import StringIO
-from typing import Dict, Iterable, List, Optional, Tuple
+from itertools import repeat
+from typing import Any, Iterable, Iterator, List, Optional, Tuple
+import zipfile
 
-from app.schemas.ml import Panel
+import numpy as np
+
+from app.schemas.ml import Panel, Series
+
+try:  # pyarrow необязателен: без него export.arrow / export.parquet отвечают 501
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - зависит от окружения
+    pa = None
+    pq = None
 
 
 CSV_DELIM = "\t"
 CSV_EXCEL_SEP_HINT = f"sep={CSV_DELIM}\r\n"
 
+
 def _csv_output() -> StringIO:
     return StringIO(CSV_EXCEL_SEP_HINT)
 
 
-def _iter_flat_points(
-    panels: List[Panel],
-    panel_filter: Optional[str] = None,
-    series_filter: Optional[str] = None,
-) -> Iterable[Tuple[str, str, float, float]]:
-    for panel in panels:
-        if panel_filter and panel.id != panel_filter:
-            continue
-        for series in panel.series:
-            if series_filter and series.id != series_filter:
-                continue
-            for x, y in series.points:
-                yield panel.id, series.id, x, y
-
-
-from typing import Iterable, Optional, Tuple, List
-import json
-import csv
-from io import StringIO
-
-from app.schemas.ml import Panel
+def csv_excel_bytes(s: str) -> bytes:
+    # UTF-16 LE с BOM: Excel открывает такой CSV без мастера импорта
+    return codecs.BOM_UTF16_LE + s.encode("utf-16-le")
 
 
-def _iter_flat_points(
+def _iter_series(
     panels: List[Panel],
     panel_filter: Optional[str] = None,
     series_filter: Optional[str] = None,
-) -> Iterable[Tuple[str, float, float]]:
+) -> Iterable[Series]:
     for panel in panels:
         if panel_filter and panel.id != panel_filter:
             continue
         for series in panel.series:
             if series_filter and series.id != series_filter:
                 continue
-            for x, y in series.points:
-                yield series.id, x, y
+            yield series
+
+
+def _iter_rows(series: Series) -> Iterable[Tuple[str, float, float]]:
+    # tolist() отдаёт обычные float одним вызовом — форматирование как раньше (repr float)
+    pts = series.points
+    return zip(repeat(series.id), pts[:, 0].tolist(), pts[:, 1].tolist())
 
 
 def export_to_csv(
@@ -62,8 +62,8 @@ def export_to_csv(
     writer = csv.writer(output, delimiter=CSV_DELIM, lineterminator="\r\n")
 
     writer.writerow(["series_id", "x", "y"])
-    for s_id, x, y in _iter_flat_points(panels, panel_id, series_id):
-        writer.writerow([s_id, x, y])
+    for s in _iter_series(panels, panel_id, series_id):
+        writer.writerows(_iter_rows(s))
 
     return output.getvalue()
 
@@ -76,8 +76,8 @@ def export_to_txt(
     output = StringIO()
     output.write("series_id\tx\ty\n")
 
-    for s_id, x, y in _iter_flat_points(panels, panel_id, series_id):
-        output.write(f"{s_id}\t{x}\t{y}\n")
+    for s in _iter_series(panels, panel_id, series_id):
+        output.writelines(f"{s_id}\t{x}\t{y}\n" for s_id, x, y in _iter_rows(s))
 
     return output.getvalue()
 
@@ -94,17 +94,15 @@ def export_to_json(
         if panel_id and p.id != panel_id:
             continue
 
-        out_series: list[dict] = []
-        for s in p.series:
-            if series_id and s.id != series_id:
-                continue
-            out_series.append(
-                {
-                    "id": s.id,
-                    "name": getattr(s, "name", None),
-                    "points": [[float(x), float(y)] for (x, y) in s.points],
-                }
-            )
+        out_series: list[dict] = [
+            {
+                "id": s.id,
+                "name": s.name,
+                "points": s.points.tolist(),
+            }
+            for s in p.series
+            if not series_id or s.id == series_id
+        ]
 
         if out_series:
             out_panels.append({"series": out_series})
@@ -133,6 +131,15 @@ def _unique_name(base: str, used: set[str]) -> str:
     return name
 
 
+def _last_y_per_x(points: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Уникальные x по возрастанию; при повторе x берётся последняя точка серии.
+    """
+    rev = points[::-1]
+    xs, idx = np.unique(rev[:, 0], return_index=True)
+    return xs, rev[idx, 1]
+
+
 def export_to_table_csv(
     panels: List[Panel],
     panel_id: Optional[str] = None,
@@ -150,45 +157,212 @@ def export_to_table_csv(
 
     allow_series = set(series_ids) if series_ids else None
 
-    series_cols: List[Tuple[str, Dict[float, float]]] = []
+    names: List[str] = []
+    columns: List[Tuple[np.ndarray, np.ndarray]] = []
     used_names: set[str] = set()
 
     for p in selected:
         for s in p.series:
             if allow_series and s.id not in allow_series:
                 continue
+            names.append(_unique_name(s.name or s.id, used_names))
+            columns.append(_last_y_per_x(s.points))
 
-            name = _unique_name(getattr(s, "name", "") or getattr(s, "id", ""), used_names)
-
-            xy: Dict[float, float] = {}
-            for x, y in s.points:
-                try:
-                    fx = float(x)
-                    fy = float(y)
-                except (TypeError, ValueError):
-                    continue
-                if not (fx == fx and fy == fy):  # NaN
-                    continue
-                xy[fx] = fy
-
-            series_cols.append((name, xy))
-
-    if not series_cols:
+    if not columns:
         return ""
 
-    x_all = sorted({x for _, m in series_cols for x in m.keys()})
+    x_all = np.unique(np.concatenate([xs for xs, _ in columns]))
+
+    # матрица значений: NaN там, где у серии нет точки с таким x
+    table = np.full((len(x_all), len(columns)), np.nan)
+    for col, (xs, ys) in enumerate(columns):
+        table[np.searchsorted(x_all, xs), col] = ys
 
     output = _csv_output()
     writer = csv.writer(output, delimiter=CSV_DELIM, lineterminator="\r\n")
 
-    header = ["x", *[name for name, _ in series_cols]]
-    writer.writerow(header)
+    writer.writerow(["x", *names])
+
+    missing = np.isnan(table).tolist()
+    for x, row, row_missing in zip(x_all.tolist(), table.tolist(), missing):
+        writer.writerow(
+            [_fmt_num(x), *("" if m else _fmt_num(y) for y, m in zip(row, row_missing))]
+        )
+
+    return output.getvalue()
+
+
+# ---------- бинарные колоночные форматы ----------
+
+class ChunkBuffer:
+    """
+    Несикаемый (unseekable) приёмник для zipfile/pyarrow: копит записанные байты,
+    drain() отдаёт их и очищает буфер. Так архив можно отдавать кусками по мере записи.
+    """
+
+    def __init__(self) -> None:
+        self._chunks: list[bytes] = []
+
+    def write(self, data: Any) -> int:
+        b = bytes(data)
+        if b:
+            self._chunks.append(b)
+        return len(b)
+
+    def flush(self) -> None:
+        pass
+
+    @property
+    def closed(self) -> bool:
+        return False
+
+    def drain(self) -> bytes:
+        out = b"".join(self._chunks)
+        self._chunks.clear()
+        return out
+
+
+def _selected_series(
+    panels: List[Panel],
+    panel_id: Optional[str],
+    series_id: Optional[str],
+) -> List[Tuple[Panel, Series]]:
+    return [
+        (p, s)
+        for p in panels
+        if not panel_id or p.id == panel_id
+        for s in p.series
+        if not series_id or s.id == series_id
+    ]
+
+
+def _series_meta(selected: List[Tuple[Panel, Series]]) -> dict:
+    panels: dict[str, dict] = {}
+    for p, _ in selected:
+        panels.setdefault(
+            p.id,
+            {
+                "id": p.id,
+                "x_unit": p.x_unit,
+                "y_unit": p.y_unit,
+                "x_scale": p.x_scale.value,
+                "y_scale": p.y_scale.value,
+            },
+        )
+    return {
+        "panels": list(panels.values()),
+        "series": [
+            {"index": k, "panel_id": p.id, "id": s.id, "name": s.name, "n_points": len(s.points)}
+            for k, (p, s) in enumerate(selected)
+        ],
+    }
+
+
+def iter_npz(
+    panels: List[Panel],
+    panel_id: Optional[str] = None,
+    series_id: Optional[str] = None,
+) -> Iterator[bytes]:
+    """
+    NumPy .npz (без сжатия): для серии k — массивы series_{k}_x и series_{k}_y (float64),
+    плюс series_panel_id / series_id / series_name и meta (JSON-строка).
+    np.load(..., allow_pickle=False) читает без разбора текста.
+    Архив пишется потоково, по массиву за раз.
+    """
+    selected = _selected_series(panels, panel_id, series_id)
+    buf = ChunkBuffer()
+
+    def arrays() -> Iterator[Tuple[str, np.ndarray]]:
+        yield "meta", np.array(json.dumps(_series_meta(selected), ensure_ascii=False))
+        yield "series_panel_id", np.array([p.id for p, _ in selected], dtype=np.str_)
+        yield "series_id", np.array([s.id for _, s in selected], dtype=np.str_)
+        yield "series_name", np.array([s.name or "" for _, s in selected], dtype=np.str_)
+        for k, (_, s) in enumerate(selected):
+            yield f"series_{k}_x", np.ascontiguousarray(s.points[:, 0])
+            yield f"series_{k}_y", np.ascontiguousarray(s.points[:, 1])
+
+    with zipfile.ZipFile(buf, mode="w", compression=zipfile.ZIP_STORED, allowZip64=True) as zf:
+        for name, arr in arrays():
+            with zf.open(f"{name}.npy", mode="w", force_zip64=True) as fh:
+                np.lib.format.write_array(fh, arr, allow_pickle=False)
+            yield buf.drain()
+    yield buf.drain()
+
+
+def arrow_available() -> bool:
+    return pa is not None
+
+
+def _arrow_schema(selected: List[Tuple[Panel, Series]]):
+    meta = json.dumps(_series_meta(selected), ensure_ascii=False)
+    return pa.schema(
+        [
+            pa.field("panel_id", pa.dictionary(pa.int32(), pa.string())),
+            pa.field("series_id", pa.dictionary(pa.int32(), pa.string())),
+            pa.field("x", pa.float64()),
+            pa.field("y", pa.float64()),
+        ],
+        metadata={"chart_meta": meta},
+    )
 
-    for x in x_all:
-        row = [_fmt_num(x)]
-        for _, m in series_cols:
-            y = m.get(x)
-            row.append("" if y is None else _fmt_num(y))
-        writer.writerow(row)
 
-    return output.getvalue()
\ No newline at end of file
+def _arrow_batches(selected: List[Tuple[Panel, Series]], schema) -> Iterator[Any]:
+    """
+    Одна record batch на серию. x/y — обёртка над numpy-буферами (без копирования
+    по точкам), panel_id/series_id — словарные колонки с общим словарём.
+    """
+    panel_dict = pa.array(list(dict.fromkeys(p.id for p, _ in selected)), type=pa.string())
+    series_dict = pa.array([s.id for _, s in selected], type=pa.string())
+    panel_index = {pid: i for i, pid in enumerate(panel_dict.to_pylist())}
+
+    for k, (p, s) in enumerate(selected):
+        n = len(s.points)
+        yield pa.record_batch(
+            [
+                pa.DictionaryArray.from_arrays(
+                    pa.array(np.full(n, panel_index[p.id], dtype=np.int32)), panel_dict
+                ),
+                pa.DictionaryArray.from_arrays(pa.array(np.full(n, k, dtype=np.int32)), series_dict),
+                pa.array(np.ascontiguousarray(s.points[:, 0])),
+                pa.array(np.ascontiguousarray(s.points[:, 1])),
+            ],
+            schema=schema,
+        )
+
+
+def iter_arrow(
+    panels: List[Panel],
+    panel_id: Optional[str] = None,
+    series_id: Optional[str] = None,
+) -> Iterator[bytes]:
+    """
+    Arrow IPC stream (pyarrow.ipc.open_stream): колонки panel_id, series_id, x, y;
+    метаданные панелей и серий — в schema.metadata["chart_meta"].
+    """
+    selected = _selected_series(panels, panel_id, series_id)
+    schema = _arrow_schema(selected)
+    buf = ChunkBuffer()
+    with pa.ipc.new_stream(pa.PythonFile(buf, mode="w"), schema) as writer:
+        yield buf.drain()
+        for batch in _arrow_batches(selected, schema):
+            writer.write_batch(batch)
+            yield buf.drain()
+    yield buf.drain()
+
+
+def iter_parquet(
+    panels: List[Panel],
+    panel_id: Optional[str] = None,
+    series_id: Optional[str] = None,
+) -> Iterator[bytes]:
+    """
+    Parquet с той же схемой, что и Arrow; одна row group на серию.
+    """
+    selected = _selected_series(panels, panel_id, series_id)
+    schema = _arrow_schema(selected)
+    buf = ChunkBuffer()
+    with pq.ParquetWriter(pa.PythonFile(buf, mode="w"), schema) as writer:
+        for batch in _arrow_batches(selected, schema):
+            writer.write_batch(batch)
+            yield buf.drain()
+    yield buf.drain()
@@ -0,0 +1,98 @@
+from email.utils import formatdate, parsedate_to_datetime
+import mimetypes
+import os
+from pathlib import Path
+from urllib.parse import quote
+
+from fastapi import Request, Response
+from fastapi.responses import FileResponse
+
+from app.core.config import settings
+
+# Файлы, адресуемые по содержимому (оригиналы в blobs/), не меняются никогда.
+IMMUTABLE_CACHE_CONTROL = "private, max-age=31536000, immutable"
+# Артефакты могут быть пересчитаны воркером — браузер хранит, но каждый раз сверяет ETag.
+REVALIDATE_CACHE_CONTROL = "private, no-cache"
+
+
+def _stat_etag(st: os.stat_result) -> str:
+    return f'"{st.st_mtime_ns:x}-{st.st_size:x}"'
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    """
+    If-None-Match сравнивается слабо (RFC 9110): W/"x" совпадает с "x".
+    """
+    if if_none_match.strip() == "*":
+        return True
+    bare = etag.removeprefix("W/")
+    for candidate in if_none_match.split(","):
+        if candidate.strip().removeprefix("W/") == bare:
+            return True
+    return False
+
+
+def _not_modified(request: Request, etag: str, mtime: float) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # при наличии If-None-Match дата не учитывается
+        return _etag_matches(if_none_match, etag)
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return int(mtime) <= int(since)
+    return False
+
+
+def _accel_location(file_path: Path) -> str:
+    """
+    Путь для X-Accel-Redirect: internal location прокси, смонтированный на storage_dir.
+    """
+    rel = file_path.relative_to(Path(settings.storage_dir).resolve())
+    prefix = "/" + settings.file_accel_prefix.strip("/")
+    return f"{prefix}/{quote(rel.as_posix())}"
+
+
+def file_response(
+    request: Request,
+    file_path: Path,
+    *,
+    media_type: str | None = None,
+    etag: str | None = None,
+    immutable: bool = False,
+) -> Response:
+    """
+    Отдаёт файл с валидаторами кэша.
+
+    - ETag: переданный (например, sha256 содержимого) или из mtime+size;
+    - If-None-Match / If-Modified-Since -> 304 без тела;
+    - Range обрабатывает FileResponse (Starlette), If-Range сверяется с нашим ETag;
+    - FILE_SEND_MODE=x-accel-redirect | x-sendfile: Python только проверяет доступ
+      и ставит заголовок, байты отдаёт прокси (nginx / Apache / lighttpd).
+    """
+    st = file_path.stat()
+    strong_etag = f'"{etag}"' if etag else _stat_etag(st)
+    media_type = media_type or mimetypes.guess_type(file_path.name)[0] or "application/octet-stream"
+
+    headers = {
+        "ETag": strong_etag,
+        "Last-Modified": formatdate(st.st_mtime, usegmt=True),
+        "Cache-Control": IMMUTABLE_CACHE_CONTROL if immutable else REVALIDATE_CACHE_CONTROL,
+    }
+
+    if _not_modified(request, strong_etag, st.st_mtime):
+        return Response(status_code=304, headers=headers)
+
+    mode = settings.file_send_mode
+    if mode == "x-accel-redirect":
+        headers["X-Accel-Redirect"] = _accel_location(file_path)
+        return Response(headers=headers, media_type=media_type)
+    if mode == "x-sendfile":
+        headers["X-Sendfile"] = str(file_path)
+        return Response(headers=headers, media_type=media_type)
+
+    return FileResponse(file_path, media_type=media_type, headers=headers, stat_result=st)
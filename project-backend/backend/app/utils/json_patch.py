@@ -0,0 +1,152 @@
+"""
+Минимальная реализация RFC 6902 (JSON Patch) поверх dict/list.
+
+Помимо применения операций, apply() возвращает "грязные" пути — минимальные
+поддеревья, которые изменились. По ним сервис валидирует только изменённые
+части документа.
+"""
+from __future__ import annotations
+
+import copy
+from typing import Any
+
+Path = tuple[str, ...]
+
+
+class JsonPatchError(ValueError):
+    pass
+
+
+def parse_pointer(pointer: str) -> Path:
+    """
+    JSON Pointer (RFC 6901) -> кортеж токенов: "/panels/0/a~1b" -> ("panels", "0", "a/b").
+    """
+    if pointer == "":
+        return ()
+    if not pointer.startswith("/"):
+        raise JsonPatchError(f"Invalid JSON pointer: {pointer!r}")
+    return tuple(t.replace("~1", "/").replace("~0", "~") for t in pointer[1:].split("/"))
+
+
+def _index(container: list, token: str, *, allow_end: bool) -> int:
+    if allow_end and token == "-":
+        return len(container)
+    if not token.isdigit() or (token != "0" and token.startswith("0")):
+        raise JsonPatchError(f"Invalid array index: {token!r}")
+    idx = int(token)
+    upper = len(container) if allow_end else len(container) - 1
+    if idx > upper:
+        raise JsonPatchError(f"Array index out of range: {idx}")
+    return idx
+
+
+def _resolve(doc: Any, path: Path) -> Any:
+    node = doc
+    for token in path:
+        if isinstance(node, dict):
+            if token not in node:
+                raise JsonPatchError(f"Path not found: /{'/'.join(path)}")
+            node = node[token]
+        elif isinstance(node, list):
+            node = node[_index(node, token, allow_end=False)]
+        else:
+            raise JsonPatchError(f"Path not found: /{'/'.join(path)}")
+    return node
+
+
+def _add(doc: Any, path: Path, value: Any) -> tuple[Any, Path]:
+    if not path:
+        return value, ()
+    parent = _resolve(doc, path[:-1])
+    token = path[-1]
+    if isinstance(parent, dict):
+        parent[token] = value
+        return doc, path
+    if isinstance(parent, list):
+        parent.insert(_index(parent, token, allow_end=True), value)
+        # индексы после вставки сдвинулись — меняется весь массив
+        return doc, path[:-1]
+    raise JsonPatchError(f"Cannot add to /{'/'.join(path)}")
+
+
+def _remove(doc: Any, path: Path) -> tuple[Any, Path]:
+    if not path:
+        raise JsonPatchError("Cannot remove the whole document")
+    parent = _resolve(doc, path[:-1])
+    token = path[-1]
+    if isinstance(parent, dict):
+        if token not in parent:
+            raise JsonPatchError(f"Path not found: /{'/'.join(path)}")
+        del parent[token]
+    elif isinstance(parent, list):
+        del parent[_index(parent, token, allow_end=False)]
+    else:
+        raise JsonPatchError(f"Cannot remove /{'/'.join(path)}")
+    return doc, path[:-1]
+
+
+def _replace(doc: Any, path: Path, value: Any) -> tuple[Any, Path]:
+    if not path:
+        return value, ()
+    parent = _resolve(doc, path[:-1])
+    token = path[-1]
+    if isinstance(parent, dict):
+        if token not in parent:
+            raise JsonPatchError(f"Path not found: /{'/'.join(path)}")
+        parent[token] = value
+    elif isinstance(parent, list):
+        parent[_index(parent, token, allow_end=False)] = value
+    else:
+        raise JsonPatchError(f"Cannot replace /{'/'.join(path)}")
+    return doc, path
+
+
+def apply_op(doc: Any, op: dict[str, Any]) -> tuple[Any, list[Path]]:
+    """
+    Применяет одну операцию (in-place, где возможно).
+    Возвращает (новый корень, изменённые пути).
+    """
+    name = op.get("op")
+    path = parse_pointer(op.get("path", ""))
+
+    if name == "add":
+        doc, dirty = _add(doc, path, op.get("value"))
+        return doc, [dirty]
+    if name == "remove":
+        doc, dirty = _remove(doc, path)
+        return doc, [dirty]
+    if name == "replace":
+        doc, dirty = _replace(doc, path, op.get("value"))
+        return doc, [dirty]
+    if name in ("move", "copy"):
+        src = parse_pointer(op.get("from", ""))
+        if name == "move" and path[: len(src)] == src and path != src:
+            raise JsonPatchError("Cannot move a value into its own child")
+        value = copy.deepcopy(_resolve(doc, src))
+        dirty: list[Path] = []
+        if name == "move":
+            doc, removed = _remove(doc, src)
+            dirty.append(removed)
+        doc, added = _add(doc, path, value)
+        dirty.append(added)
+        return doc, dirty
+    if name == "test":
+        if _resolve(doc, path) != op.get("value"):
+            raise JsonPatchError(f"Test failed at /{'/'.join(path)}")
+        return doc, []
+    raise JsonPatchError(f"Unknown op: {name!r}")
+
+
+def minimize_paths(paths: list[Path]) -> list[Path]:
+    """
+    Убирает пути, которые лежат внутри других изменённых путей.
+    """
+    out: list[Path] = []
+    for p in sorted(set(paths), key=len):
+        if not any(p[: len(q)] == q for q in out):
+            out.append(p)
+    return out
+
+
+def get_at(doc: Any, path: Path) -> Any:
+    return _resolve(doc, path)
@@ -0,0 +1,105 @@
+"""
+Планы запросов GET /charts/search на синтетических данных.
+
+Запуск из project-backend/backend (нужна БД с применёнными миграциями):
+    python -m benchmarks.explain_search --charts 50000
+
+Строки вставляются в транзакции, которая в конце откатывается. Для каждого
+фильтра печатается EXPLAIN (ANALYZE, BUFFERS) того же запроса, что строит
+chart_crud.search_select; Seq Scan по charts считается ошибкой.
+"""
+from __future__ import annotations
+
+import argparse
+from datetime import datetime, timedelta, timezone
+import sys
+
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql
+
+from app.db.crud.chart import chart_crud
+from app.db.session import engine
+
+BENCH_USER_ID = -4242  # FK на users нет (38b1f13b029e), отрицательный id не пересечётся с реальными
+
+_SEED_SQL = """
+INSERT INTO charts (
+    user_id, original_filename, mime_type, sha256, original_path, status,
+    result_json, result_version, n_panels, n_series, created_at, processed_at
+)
+SELECT
+    :user_id,
+    'scan_' || g || CASE WHEN g % 97 = 0 THEN '_spectrum' ELSE '_plot' END || '.png',
+    'image/png',
+    md5(g::text) || md5((g + 1)::text),
+    'blobs/bench/' || g || '.png',
+    CASE WHEN g % 50 = 0 THEN 'error' WHEN g % 20 = 0 THEN 'processing' ELSE 'done' END,
+    jsonb_build_object(
+        'panels', jsonb_build_array(jsonb_build_object(
+            'id', 'panel_0',
+            'series', jsonb_build_array(
+                jsonb_build_object('id', 's0', 'name', 'series_' || (g % 500), 'points', '[]'::jsonb),
+                jsonb_build_object('id', 's1', 'name', 'baseline', 'points', '[]'::jsonb)
+            )
+        ))
+    ),
+    0,
+    1 + g % 3,
+    1 + g % 8,
+    :start + g * interval '1 minute',
+    :start + g * interval '1 minute' + interval '30 seconds'
+FROM generate_series(1, :n) AS g
+"""
+
+
+def _explain(conn, label: str, stmt) -> bool:
+    compiled = stmt.compile(dialect=postgresql.dialect(), compile_kwargs={"render_postcompile": True})
+    sql = "EXPLAIN (ANALYZE, BUFFERS) " + str(compiled)
+    plan = [r[0] for r in conn.exec_driver_sql(sql, compiled.params)]
+
+    seq_scan = any("Seq Scan on charts" in line for line in plan)
+    print(f"--- {label}{'  [SEQ SCAN]' if seq_scan else ''}")
+    for line in plan:
+        print("   ", line)
+    return not seq_scan
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--charts", type=int, default=50_000)
+    args = parser.parse_args()
+
+    start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    middle = start + timedelta(minutes=args.charts // 2)
+
+    cases = [
+        ("first page", {}),
+        ("filename trigram", {"q": "spectrum"}),
+        ("status", {"statuses": ["error"]}),
+        ("created range", {"created_from": middle, "created_to": middle + timedelta(days=1)}),
+        ("n_series range", {"n_series_min": 7, "n_series_max": 8}),
+        ("series name", {"series_names": ["series_42"]}),
+        ("keyset page", {"after": (middle, 10**9)}),
+        ("combined", {"q": "spectrum", "statuses": ["done"], "series_names": ["baseline"]}),
+    ]
+
+    ok = True
+    with engine.connect() as conn:
+        trans = conn.begin()
+        try:
+            conn.execute(text(_SEED_SQL), {"user_id": BENCH_USER_ID, "n": args.charts, "start": start})
+            conn.execute(text("ANALYZE charts"))
+            print(f"seeded {args.charts} charts for user {BENCH_USER_ID}\n")
+
+            for label, filters in cases:
+                stmt = chart_crud.search_select(user_id=BENCH_USER_ID, limit=51, **filters)
+                ok = _explain(conn, label, stmt) and ok
+        finally:
+            trans.rollback()
+
+    print("\nall plans index-backed" if ok else "\nsome plans use a sequential scan", file=sys.stderr)
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
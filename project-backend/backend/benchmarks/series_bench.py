@@ -0,0 +1,127 @@
+"""
+Память и время валидации/экспорта серий: List[Tuple[float, float]] против PointsArray.
+
+Запуск из project-backend/backend:
+    python -m benchmarks.series_bench --points 1000000 --series 4
+
+DATABASE_URL / JWT_SECRET_KEY не нужны: app.core.config не импортируется.
+"""
+from __future__ import annotations
+
+import argparse
+import gc
+import json
+import random
+import time
+import tracemalloc
+from typing import Callable, List, Optional, Tuple
+
+from pydantic import BaseModel
+
+from app.schemas.ml import Panel
+from app.utils.export import (
+    arrow_available,
+    export_to_csv,
+    export_to_json,
+    export_to_table_csv,
+    iter_arrow,
+    iter_npz,
+    iter_parquet,
+)
+
+
+class _TupleSeries(BaseModel):
+    # прежнее представление, для сравнения
+    id: str
+    name: Optional[str] = None
+    points: List[Tuple[float, float]]
+
+
+class _TuplePanel(BaseModel):
+    id: str
+    series: List[_TupleSeries]
+
+
+def _payload(n_points: int, n_series: int) -> dict:
+    rnd = random.Random(42)
+    per_series = max(n_points // n_series, 1)
+    return {
+        "id": "panel_0",
+        "series": [
+            {
+                "id": f"series_{k}",
+                "name": f"series_{k}",
+                "points": [[i * 0.001, rnd.random()] for i in range(per_series)],
+            }
+            for k in range(n_series)
+        ],
+    }
+
+
+def _measure(label: str, fn: Callable[[], object]) -> object:
+    # время и пик памяти — в разных прогонах: tracemalloc сильно замедляет аллокации
+    gc.collect()
+    started = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - started
+
+    gc.collect()
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<42} {elapsed * 1000:10.1f} ms   peak {peak / 2**20:8.1f} MiB")
+    return result
+
+
+def _retained(label: str, fn: Callable[[], object]) -> object:
+    """
+    Память, которую держит сам объект после построения (без временных буферов).
+    """
+    gc.collect()
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    obj = fn()
+    gc.collect()
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<42} retained {(after - before) / 2**20:8.1f} MiB")
+    return obj
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--points", type=int, default=1_000_000)
+    parser.add_argument("--series", type=int, default=4)
+    parser.add_argument("--skip-tuples", action="store_true", help="не мерить старое представление")
+    args = parser.parse_args()
+
+    payload = _payload(args.points, args.series)
+    raw_json = json.dumps(payload)
+    total = sum(len(s["points"]) for s in payload["series"])
+    print(f"{total} points in {args.series} series, JSON {len(raw_json) / 2**20:.1f} MiB\n")
+
+    print("validation")
+    panel = _measure("  PointsArray   Panel.model_validate", lambda: Panel.model_validate(payload))
+    if not args.skip_tuples:
+        _measure("  tuples        Panel.model_validate", lambda: _TuplePanel.model_validate(payload))
+
+    print("\nretained model size")
+    _retained("  PointsArray", lambda: Panel.model_validate(payload))
+    if not args.skip_tuples:
+        _retained("  tuples", lambda: _TuplePanel.model_validate(payload))
+
+    print("\nexport (PointsArray)")
+    _measure("  export_to_csv", lambda: export_to_csv([panel]))
+    _measure("  export_to_json", lambda: export_to_json([panel]))
+    _measure("  export_to_table_csv", lambda: export_to_table_csv([panel]))
+    _measure("  model_dump_json", lambda: panel.model_dump_json())
+    _measure("  iter_npz", lambda: b"".join(iter_npz([panel])))
+    if arrow_available():
+        _measure("  iter_arrow", lambda: b"".join(iter_arrow([panel])))
+        _measure("  iter_parquet", lambda: b"".join(iter_parquet([panel])))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())